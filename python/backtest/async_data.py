@@ -0,0 +1,136 @@
+# --- Async Data Fetcher ---
+# Concurrent Twelve Data downloads with aiohttp: one pooled ClientSession, a shared token-bucket
+# limiter matched to the API plan, and a batch API over (symbol, interval, start, end) requests.
+# Responses are decoded by backtest_data.parse_time_series, so results are identical to
+# get_historical_data. base_url can point at a local stub server for testing.
+#
+# Usage (from python/backtest):
+#   python async_data.py --symbols EUR/USD GBP/USD USD/JPY --intervals 1h 5min \
+#       --start_date "2024-05-01 00:00:00" --end_date "2024-05-10 00:00:00" --requests-per-minute 8
+
+import argparse
+import asyncio
+import time as perf_timer
+from datetime import datetime
+
+import aiohttp
+
+import config
+from backtest_data import parse_time_series, time_series_params
+
+
+class TokenBucket:
+    """
+    Async token bucket shared by all requests of a batch: up to 'capacity' requests at once,
+    refilled at 'rate' tokens per second. TokenBucket.per_minute(8) matches the Twelve Data free plan.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = perf_timer.monotonic()
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def per_minute(cls, requests_per_minute: int):
+        return cls(requests_per_minute / 60.0, requests_per_minute)
+
+    async def acquire(self):
+        """Waits until a token is available and takes it (waiters are served in order)."""
+        async with self._lock:
+            while True:
+                now = perf_timer.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def aget_historical_data(session: aiohttp.ClientSession, symbol, interval, start_date_str, end_date_str, api_key,
+                               limiter: TokenBucket = None, base_url: str = config.BASE_URL):
+    """
+    Async variant of backtest_data.get_historical_data.
+
+    Args:
+        session (aiohttp.ClientSession): Pooled session used for the request.
+        limiter (TokenBucket): Shared rate limiter, acquired before the request (None: no limit).
+        base_url (str): API root (default: config.BASE_URL).
+        The other arguments are those of get_historical_data.
+
+    Returns:
+        pandas.DataFrame: DataFrame with OHLC data, indexed by datetime, or None if error.
+    """
+    params = time_series_params(symbol, interval, start_date_str, end_date_str, api_key)
+    if limiter is not None:
+        await limiter.acquire()
+    print(f"[AsyncDataFetcher] Requesting data for {symbol} ({interval}) from {start_date_str} to {end_date_str}")
+
+    try:
+        async with session.get(f"{base_url}/time_series", params=params) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+        return parse_time_series(data, symbol, interval)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"[AsyncDataFetcher] Request failed for {symbol} ({interval}): {e}")
+        return None
+    except Exception as e:
+        print(f"[AsyncDataFetcher] Error processing data for {symbol} ({interval}): {e}")
+        return None
+
+
+async def afetch_many(fetch_requests, api_key, requests_per_minute: int = 8, max_connections: int = 8,
+                      base_url: str = config.BASE_URL, limiter: TokenBucket = None):
+    """
+    Downloads many ranges concurrently over one connection pool.
+
+    Args:
+        fetch_requests (iterable): (symbol, interval, start_date_str, end_date_str) tuples.
+        api_key (str): Your Twelve Data API key.
+        requests_per_minute (int): Plan limit for the shared token bucket (ignored if 'limiter' is given).
+        max_connections (int): Size of the connection pool.
+        base_url (str): API root (default: config.BASE_URL).
+
+    Returns:
+        dict: request tuple -> DataFrame (or None if that request failed), in request order.
+    """
+    fetch_requests = list(fetch_requests)
+    limiter = limiter or TokenBucket.per_minute(requests_per_minute)
+    connector = aiohttp.TCPConnector(limit=max_connections)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        results = await asyncio.gather(*(aget_historical_data(session, *request, api_key, limiter=limiter, base_url=base_url)
+                                         for request in fetch_requests))
+    return dict(zip(fetch_requests, results))
+
+
+def fetch_many(fetch_requests, api_key, requests_per_minute: int = 8, max_connections: int = 8,
+               base_url: str = config.BASE_URL):
+    """Blocking wrapper around afetch_many for synchronous callers."""
+    return asyncio.run(afetch_many(fetch_requests, api_key, requests_per_minute, max_connections, base_url))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Concurrent Twelve Data downloader")
+    parser.add_argument("--symbols", type=str, nargs='+', required=True, help="Trading symbols, e.g. EUR/USD GBP/USD")
+    parser.add_argument("--intervals", type=str, nargs='+', default=["1h", "5min"], help="Intervals (default: 1h 5min)")
+    parser.add_argument("--start_date", type=str, required=True, help="Start date (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--end_date", type=str, required=True, help="End date (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--requests-per-minute", type=int, default=8, help="API plan limit (default: 8)")
+    parser.add_argument("--connections", type=int, default=8, help="Connection pool size (default: 8)")
+    args = parser.parse_args()
+
+    try:
+        datetime.strptime(args.start_date, "%Y-%m-%d %H:%M:%S")
+        datetime.strptime(args.end_date, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        print("Error: Invalid date format. Please use YYYY-MM-DD HH:MM:SS for start_date and end_date.")
+        exit(1)
+
+    batch = [(symbol, interval, args.start_date, args.end_date) for symbol in args.symbols for interval in args.intervals]
+    started = perf_timer.perf_counter()
+    results = fetch_many(batch, config.TWELVE_DATA_API_KEY, args.requests_per_minute, args.connections)
+    print(f"\nFetched {len(batch)} series in {perf_timer.perf_counter() - started:.1f}s")
+    for (symbol, interval, _, _), df in results.items():
+        print(f"  {symbol} ({interval}): {'FAILED' if df is None else f'{len(df)} bars'}")
@@ -1,29 +1,17 @@
 import requests
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import config
-import time
+from history_downloader import OUTPUTSIZE_LIMIT
 
-def get_historical_data(symbol, interval, start_date_str, end_date_str, api_key):
-    """
-    Fetches historical OHLCV data from Twelve Data.
-    
-    Args:
-        symbol (str): The trading symbol (e.g., "EUR/USD").
-        interval (str): The time interval (e.g., "1h", "5min").
-        start_date_str (str): Start date in "YYYY-MM-DD HH:MM:SS" or "YYYY-MM-DD" format.
-        end_date_str (str): End date in "YYYY-MM-DD HH:MM:SS" or "YYYY-MM-DD" format.
-        api_key (str): Your Twelve Data API key.
-
-    Returns:
-        pandas.DataFrame: DataFrame with OHLC data, indexed by datetime, or None if error.
-                          Columns: ['open', 'high', 'low', 'close', 'volume']
-    """
+def time_series_params(symbol, interval, start_date_str, end_date_str, api_key):
+    """Query parameters of a Twelve Data time_series request (shared by the sync and async fetchers)."""
     params = {
         "symbol": symbol,
         "interval": interval,
         "apikey": api_key,
-        "outputsize": 5000, # Max supported by Twelve Data
+        "outputsize": OUTPUTSIZE_LIMIT, # Max supported by Twelve Data; longer ranges: history_downloader
         "format": "JSON",
         "timezone": "UTC" # Explicitly request UTC data
     }
@@ -34,52 +22,136 @@ def get_historical_data(symbol, interval, start_date_str, end_date_str, api_key)
         params["start_date"] = start_date_str
     if end_date_str:
         params["end_date"] = end_date_str
+    return params
 
-    print(f"[DataFetcher] Requesting data for {symbol} ({interval}) from {start_date_str} to {end_date_str}")
+# Datetime formats of the Twelve Data "datetime" field, by string length (intraday / daily and above)
+DATETIME_FORMATS_BY_LENGTH = {19: "%Y-%m-%d %H:%M:%S", 10: "%Y-%m-%d"}
+OHLC_COLUMNS = ["open", "high", "low", "close"]
 
-    try:
-        response = requests.get(f"{config.BASE_URL}/time_series", params=params)
-        response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
-        data = response.json()
+def decode_values_fast(values):
+    """
+    Column-wise decode of the "values" records of a time_series response: one fixed-format
+    datetime parse, string -> float64 parsing straight into NumPy arrays, and no sort when the
+    records are already in order (reversed order is flipped in O(n)).
 
-        if data.get("status") == "error":
-            print(f"[DataFetcher] Error from Twelve Data API: {data.get('message')}")
-            return None
+    Returns:
+        pandas.DataFrame: Chronological OHLC[V] frame, or None if the first record lacks OHLC fields.
+    Raises:
+        KeyError, ValueError, TypeError: On records the fast path cannot decode (callers fall back).
+    """
+    first = values[0]
+    if not all(col in first for col in OHLC_COLUMNS):
+        return None
+    datetime_format = DATETIME_FORMATS_BY_LENGTH.get(len(first["datetime"]))
+    if datetime_format is None:
+        raise ValueError(f"Unexpected datetime format: {first['datetime']}")
+    columns = OHLC_COLUMNS + (["volume"] if "volume" in first else [])
+
+    index = pd.to_datetime([record["datetime"] for record in values], format=datetime_format)
+    index.name = "datetime"
+    arrays = {col: np.array([record[col] for record in values], dtype=np.float64) for col in columns}
+
+    times = index.asi8
+    steps = np.diff(times)
+    if (steps < 0).any():
+        order = slice(None, None, -1) if (steps <= 0).all() else np.argsort(times, kind="stable")
+        index = index[order]
+        arrays = {col: array[order] for col, array in arrays.items()}
+    return pd.DataFrame(arrays, index=index, copy=False)
+
+def _decode_values_generic(values, symbol, interval):
+    """Record-wise decode via pandas for responses the fast path rejects; None if OHLC fields are missing."""
+    df = pd.DataFrame(values)
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    df = df.set_index("datetime")
+
+    # Select available columns
+    available_cols = []
+    if "open" in df.columns: available_cols.append("open")
+    if "high" in df.columns: available_cols.append("high")
+    if "low" in df.columns: available_cols.append("low")
+    if "close" in df.columns: available_cols.append("close")
+    if "volume" in df.columns: available_cols.append("volume")
+
+    if not all(col in df.columns for col in ["open", "high", "low", "close"]):
+        print(f"[DataFetcher] Critical OHLC data missing in response for {symbol} ({interval}). Columns: {df.columns.tolist()}")
+        return None
 
-        if "values" not in data or not data["values"]:
-            print(f"[DataFetcher] No data returned for {symbol} ({interval}) in the given range.")
-            # Ensure columns match what's expected later, even if empty
-            cols = ['datetime', 'open', 'high', 'low', 'close']
-            if 'volume' in (data.get("values", [{}])[0] if data.get("values") else {}): # Check if volume might exist based on first record
-                 cols.append('volume')
-            return pd.DataFrame(columns=cols).set_index('datetime')
+    df = df[available_cols].astype(float)
+    df = df.sort_index() # Ensure data is chronological
 
+    # Twelve Data returns data in reverse chronological order if no start/end date.
+    # If start/end_date are provided, it seems to be chronological.
+    # Sorting by index ensures it's always chronological.
+    return df
 
-        df = pd.DataFrame(data["values"])
-        df["datetime"] = pd.to_datetime(df["datetime"])
-        df = df.set_index("datetime")
-        
-        # Select available columns
-        available_cols = []
-        if "open" in df.columns: available_cols.append("open")
-        if "high" in df.columns: available_cols.append("high")
-        if "low" in df.columns: available_cols.append("low")
-        if "close" in df.columns: available_cols.append("close")
-        if "volume" in df.columns: available_cols.append("volume")
-        
-        if not all(col in df.columns for col in ["open", "high", "low", "close"]):
-            print(f"[DataFetcher] Critical OHLC data missing in response for {symbol} ({interval}). Columns: {df.columns.tolist()}")
+# Twelve Data reports a range without bars (weekend, holiday) as an error response with this message
+NO_DATA_MESSAGE = "no data is available"
+
+def is_no_data_response(data):
+    """True if a time_series response is the API's "no data for the specified dates" error, not a failure."""
+    return data.get("status") == "error" and NO_DATA_MESSAGE in str(data.get("message", "")).lower()
+
+def parse_time_series(data, symbol, interval):
+    """
+    Converts a decoded Twelve Data time_series response into an OHLC DataFrame.
+    Shared by get_historical_data and the async fetcher (async_data.aget_historical_data).
+
+    Returns:
+        pandas.DataFrame: Chronological OHLC[V] data indexed by datetime, an empty frame if the
+                          range has no bars (no values, or the API's no-data error), or None if
+                          the API reported any other error.
+    """
+    if data.get("status") == "error" and not is_no_data_response(data):
+        print(f"[DataFetcher] Error from Twelve Data API: {data.get('message')}")
+        return None
+
+    if "values" not in data or not data["values"]:
+        print(f"[DataFetcher] No data returned for {symbol} ({interval}) in the given range.")
+        # Ensure columns match what's expected later, even if empty
+        cols = ['datetime', 'open', 'high', 'low', 'close']
+        if 'volume' in (data.get("values", [{}])[0] if data.get("values") else {}): # Check if volume might exist based on first record
+             cols.append('volume')
+        return pd.DataFrame(columns=cols).set_index('datetime')
+
+    try:
+        df = decode_values_fast(data["values"])
+    except (KeyError, ValueError, TypeError):
+        df = None # Irregular records (missing fields, nulls, other datetime formats): use the generic path
+    if df is None:
+        df = _decode_values_generic(data["values"], symbol, interval)
+        if df is None:
             return None
 
-        df = df[available_cols].astype(float)
-        df = df.sort_index() # Ensure data is chronological
-        
-        # Twelve Data returns data in reverse chronological order if no start/end date.
-        # If start/end_date are provided, it seems to be chronological.
-        # Sorting by index ensures it's always chronological.
+    print(f"[DataFetcher] Successfully fetched {len(df)} records for {symbol} ({interval})")
+    return df
+
+def get_historical_data(symbol, interval, start_date_str, end_date_str, api_key, session=None):
+    """
+    Fetches historical OHLCV data from Twelve Data.
+    
+    Args:
+        symbol (str): The trading symbol (e.g., "EUR/USD").
+        interval (str): The time interval (e.g., "1h", "5min").
+        start_date_str (str): Start date in "YYYY-MM-DD HH:MM:SS" or "YYYY-MM-DD" format.
+        end_date_str (str): End date in "YYYY-MM-DD HH:MM:SS" or "YYYY-MM-DD" format.
+        api_key (str): Your Twelve Data API key.
+        session (requests.Session): Optional pooled session to send the request with.
+
+    Returns:
+        pandas.DataFrame: DataFrame with OHLC data, indexed by datetime, an empty frame if the range
+                          has no bars, or None if error. Columns: ['open', 'high', 'low', 'close', 'volume']
+    """
+    params = time_series_params(symbol, interval, start_date_str, end_date_str, api_key)
+
+    print(f"[DataFetcher] Requesting data for {symbol} ({interval}) from {start_date_str} to {end_date_str}")
+
+    try:
+        response = (session or requests).get(f"{config.BASE_URL}/time_series", params=params)
+        response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
+        data = response.json()
 
-        print(f"[DataFetcher] Successfully fetched {len(df)} records for {symbol} ({interval})")
-        return df
+        return parse_time_series(data, symbol, interval)
 
     except requests.exceptions.RequestException as e:
         print(f"[DataFetcher] Request failed: {e}")
@@ -105,23 +177,17 @@ if __name__ == '__main__':
         end_fetch_date = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
         start_fetch_date = (datetime.utcnow() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S") # Fetch last 30 days for example
 
-        print(f"Attempting to fetch H1 data for {symbol} from {start_fetch_date} to {end_fetch_date}")
-        h1_data = get_historical_data(symbol, "1h", start_fetch_date, end_fetch_date, config.TWELVE_DATA_API_KEY)
-        if h1_data is not None and not h1_data.empty:
-            print("\nH1 Data:")
-            print(h1_data.head())
-            print(h1_data.tail())
-        else:
-            print("\nFailed to fetch H1 data or no data returned.")
-
-        # Be mindful of API rate limits if you make many requests quickly.
-        time.sleep(1) # Small delay if making multiple calls, especially for different symbols/intervals
-
-        print(f"\nAttempting to fetch M5 data for {symbol} from {start_fetch_date} to {end_fetch_date}")
-        m5_data = get_historical_data(symbol, "5min", start_fetch_date, end_fetch_date, config.TWELVE_DATA_API_KEY)
-        if m5_data is not None and not m5_data.empty:
-            print("\nM5 Data:")
-            print(m5_data.head())
-            print(m5_data.tail())
-        else:
-            print("\nFailed to fetch M5 data or no data returned.") 
\ No newline at end of file
+        # Both intervals are requested concurrently (see async_data) instead of one after the other with a sleep
+        from async_data import fetch_many
+        print(f"Attempting to fetch H1 and M5 data for {symbol} from {start_fetch_date} to {end_fetch_date}")
+        results = fetch_many([(symbol, "1h", start_fetch_date, end_fetch_date), (symbol, "5min", start_fetch_date, end_fetch_date)],
+                             config.TWELVE_DATA_API_KEY)
+
+        for (_, interval, _, _), df in results.items():
+            label = "H1" if interval == "1h" else "M5"
+            if df is not None and not df.empty:
+                print(f"\n{label} Data:")
+                print(df.head())
+                print(df.tail())
+            else:
+                print(f"\nFailed to fetch {label} data or no data returned.")
@@ -0,0 +1,93 @@
+# --- Bar Arrays ---
+# Contiguous NumPy columns for an OHLC frame plus a lightweight per-bar record.
+# Used by the M5 event loop in process_bar_data instead of DataFrame.iterrows(), which
+# builds a pandas Series for every bar.
+
+import numpy as np
+import pandas as pd
+
+
+class Bar:
+    """
+    One bar of a BarArrays view.
+
+    Prices are NumPy scalars taken straight from the columns, hour/minute are plain ints for
+    session checks. bar['high'] and bar.name work as on a DataFrame row so code written
+    against iterrows() rows keeps working; the pandas Timestamp is only built on access.
+    """
+    __slots__ = ('position', 'open', 'high', 'low', 'close', 'hour', 'minute', '_index')
+
+    def __init__(self, position, open_, high, low, close, hour, minute, index):
+        self.position = position # Position within the BarArrays the bar came from
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+        self.hour = hour
+        self.minute = minute
+        self._index = index
+
+    @property
+    def time(self) -> pd.Timestamp:
+        return self._index[self.position]
+
+    @property
+    def name(self) -> pd.Timestamp:
+        return self.time
+
+    def __getitem__(self, column):
+        return getattr(self, column)
+
+    def __repr__(self):
+        return f"Bar({self.time}, O:{self.open}, H:{self.high}, L:{self.low}, C:{self.close})"
+
+
+class BarArrays:
+    """
+    Column arrays of an OHLC frame (time/open/high/low/close), chronological.
+    Slicing returns views, so per-day BarArrays are free to create.
+    """
+    __slots__ = ('index', 'times_ns', 'open', 'high', 'low', 'close', 'hours', 'minutes')
+
+    def __init__(self, index, times_ns, open_, high, low, close, hours, minutes):
+        self.index = index
+        self.times_ns = times_ns
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+        self.hours = hours
+        self.minutes = minutes
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        """Builds the arrays from a DataFrame with open/high/low/close columns and a DatetimeIndex."""
+        index = df.index
+        times = index.tz_convert('UTC').tz_localize(None) if index.tz is not None else index
+        return cls(index,
+                   np.asarray(times, dtype='datetime64[ns]').view(np.int64),
+                   np.ascontiguousarray(df['open'].to_numpy()),
+                   np.ascontiguousarray(df['high'].to_numpy()),
+                   np.ascontiguousarray(df['low'].to_numpy()),
+                   np.ascontiguousarray(df['close'].to_numpy()),
+                   index.hour.to_numpy(dtype=np.int64),
+                   index.minute.to_numpy(dtype=np.int64))
+
+    def __len__(self):
+        return len(self.times_ns)
+
+    def slice(self, start: int, end: int):
+        """Returns a BarArrays view over positions [start, end)."""
+        return BarArrays(self.index[start:end], self.times_ns[start:end],
+                         self.open[start:end], self.high[start:end], self.low[start:end], self.close[start:end],
+                         self.hours[start:end], self.minutes[start:end])
+
+    def bar(self, position: int) -> Bar:
+        return Bar(position, self.open[position], self.high[position], self.low[position], self.close[position],
+                   int(self.hours[position]), int(self.minutes[position]), self.index)
+
+    def __iter__(self):
+        index = self.index
+        columns = zip(self.open, self.high, self.low, self.close, self.hours.tolist(), self.minutes.tolist())
+        for position, (open_, high, low, close, hour, minute) in enumerate(columns):
+            yield Bar(position, open_, high, low, close, hour, minute, index)
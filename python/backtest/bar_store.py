@@ -0,0 +1,244 @@
+# --- Bar Store ---
+# Append-only, memory-mapped column files per symbol and timeframe, shared by the backtester,
+# the chart plotter and the live bar builder. Reads are zero-copy views into the page cache, so
+# a multi-year history is never loaded into RAM as a whole.
+#
+# Layout of a store root:
+#   <root>/EUR-USD/5min/time.i8     int64 epoch nanoseconds (UTC), strictly increasing
+#   <root>/EUR-USD/5min/open.f8     float64, one value per bar (likewise high/low/close/volume)
+#   <root>/EUR-USD/5min/meta.json   {"rows": n} - the committed row count
+#
+# Appends write the column files first and then bump "rows" atomically, so a reader (or a
+# crashed writer) never sees a half-written bar; bytes beyond "rows" are overwritten next time.
+#
+# Usage (from python/backtest), importing bars from the OHLC cache:
+#   python bar_store.py import --symbol EUR/USD --timeframe 5min
+#   python bar_store.py info --symbol EUR/USD --timeframe 5min
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bar_store")
+TIME_COLUMN = "time"
+PRICE_COLUMNS = ("open", "high", "low", "close", "volume")
+_SUFFIX = {TIME_COLUMN: ".i8", **{column: ".f8" for column in PRICE_COLUMNS}}
+_DTYPE = {TIME_COLUMN: np.int64, **{column: np.float64 for column in PRICE_COLUMNS}}
+# Bar length per Twelve Data interval (timeframe key of a series), e.g. for bucketing live ticks
+INTERVAL_DURATIONS = {
+    "1min": pd.Timedelta(minutes=1), "5min": pd.Timedelta(minutes=5), "15min": pd.Timedelta(minutes=15),
+    "30min": pd.Timedelta(minutes=30), "45min": pd.Timedelta(minutes=45), "1h": pd.Timedelta(hours=1),
+    "2h": pd.Timedelta(hours=2), "4h": pd.Timedelta(hours=4), "1day": pd.Timedelta(days=1),
+}
+
+
+def _to_ns(timestamp) -> int:
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tz is not None:
+        timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+    return int(timestamp.as_unit('ns').value)
+
+
+class BarView:
+    """
+    A contiguous range of bars. Every column is a read-only NumPy view into the memory-mapped
+    files (no copy); volume is NaN where the source had none.
+    """
+    __slots__ = ('times_ns', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, times_ns, open_, high, low, close, volume):
+        self.times_ns = times_ns
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    def __len__(self):
+        return len(self.times_ns)
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.times_ns.view('datetime64[ns]'), name='datetime')
+
+    def to_frame(self, include_volume: bool = False) -> pd.DataFrame:
+        """DataFrame whose price columns share memory with the store (only the index is materialized)."""
+        columns = {'open': self.open, 'high': self.high, 'low': self.low, 'close': self.close}
+        if include_volume:
+            columns['volume'] = self.volume
+        return pd.DataFrame(columns, index=self.index, copy=False)
+
+    def to_bar_arrays(self):
+        """BarArrays over this view, for the backtester's M5 event loop."""
+        from bar_arrays import BarArrays
+        index = self.index
+        return BarArrays(index, self.times_ns, self.open, self.high, self.low, self.close,
+                         index.hour.to_numpy(dtype=np.int64), index.minute.to_numpy(dtype=np.int64))
+
+
+def _positions(times: np.ndarray, start, end):
+    """(first, stop) positions in sorted 'times' of start <= time <= end (None: open-ended)."""
+    first = 0 if start is None else int(np.searchsorted(times, _to_ns(start), side='left'))
+    stop = len(times) if end is None else int(np.searchsorted(times, _to_ns(end), side='right'))
+    return first, max(first, stop)
+
+
+class BarSeries:
+    """The bars of one symbol and timeframe in a BarStore."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._rows = None
+        self._maps = {}
+
+    # --- Metadata ---
+    def _path(self, column: str) -> str:
+        return os.path.join(self.directory, column + _SUFFIX[column])
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    def __len__(self):
+        path = self._meta_path()
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            return json.load(f)["rows"]
+
+    def _column(self, column: str, rows: int) -> np.ndarray:
+        """
+        Read-only memory map of the first 'rows' rows of 'column' (re-mapped after appends).
+        Callers read the committed row count (len) once and pass it to every column they access.
+        """
+        if rows != self._rows:
+            self._maps = {}
+            self._rows = rows
+        if column not in self._maps:
+            if rows == 0:
+                self._maps[column] = np.empty(0, dtype=_DTYPE[column])
+            else:
+                self._maps[column] = np.memmap(self._path(column), dtype=_DTYPE[column], mode='r', shape=(rows,))
+        return self._maps[column]
+
+    @property
+    def times_ns(self) -> np.ndarray:
+        return self._column(TIME_COLUMN, len(self))
+
+    def last_time(self):
+        """Timestamp of the newest stored bar, or None if the series is empty."""
+        times = self.times_ns
+        return pd.Timestamp(int(times[-1])) if len(times) else None
+
+    # --- Reading ---
+    def positions(self, start=None, end=None):
+        """(first, stop) row positions of the bars with start <= time <= end (None: open-ended)."""
+        return _positions(self.times_ns, start, end)
+
+    def view(self, start=None, end=None) -> BarView:
+        """Zero-copy BarView of the bars between start and end (inclusive)."""
+        rows = len(self) # meta.json is read once per view
+        first, stop = _positions(self._column(TIME_COLUMN, rows), start, end)
+        return BarView(*(self._column(column, rows)[first:stop] for column in (TIME_COLUMN,) + PRICE_COLUMNS))
+
+    def tail(self, count: int) -> BarView:
+        """Zero-copy BarView of the newest 'count' bars."""
+        rows = len(self)
+        first = max(0, rows - count)
+        return BarView(*(self._column(column, rows)[first:rows] for column in (TIME_COLUMN,) + PRICE_COLUMNS))
+
+    # --- Writing ---
+    def append(self, times_ns, open_, high, low, close, volume=None) -> int:
+        """
+        Appends bars newer than the last stored bar; older or already stored times are skipped,
+        so re-importing an overlapping range is harmless.
+
+        Returns:
+            int: Number of bars appended.
+        """
+        times_ns = np.asarray(times_ns, dtype=np.int64)
+        columns = {'open': open_, 'high': high, 'low': low, 'close': close,
+                   'volume': np.full(len(times_ns), np.nan) if volume is None else volume}
+        columns = {name: np.asarray(values, dtype=np.float64) for name, values in columns.items()}
+
+        if (np.diff(times_ns) < 0).any():
+            order = np.argsort(times_ns, kind='stable')
+            times_ns = times_ns[order]
+            columns = {name: values[order] for name, values in columns.items()}
+        keep = np.r_[True, np.diff(times_ns) > 0] if len(times_ns) else np.empty(0, dtype=bool)
+        rows = len(self)
+        if rows:
+            keep &= times_ns > int(self._column(TIME_COLUMN, rows)[-1])
+        if not keep.any():
+            return 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        byte_offset = rows * 8 # Both dtypes are 8 bytes wide
+        for column, values in ((TIME_COLUMN, times_ns), *columns.items()):
+            with open(self._path(column), 'r+b' if os.path.exists(self._path(column)) else 'wb') as f:
+                f.seek(byte_offset)
+                f.write(np.ascontiguousarray(values[keep]).tobytes())
+                f.truncate()
+        appended = int(keep.sum())
+        tmp_path = self._meta_path() + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"rows": rows + appended}, f)
+        os.replace(tmp_path, self._meta_path())
+        return appended
+
+    def append_frame(self, df: pd.DataFrame) -> int:
+        """Appends a DataFrame with open/high/low/close[/volume] columns and a DatetimeIndex."""
+        if df is None or df.empty:
+            return 0
+        index = df.index.tz_convert('UTC').tz_localize(None) if df.index.tz is not None else df.index
+        return self.append(np.asarray(index, dtype='datetime64[ns]').view(np.int64),
+                           df['open'], df['high'], df['low'], df['close'], df['volume'] if 'volume' in df.columns else None)
+
+
+class BarStore:
+    """Root of a bar store; hands out one BarSeries per (symbol, timeframe)."""
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR):
+        self.root = root
+        self._series = {}
+
+    def series(self, symbol: str, timeframe: str) -> BarSeries:
+        key = (symbol, timeframe)
+        if key not in self._series:
+            self._series[key] = BarSeries(os.path.join(self.root, symbol.replace('/', '-'), timeframe))
+        return self._series[key]
+
+    def view(self, symbol: str, timeframe: str, start=None, end=None) -> BarView:
+        return self.series(symbol, timeframe).view(start, end)
+
+    def frame(self, symbol: str, timeframe: str, start=None, end=None) -> pd.DataFrame:
+        """OHLC DataFrame for the range, backed by the memory-mapped columns."""
+        return self.view(symbol, timeframe, start, end).to_frame()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Memory-mapped OHLC bar store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("import", "Append the bars of the local OHLC cache to the store"),
+                            ("info", "Show the row count and time range of a series")):
+        command_parser = subparsers.add_parser(name, help=help_text)
+        command_parser.add_argument("--symbol", type=str, required=True, help="Trading symbol, e.g. EUR/USD")
+        command_parser.add_argument("--timeframe", type=str, required=True, help="Interval, e.g. 5min or 1h")
+        command_parser.add_argument("--store-dir", type=str, default=DEFAULT_STORE_DIR, help="Bar store root")
+    subparsers.choices["import"].add_argument("--cache-dir", type=str, default=None, help="OHLC cache directory (default: python/backtest/data_cache)")
+    args = parser.parse_args()
+
+    series = BarStore(args.store_dir).series(args.symbol, args.timeframe)
+    if args.command == "import":
+        from ohlc_cache import OHLCCache, DEFAULT_CACHE_DIR
+        cached = OHLCCache(args.cache_dir or DEFAULT_CACHE_DIR, fetcher=lambda *request: None).load(args.symbol, args.timeframe)
+        if cached is None or cached.empty:
+            print(f"[BarStore] Nothing cached for {args.symbol} ({args.timeframe}).")
+        else:
+            print(f"[BarStore] Appended {series.append_frame(cached)} of {len(cached)} cached bars.")
+    rows = len(series)
+    times = series.times_ns
+    print(f"[BarStore] {args.symbol} ({args.timeframe}): {rows} bars"
+          + (f", {pd.Timestamp(int(times[0]))} to {pd.Timestamp(int(times[-1]))}" if rows else ""))
@@ -0,0 +1,526 @@
+# --- Backtester Benchmarks ---
+# Micro-benchmarks for the hot paths of the H3M backtester, run on synthetic EUR/USD-like data
+# so they need neither an API key nor network access.
+#
+# Usage (from python/backtest):
+#   python benchmarks.py bar-loop --days 260
+#   python benchmarks.py decode --rows 5000
+#   python benchmarks.py compact --days 260
+#   python benchmarks.py trend --days 1300
+#   python benchmarks.py sweep-bos --days 520
+#   python benchmarks.py resolve --trades 5000
+#   python benchmarks.py kernel --days 1300
+#   python benchmarks.py import-time --max-seconds 1.5
+#   python benchmarks.py charts --days 260
+#   python benchmarks.py chart-csv --days 2600
+#   python benchmarks.py chart-feed --days 3650
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time as perf_timer
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from bar_arrays import BarArrays
+from synthetic_data import make_synthetic_ohlc
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # config.py (imported by backtest_data) and custom_chart_plotter.py live there
+if PYTHON_DIR not in sys.path:
+    sys.path.append(PYTHON_DIR)
+
+
+def _report(label: str, count: int, seconds: float, unit: str = "bars"):
+    print(f"{label:<28} {seconds:8.3f} s  {count / seconds if seconds > 0 else float('inf'):14,.0f} {unit}/s")
+
+
+def bench_bar_loop(days: int):
+    """Bars per second of the M5 event loop: DataFrame.iterrows() vs BarArrays, reading what check_sweep/check_bos read."""
+    _, m5 = make_synthetic_ohlc(days)
+    print(f"M5 bars: {len(m5):,}")
+
+    started = perf_timer.perf_counter()
+    touched = 0.0
+    for bar_time, bar in m5.iterrows():
+        if bar_time.hour >= 6:
+            touched += bar['high'] - bar['low'] + bar['close']
+    iterrows_seconds = perf_timer.perf_counter() - started
+    _report("iterrows", len(m5), iterrows_seconds)
+
+    started = perf_timer.perf_counter()
+    arrays = BarArrays.from_frame(m5)
+    touched_arrays = 0.0
+    for bar in arrays:
+        if bar.hour >= 6:
+            touched_arrays += bar.high - bar.low + bar.close
+    arrays_seconds = perf_timer.perf_counter() - started
+    _report("BarArrays (incl. build)", len(m5), arrays_seconds)
+
+    assert touched == touched_arrays
+    print(f"Speedup: {iterrows_seconds / arrays_seconds:.1f}x")
+
+
+def make_time_series_payload(rows: int = 5000, seed: int = 0) -> bytes:
+    """A Twelve Data-style time_series JSON body (string-valued records, newest first) with 'rows' M5 bars."""
+    _, m5 = make_synthetic_ohlc(days=rows // 288 + 2, seed=seed)
+    m5 = m5.iloc[-rows:].iloc[::-1]
+    values = [{"datetime": time.strftime("%Y-%m-%d %H:%M:%S"), "open": f"{o:.5f}", "high": f"{h:.5f}", "low": f"{l:.5f}", "close": f"{c:.5f}"}
+              for time, o, h, l, c in zip(m5.index, m5['open'], m5['high'], m5['low'], m5['close'])]
+    return json.dumps({"meta": {"symbol": "EUR/USD", "interval": "5min"}, "values": values, "status": "ok"}).encode()
+
+
+def bench_decode(rows: int, repeats: int):
+    """Rows per second of the time_series response decode (JSON bytes -> chronological DataFrame): pandas record path vs fast path."""
+    import backtest_data
+
+    payload = make_time_series_payload(rows)
+    print(f"Payload: {rows:,} rows, {len(payload) / 1e6:.2f} MB, {repeats} repeats")
+
+    def run(decode):
+        started = perf_timer.perf_counter()
+        for _ in range(repeats):
+            df = decode(json.loads(payload)["values"])
+        return df, perf_timer.perf_counter() - started
+
+    generic_df, generic_seconds = run(lambda values: backtest_data._decode_values_generic(values, "EUR/USD", "5min"))
+    _report("pandas records (before)", rows * repeats, generic_seconds, "rows")
+    fast_df, fast_seconds = run(backtest_data.decode_values_fast)
+    _report("column-wise (after)", rows * repeats, fast_seconds, "rows")
+
+    assert fast_df.equals(generic_df)
+    print(f"Speedup: {generic_seconds / fast_seconds:.1f}x")
+
+
+def bench_compact(days: int):
+    """
+    Equivalence check and memory/time comparison of CompactOHLC M5 data vs float64 DataFrames:
+    both runs of the backtest must produce identical trades (EUR/USD-like and USD/JPY-like data).
+    """
+    import backtest
+    from compact_ohlc import CompactOHLC
+
+    for symbol, pip_size in (("EUR/USD", 0.0001), ("USD/JPY", 0.01)):
+        h1, m5 = make_synthetic_ohlc(days, pip_size=pip_size)
+        m5_compact = CompactOHLC.from_frame(m5, pip_size)
+        frame_bytes = m5.memory_usage(index=True).sum()
+        print(f"{symbol}: {len(m5):,} M5 bars, DataFrame {frame_bytes / 1e6:.1f} MB, CompactOHLC {m5_compact.nbytes / 1e6:.1f} MB "
+              f"({frame_bytes / m5_compact.nbytes:.2f}x smaller)")
+
+        runs = {}
+        for label, m5_data in (("float64 DataFrame", m5), ("CompactOHLC", m5_compact)):
+            started = perf_timer.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                runs[label] = backtest.process_bar_data(h1, m5_data, symbol, make_charts=False)
+            _report(f"  {label}", len(m5), perf_timer.perf_counter() - started)
+
+        (frame_trades, frame_balance), (compact_trades, compact_balance) = runs.values()
+        assert frame_trades == compact_trades and frame_balance == compact_balance, f"{symbol}: compact trades differ"
+        print(f"  identical: {len(frame_trades)} trades, final balance {frame_balance:.2f}")
+
+
+def bench_trend(days: int):
+    """Daily H1 trend for a whole history: determine_h1_trend_context per day vs one trend_by_day pass (same decisions, see tests/test_trend_context.py)."""
+    import backtest
+    from trend_context import trend_by_day
+
+    h1, _ = make_synthetic_ohlc(days)
+    dates = backtest.DayIndex(h1.index).dates
+    print(f"H1 bars: {len(h1):,}, days: {len(dates):,}")
+
+    started = perf_timer.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        per_day = [backtest.determine_h1_trend_context(h1[h1.index < pd.Timestamp(date)], 0.0001) for date in dates]
+    per_day_seconds = perf_timer.perf_counter() - started
+    _report("per-day prefix (before)", len(dates), per_day_seconds, "days")
+
+    started = perf_timer.perf_counter()
+    table = trend_by_day(h1, 0.0001, dates)
+    table_seconds = perf_timer.perf_counter() - started
+    _report("trend_by_day (after)", len(dates), table_seconds, "days")
+
+    print("Trend days: " + ", ".join(f"{trend} {count}" for trend, count in table['trend'].value_counts().items()))
+    print(f"Speedup: {per_day_seconds / table_seconds:.1f}x")
+
+
+def bench_sweep_bos(days: int):
+    """
+    Full backtests: H3MEngine visiting every M5 bar vs skipping to the next event with setup_scanner.DayScanner
+    (must give the same trades, balance and log, i.e. the scanner never skips a bar that prints or changes state).
+    """
+    import backtest
+
+    class EveryBarEngine(backtest.H3MEngine):
+        def _m5_bars_to_visit(self, m5_bars, trend_h1):
+            return (m5_bars.bar(position) for position in range(len(m5_bars)))
+
+    h1, m5 = make_synthetic_ohlc(days)
+    data = backtest.BacktestData(h1, m5, "EUR/USD")
+    with contextlib.redirect_stdout(io.StringIO()):
+        data.precompute()
+    print(f"M5 bars: {len(m5):,}")
+
+    def run(engine_class):
+        log = io.StringIO()
+        started = perf_timer.perf_counter()
+        with contextlib.redirect_stdout(log):
+            trades, balance = engine_class("EUR/USD", make_charts=False).process_bar_data(data=data)
+        return trades, balance, log.getvalue(), perf_timer.perf_counter() - started
+
+    every_trades, every_balance, every_log, every_seconds = run(EveryBarEngine)
+    _report("every M5 bar (before)", len(m5), every_seconds)
+    scan_trades, scan_balance, scan_log, scan_seconds = run(backtest.H3MEngine)
+    _report("DayScanner (after)", len(m5), scan_seconds)
+
+    assert scan_trades == every_trades and scan_balance == every_balance, "DayScanner changes the trades"
+    assert scan_log == every_log, "DayScanner changes the log"
+    print(f"Trades: {len(scan_trades)}, log lines: {scan_log.count(chr(10)):,} (identical)")
+    print(f"Speedup: {every_seconds / scan_seconds:.1f}x")
+
+
+def bench_resolve(trades: int, seed: int = 0):
+    """
+    SL/TP resolution of random trades (entry at an M5 bar, exit by the end of its day): simulate_trade_outcome
+    one trade at a time vs one resolve_trades batch (same outcomes, exit bars and PnL).
+    """
+    import backtest
+    from day_index import DayIndex
+    from trade_resolver import resolve_trades
+
+    _, m5 = make_synthetic_ohlc(max(trades // 4, 30), seed)
+    days = DayIndex(m5.index)
+    rng = np.random.default_rng(seed)
+    day_numbers = rng.integers(0, len(days.dates), trades)
+    entry_positions = days.starts[day_numbers] + rng.integers(72, 144, trades) # Entries between 06:00 and 12:00
+    starts, ends = entry_positions + 1, days.ends[day_numbers]
+    entry_prices = m5['close'].to_numpy()[entry_positions]
+    bullish = rng.random(trades) < 0.5
+    risk = rng.uniform(5, 30, trades) * 0.0001
+    reward = risk * rng.uniform(1.3, 4.0, trades)
+    sl_prices = np.where(bullish, entry_prices - risk, entry_prices + risk)
+    tp_prices = np.where(bullish, entry_prices + reward, entry_prices - reward)
+    print(f"Trades: {trades:,} on {len(m5):,} M5 bars")
+
+    started = perf_timer.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        records = [backtest.simulate_trade_outcome(entry_prices[k], sl_prices[k], tp_prices[k], "bullish" if bullish[k] else "bearish",
+                                                   m5.index[entry_positions[k]], m5.iloc[starts[k]:ends[k]], 0.0001, 1.0, 10.0)
+                   for k in range(trades)]
+    single_seconds = perf_timer.perf_counter() - started
+    _report("simulate_trade_outcome", trades, single_seconds, "trades")
+
+    started = perf_timer.perf_counter()
+    batch = resolve_trades(m5['high'].to_numpy(), m5['low'].to_numpy(), m5['close'].to_numpy(), starts, ends,
+                           entry_prices, sl_prices, tp_prices, bullish, 0.0001, 1.0, 10.0)
+    batch_seconds = perf_timer.perf_counter() - started
+    _report("resolve_trades (batch)", trades, batch_seconds, "trades")
+
+    assert list(batch['outcome']) == [record['outcome'] for record in records]
+    assert [m5.index[position] for position in batch['exit_position']] == [record['exit_time'] for record in records]
+    assert [round(pnl, 2) for pnl in batch['pnl_currency']] == [record['pnl_currency'] for record in records]
+    print("Outcomes: " + ", ".join(f"{outcome} {count}" for outcome, count in batch['outcome'].value_counts().items()))
+    print(f"Speedup: {single_seconds / batch_seconds:.1f}x")
+
+
+def bench_kernel(days: int):
+    """
+    Whole backtests over a multi-year history for a few parameter combinations: H3MEngine.process_bar_data
+    (output discarded, no charts) vs h3m_kernel.run_kernel (same trades and final balance).
+    """
+    import backtest
+    import h3m_kernel
+
+    h1, m5 = make_synthetic_ohlc(days)
+    data = backtest.BacktestData(h1, m5, "EUR/USD")
+    combinations = [{}, {'min_rr': 2.0, 'max_rr': 4.0}, {'max_bos_distance_pips': 5.0}, {'h1_fractal_period': 2, 'min_sl_pips': 8.0}]
+    with contextlib.redirect_stdout(io.StringIO()):
+        data.precompute((2, 3))
+    print(f"M5 bars: {len(m5):,}, days: {len(data.m5_days.dates):,}, combinations: {len(combinations)}, "
+          f"Numba: {'yes' if h3m_kernel.NUMBA_AVAILABLE else 'no (pure-Python fallback)'}")
+
+    if h3m_kernel.NUMBA_AVAILABLE:
+        started = perf_timer.perf_counter()
+        h3m_kernel.run_kernel(data) # Compiles (or loads the cached compilation)
+        print(f"Kernel compilation: {perf_timer.perf_counter() - started:.2f} s")
+
+    engine_seconds = kernel_seconds = 0.0
+    trade_count = 0
+    for overrides in combinations:
+        params = backtest.StrategyParams(**overrides)
+        started = perf_timer.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            trades, final_balance = backtest.H3MEngine("EUR/USD", make_charts=False, params=params).process_bar_data(data=data)
+        engine_seconds += perf_timer.perf_counter() - started
+
+        started = perf_timer.perf_counter()
+        kernel_trades, kernel_balance = h3m_kernel.run_kernel(data, params)
+        kernel_seconds += perf_timer.perf_counter() - started
+
+        assert h3m_kernel.trade_records(kernel_trades, data) == trades, f"{overrides}: kernel trades differ"
+        assert kernel_balance == final_balance, f"{overrides}: kernel balance differs"
+        trade_count += len(trades)
+        print(f"  {overrides or 'defaults'}: {len(trades)} trades, final balance {final_balance:.2f} (identical)")
+
+    runs = len(combinations) * len(data.m5_days.dates)
+    _report("process_bar_data", runs, engine_seconds, "days")
+    _report("run_kernel", runs, kernel_seconds, "days")
+    print(f"Trades: {trade_count}")
+    print(f"Speedup: {engine_seconds / kernel_seconds:.1f}x")
+
+
+PLOTTING_MODULES = ('matplotlib', 'mplfinance')
+
+_IMPORT_PROBE = """
+import json, sys, time
+sys.path[:0] = {paths!r}
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{'seconds': seconds, 'loaded': [name for name in {watched!r} if name in sys.modules]}}))
+"""
+
+
+def _import_in_fresh_interpreter(module: str):
+    """(seconds, plotting modules loaded) of 'import module' in a new Python process."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    probe = _IMPORT_PROBE.format(paths=[here, os.path.dirname(here)], module=module, watched=PLOTTING_MODULES)
+    result = json.loads(subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True).stdout)
+    return result['seconds'], result['loaded']
+
+
+def bench_import_time(repeats: int, max_seconds: float = None):
+    """
+    Cold import time of the backtest core (backtest, optimizer, multi_symbol_backtest), each in a fresh
+    interpreter, next to the plotting subsystem (trade_charts). Fails if a core module loads matplotlib or
+    mplfinance, or if its median import time exceeds max_seconds.
+    """
+    failures = []
+    for module in ("backtest", "optimizer", "multi_symbol_backtest", "trade_charts"):
+        runs = [_import_in_fresh_interpreter(module) for _ in range(repeats)]
+        seconds = float(np.median([run[0] for run in runs]))
+        loaded = runs[0][1]
+        print(f"import {module:<24} {seconds:8.3f} s  plotting modules: {', '.join(loaded) or 'none'}")
+        if module == "trade_charts":
+            continue
+        if loaded:
+            failures.append(f"{module} imports {', '.join(loaded)}")
+        if max_seconds is not None and seconds > max_seconds:
+            failures.append(f"{module} takes {seconds:.3f} s to import (limit {max_seconds} s)")
+    if failures:
+        raise SystemExit("Import-time check failed: " + "; ".join(failures))
+    print("Import-time check passed.")
+
+
+class _ChartRecorder:
+    """Stands in for a chart pool on H3MEngine and only records the chart arguments."""
+
+    def __init__(self):
+        self.charts = []
+
+    def submit(self, *args):
+        self.charts.append(args)
+
+
+def bench_charts(days: int):
+    """
+    Trade charts of a backtest: plot_trade_with_context per trade vs trade_charts.TradeChartBatch
+    (prepared views, one reused figure) writing PNGs (byte-identical to the per-trade files), a PDF and a sprite.
+    """
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    import backtest
+    from trade_charts import TradeChartBatch, plot_trade_with_context
+
+    h1, m5 = make_synthetic_ohlc(days)
+    recorder = _ChartRecorder()
+    with contextlib.redirect_stdout(io.StringIO()):
+        backtest.H3MEngine("EUR/USD", make_charts=True, chart_pool=recorder).process_bar_data(h1, m5)
+    charts = recorder.charts
+    print(f"Trades charted: {len(charts)}")
+
+    working_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as single_dir, tempfile.TemporaryDirectory() as batch_dir:
+        try:
+            os.chdir(single_dir)
+            started = perf_timer.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for chart in charts:
+                    plot_trade_with_context(*chart)
+            single_seconds = perf_timer.perf_counter() - started
+            _report("plot_trade_with_context", len(charts), single_seconds, "charts")
+
+            os.chdir(batch_dir)
+            for output in TradeChartBatch.OUTPUTS:
+                batch = TradeChartBatch(output)
+                started = perf_timer.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for chart in charts:
+                        batch.submit(*chart)
+                    batch.close()
+                seconds = perf_timer.perf_counter() - started
+                _report(f"TradeChartBatch ({output})", len(charts), seconds, "charts")
+                print(f"  speedup: {single_seconds / seconds:.1f}x")
+        finally:
+            os.chdir(working_dir)
+
+        single_files = sorted(os.listdir(os.path.join(single_dir, "charts")))
+        for name in single_files:
+            with open(os.path.join(single_dir, "charts", name), 'rb') as single, open(os.path.join(batch_dir, "charts", name), 'rb') as batch:
+                assert single.read() == batch.read(), f"{name}: batch PNG differs"
+        print(f"PNG files identical: {len(single_files)}")
+
+
+def _write_cbot_log(path: str, h1: pd.DataFrame):
+    """Writes H1 bars as a cBot chart log (H3M.cs LogChartEvent): H1_BAR rows, other events and some repeated bars."""
+    header = "Timestamp;EventType;H1_Open;H1_High;H1_Low;H1_Close;Price1;Price2;TradeType;Notes"
+    stamps = h1.index.strftime('%Y-%m-%dT%H:%M:%S')
+    with open(path, 'w') as f:
+        f.write(header + "\n")
+        for i, (stamp, o, h, l, c) in enumerate(zip(stamps, h1['open'], h1['high'], h1['low'], h1['close'])):
+            bar = f"{stamp};H1_BAR;{o};{h};{l};{c};;;;\n"
+            f.write(bar)
+            if i % 24 == 0:
+                f.write(f"{stamp};ASIA_RANGE;;;;;{h};{l};;Asia high: low\n")
+            if i % 100 == 0:
+                f.write(bar) # Repeated bar, as after a cBot restart
+
+
+def _h1_bars_by_rows(csv_file_path: str) -> list:
+    """Candles the way custom_chart_plotter built them before read_h1_bars: iterrows, float() per field, set de-duplication."""
+    df = pd.read_csv(csv_file_path, delimiter=';')
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+    candlestick_data = []
+    for _, row in df[df['EventType'] == 'H1_BAR'].iterrows():
+        candlestick_data.append({"time": int(row['Timestamp'].timestamp()), "open": float(row['H1_Open']),
+                                 "high": float(row['H1_High']), "low": float(row['H1_Low']), "close": float(row['H1_Close'])})
+    candlestick_data = [dict(t) for t in {tuple(d.items()) for d in candlestick_data}]
+    candlestick_data.sort(key=lambda x: x['time'])
+    return candlestick_data
+
+
+def bench_chart_csv(days: int):
+    """cBot chart log -> Lightweight Charts candles: per-row loop vs chunked, vectorized read_h1_bars (same candles)."""
+    from custom_chart_plotter import candlestick_records, read_h1_bars
+
+    h1, _ = make_synthetic_ohlc(days)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "chart_data_EURUSD_h1.csv")
+        _write_cbot_log(path, h1)
+        print(f"H1 bars: {len(h1):,}, log size: {os.path.getsize(path) / 1e6:.1f} MB")
+
+        def measure(label, build):
+            started = perf_timer.perf_counter()
+            records = build()
+            seconds = perf_timer.perf_counter() - started
+            _report(label, len(records), seconds, "candles")
+            tracemalloc.start() # Separate run: tracing slows the allocations down
+            build()
+            print(f"  peak memory: {tracemalloc.get_traced_memory()[1] / 1e6:.1f} MB")
+            tracemalloc.stop()
+            return records, seconds
+
+        rows, rows_seconds = measure("iterrows (before)", lambda: _h1_bars_by_rows(path))
+
+        def chunked():
+            bars, _ = read_h1_bars(path, chunk_rows=50_000)
+            return candlestick_records(bars['time'], bars['open'], bars['high'], bars['low'], bars['close'])
+        vectorized, vectorized_seconds = measure("read_h1_bars (after)", chunked)
+
+    assert vectorized == rows
+    print(f"Speedup: {rows_seconds / vectorized_seconds:.1f}x")
+
+
+def bench_chart_feed(days: int):
+    """Lightweight Charts page for 1/10 of the history and all of it: inline candles vs --feed chunk files (page size, generation time)."""
+    from custom_chart_plotter import candlestick_records, write_chart_feed, write_chart_html
+
+    h1, _ = make_synthetic_ohlc(days)
+    times = h1.index.to_numpy(dtype='datetime64[s]').astype('int64')
+    all_bars = pd.DataFrame({'time': times, 'open': h1['open'].to_numpy(), 'high': h1['high'].to_numpy(),
+                             'low': h1['low'].to_numpy(), 'close': h1['close'].to_numpy()})
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for count in (len(all_bars) // 10, len(all_bars)):
+            bars = all_bars.iloc[-count:].reset_index(drop=True)
+            print(f"H1 bars: {count:,}")
+            inline_path = os.path.join(tmp_dir, f"inline_{count}.html")
+            feed_path = os.path.join(tmp_dir, f"feed_{count}.html")
+            with contextlib.redirect_stdout(io.StringIO()):
+                started = perf_timer.perf_counter()
+                write_chart_html(candlestick_records(bars['time'], bars['open'], bars['high'], bars['low'], bars['close']), "inline", inline_path)
+                inline_seconds = perf_timer.perf_counter() - started
+                started = perf_timer.perf_counter()
+                write_chart_feed(bars, "feed", feed_path)
+                feed_seconds = perf_timer.perf_counter() - started
+            feed_dir = os.path.splitext(feed_path)[0] + "_data"
+            largest_chunk = max(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(feed_dir) for name in names)
+            print(f"  inline page: {os.path.getsize(inline_path) / 1e6:8.2f} MB  ({inline_seconds:.2f} s)")
+            print(f"  feed page:   {os.path.getsize(feed_path) / 1e6:8.2f} MB  ({feed_seconds:.2f} s), largest chunk file {largest_chunk / 1e3:.0f} KB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="H3M backtester benchmarks (synthetic data)")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    bar_loop_parser = subparsers.add_parser("bar-loop", help="M5 event loop throughput (bars/s)")
+    bar_loop_parser.add_argument("--days", type=int, default=260, help="Calendar days of synthetic M5 data (default: 260)")
+
+    decode_parser = subparsers.add_parser("decode", help="time_series JSON decode throughput (rows/s)")
+    decode_parser.add_argument("--rows", type=int, default=5000, help="Rows per response (default: 5000, one full page)")
+    decode_parser.add_argument("--repeats", type=int, default=20, help="Responses decoded per variant (default: 20)")
+
+    compact_parser = subparsers.add_parser("compact", help="CompactOHLC vs DataFrame backtest: identical trades, memory, time")
+    compact_parser.add_argument("--days", type=int, default=260, help="Calendar days of synthetic data (default: 260)")
+
+    trend_parser = subparsers.add_parser("trend", help="Daily H1 trend: per-day prefix scan vs vectorized trend_by_day")
+    trend_parser.add_argument("--days", type=int, default=1300, help="Calendar days of synthetic data (default: 1300)")
+
+    sweep_bos_parser = subparsers.add_parser("sweep-bos", help="Sweep/BOS stage: every M5 bar vs DayScanner skipping (same trades and log)")
+    sweep_bos_parser.add_argument("--days", type=int, default=520, help="Calendar days of synthetic data (default: 520)")
+
+    resolve_parser = subparsers.add_parser("resolve", help="SL/TP resolution: per-trade simulation vs batch resolver")
+    resolve_parser.add_argument("--trades", type=int, default=5000, help="Random trades to resolve (default: 5000)")
+
+    kernel_parser = subparsers.add_parser("kernel", help="Full backtests: H3MEngine vs the array kernel (Numba if installed)")
+    kernel_parser.add_argument("--days", type=int, default=1300, help="Calendar days of synthetic data (default: 1300)")
+
+    import_parser = subparsers.add_parser("import-time", help="Cold import time of the backtest core; fails if it loads the plotting stack")
+    import_parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per module (default: 5)")
+    import_parser.add_argument("--max-seconds", type=float, default=None, help="Fail if a core module's median import time exceeds this")
+
+    charts_parser = subparsers.add_parser("charts", help="Trade charts: one figure per trade vs batch rendering (PNG/PDF/sprite)")
+    charts_parser.add_argument("--days", type=int, default=260, help="Calendar days of synthetic data (default: 260)")
+
+    chart_csv_parser = subparsers.add_parser("chart-csv", help="cBot chart log -> chart candles: iterrows vs chunked vectorized read")
+    chart_csv_parser.add_argument("--days", type=int, default=2600, help="Calendar days of synthetic data (default: 2600)")
+
+    chart_feed_parser = subparsers.add_parser("chart-feed", help="Lightweight Charts page size: inline candles vs chunked --feed files")
+    chart_feed_parser.add_argument("--days", type=int, default=3650, help="Calendar days of synthetic data (default: 3650)")
+
+    args = parser.parse_args()
+    if args.benchmark == "bar-loop":
+        bench_bar_loop(args.days)
+    elif args.benchmark == "decode":
+        bench_decode(args.rows, args.repeats)
+    elif args.benchmark == "compact":
+        bench_compact(args.days)
+    elif args.benchmark == "trend":
+        bench_trend(args.days)
+    elif args.benchmark == "sweep-bos":
+        bench_sweep_bos(args.days)
+    elif args.benchmark == "resolve":
+        bench_resolve(args.trades)
+    elif args.benchmark == "kernel":
+        bench_kernel(args.days)
+    elif args.benchmark == "import-time":
+        bench_import_time(args.repeats, args.max_seconds)
+    elif args.benchmark == "charts":
+        bench_charts(args.days)
+    elif args.benchmark == "chart-csv":
+        bench_chart_csv(args.days)
+    elif args.benchmark == "chart-feed":
+        bench_chart_feed(args.days)
@@ -0,0 +1,156 @@
+# --- Chart Pool ---
+# Background rendering of trade charts. H3MEngine.process_bar_data hands each trade's chart to a
+# ChartPool instead of calling plot_trade_with_context inline, so the simulation never waits for
+# mplfinance/savefig; a pool of worker processes renders the queued charts meanwhile.
+#
+# A job carries only the small trade context (trade dict, Asia level, sweep bar, BOS level). With a
+# bar store (bar_store.BarStore root), workers read the bars around the trade from the memory-mapped
+# store themselves; otherwise the job also carries the few hundred bars the chart shows.
+#
+# Usage (from python/backtest):
+#   python backtest.py --start_date ... --end_date ... --bar-store --charts-async --chart-workers 4
+
+import contextlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import pandas as pd
+
+_worker_store = None # bar_store.BarStore of the current worker process, set by _init_worker
+
+
+class ChartJob:
+    """Everything a worker needs for one trade chart (picklable, a few KB)."""
+    __slots__ = ('trade_info', 'symbol', 'prefix', 'asia_level_data', 'sweep_bar_data', 'bos_level_data', 'pip_size',
+                 'h1_bars', 'm5_bars')
+
+    def __init__(self, trade_info, symbol, prefix, asia_level_data, sweep_bar_data, bos_level_data, pip_size,
+                 h1_bars=None, m5_bars=None):
+        self.trade_info = trade_info
+        self.symbol = symbol
+        self.prefix = prefix
+        self.asia_level_data = asia_level_data
+        self.sweep_bar_data = sweep_bar_data
+        self.bos_level_data = bos_level_data
+        self.pip_size = pip_size
+        self.h1_bars = h1_bars # None: read from the worker's bar store
+        self.m5_bars = m5_bars
+
+
+def chart_ranges(trade_info: dict):
+    """
+    Time ranges of the bars a trade chart shows, as plot_trade_with_context selects them.
+
+    Returns:
+        tuple: ((h1_start, h1_end), (m5_start, m5_end)), all bounds inclusive, in the trade's timezone.
+    """
+    entry_time = pd.Timestamp(trade_info['entry_time'])
+    exit_time = pd.Timestamp(trade_info['exit_time']) if trade_info['exit_time'] else None
+    m5_start = entry_time - timedelta(hours=1)
+    m5_end = exit_time + timedelta(hours=1) if exit_time is not None else entry_time + timedelta(hours=4)
+    h1_start = pd.Timestamp(entry_time.date() - timedelta(days=1), tz=entry_time.tz)
+    h1_end = pd.Timestamp((exit_time or entry_time).date() + timedelta(days=2), tz=entry_time.tz) - timedelta(minutes=1) # H1 bars open on the hour
+    return (h1_start, h1_end), (m5_start, m5_end)
+
+
+def _window(bars: pd.DataFrame, start, end) -> pd.DataFrame:
+    """Bars of a sorted frame with start <= time <= end, as a standalone copy (small enough to pickle)."""
+    index = bars.index
+    return bars.iloc[index.searchsorted(start, side='left'):index.searchsorted(end, side='right')].copy()
+
+
+def _init_worker(store_root):
+    global _worker_store
+    os.environ.setdefault('MPLBACKEND', 'Agg') # Workers never show windows
+    if store_root is not None:
+        from bar_store import BarStore
+        _worker_store = BarStore(store_root)
+
+
+def _job_bars(job: ChartJob):
+    """The job's (h1_bars, m5_bars): the ones it carries, or the chart's ranges read from the worker's bar store."""
+    if job.h1_bars is not None:
+        return job.h1_bars, job.m5_bars
+    (h1_start, h1_end), (m5_start, m5_end) = chart_ranges(job.trade_info)
+    return (_worker_store.frame(job.symbol, "1h", h1_start, h1_end),
+            _worker_store.frame(job.symbol, "5min", m5_start, m5_end))
+
+
+def _render(job: ChartJob):
+    """Renders one chart in a worker. Returns (entry_time, ok, log) with the captured plot output."""
+    from trade_charts import plot_trade_with_context
+
+    log = io.StringIO()
+    ok = True
+    with contextlib.redirect_stdout(log):
+        try:
+            h1_bars, m5_bars = _job_bars(job)
+            plot_trade_with_context(job.trade_info, h1_bars, m5_bars, job.symbol, job.prefix,
+                                    job.asia_level_data, job.sweep_bar_data, job.bos_level_data, job.pip_size)
+        except Exception as e:
+            ok = False
+            print(f"[PLOT_ERROR] Chart for trade at {job.trade_info['entry_time']} failed: {e}")
+    return job.trade_info['entry_time'], ok, log.getvalue()
+
+
+class ChartPool:
+    """
+    Process pool rendering trade charts in the background.
+
+    Args:
+        store_root (str): Bar store root the workers read bars from; None to send the chart's bars with each job.
+        max_workers (int): Rendering processes.
+    """
+    __slots__ = ('store_root', '_executor', '_futures')
+
+    def __init__(self, store_root: str = None, max_workers: int = 2):
+        self.store_root = store_root
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(store_root,))
+        self._futures = []
+
+    def submit(self, trade_info: dict, h1_data: pd.DataFrame, m5_data: pd.DataFrame, symbol: str, prefix: str,
+               asia_level_data: dict = None, sweep_bar_data: dict = None, bos_level_data: dict = None,
+               pip_size: float = 0.0001):
+        """Queues a chart (same arguments as plot_trade_with_context) and returns immediately."""
+        job = ChartJob(trade_info, symbol, prefix, asia_level_data, sweep_bar_data, bos_level_data, pip_size)
+        if self.store_root is None:
+            (h1_start, h1_end), (m5_start, m5_end) = chart_ranges(trade_info)
+            job.h1_bars = _window(h1_data, h1_start, h1_end)
+            job.m5_bars = _window(m5_data, m5_start, m5_end)
+        self._futures.append(self._executor.submit(_render, job))
+
+    @property
+    def pending(self) -> int:
+        return sum(1 for future in self._futures if not future.done())
+
+    def close(self, verbose: bool = False):
+        """
+        Waits for the queued charts and shuts the workers down.
+
+        Args:
+            verbose (bool): Print the workers' full plot logs instead of only errors and a summary.
+
+        Returns:
+            int: Number of charts rendered successfully.
+        """
+        rendered = 0
+        try:
+            for future in self._futures:
+                entry_time, ok, log = future.result()
+                rendered += ok
+                for line in log.splitlines():
+                    if verbose or line.startswith(("[PLOT]", "[PLOT_ERROR", "[PLOT_WARN]")):
+                        print(line)
+        finally:
+            self._executor.shutdown() # Also when a worker died (BrokenProcessPool), so none is left behind
+        print(f"[CHART_POOL] {rendered} of {len(self._futures)} chart(s) rendered in the background.")
+        self._futures = []
+        return rendered
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
@@ -0,0 +1,58 @@
+# --- Day Index ---
+# Start/end row positions per UTC date for a chronologically sorted, datetime-indexed frame.
+# Computed once per backtest so that per-day views in process_bar_data are positional
+# slices (df.iloc[start:end]) instead of O(N) boolean masks over index.date.
+
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 86_400 * 1_000_000_000
+
+
+def index_to_ns(index: pd.DatetimeIndex) -> np.ndarray:
+    """Returns the index as int64 UTC epoch nanoseconds (naive indexes are taken to be UTC)."""
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return np.asarray(index, dtype='datetime64[ns]').view(np.int64)
+
+
+class DayIndex:
+    """
+    Day boundaries of a sorted DatetimeIndex.
+
+    Attributes:
+        dates (list): datetime.date of every UTC day that has at least one bar, ascending.
+        starts (np.ndarray): Position of the first bar of each day in 'dates'.
+        ends (np.ndarray): Position one past the last bar of each day in 'dates'.
+        times_ns (np.ndarray): The index as int64 epoch nanoseconds.
+    """
+
+    def __init__(self, index):
+        # 'index' may also be int64 epoch nanoseconds (e.g. CompactOHLC.times_ns), used without a copy
+        self.times_ns = index if isinstance(index, np.ndarray) and index.dtype == np.int64 else index_to_ns(index)
+        if len(self.times_ns) and np.any(np.diff(self.times_ns) < 0):
+            raise ValueError("DayIndex requires a chronologically sorted index.")
+
+        day_numbers = self.times_ns // NS_PER_DAY
+        boundaries = np.flatnonzero(np.diff(day_numbers)) + 1
+        self.starts = np.r_[0, boundaries] if len(day_numbers) else np.empty(0, dtype=np.int64)
+        self.ends = np.r_[boundaries, len(day_numbers)] if len(day_numbers) else np.empty(0, dtype=np.int64)
+        day_starts_ns = day_numbers[self.starts] * NS_PER_DAY
+        self.dates = [d.date() for d in pd.to_datetime(day_starts_ns)]
+        self._bounds_by_date = {d: (int(s), int(e)) for d, s, e in zip(self.dates, self.starts, self.ends)}
+
+    def bounds(self, date):
+        """Returns (start, end) positions of the bars on 'date'; (0, 0) if there are none."""
+        return self._bounds_by_date.get(date, (0, 0))
+
+    def position_before(self, timestamp) -> int:
+        """Number of bars strictly before 'timestamp' (i.e. df.iloc[:n] == df[df.index < timestamp])."""
+        timestamp = pd.Timestamp(timestamp)
+        if timestamp.tz is not None:
+            timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+        timestamp_ns = np.datetime64(timestamp.to_datetime64(), 'ns').astype(np.int64)
+        return int(np.searchsorted(self.times_ns, timestamp_ns, side='left'))
+
+    def day_start_position(self, date) -> int:
+        """Number of bars before midnight UTC at the start of 'date' (works for dates without bars too)."""
+        return self.position_before(pd.Timestamp(date))
@@ -0,0 +1,354 @@
+# --- Fractal Engine ---
+# NumPy implementation of the H1 fractal detection used by the H3M backtester.
+# A bar is an up (down) fractal when its high (low) is strictly above (below) the
+# highs (lows) of the 'period' bars on each side of it.
+
+import bisect
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from day_index import DayIndex
+
+
+def find_fractal_flags(highs, lows, period: int):
+    """
+    Flags up and down fractals in one pass using sliding-window comparisons.
+
+    Args:
+        highs (array-like): High prices in chronological order.
+        lows (array-like): Low prices in chronological order (same length as highs).
+        period (int): Number of bars to check on each side of a potential fractal.
+
+    Returns:
+        tuple: (is_up_fractal, is_down_fractal) boolean NumPy arrays with one entry per bar.
+               The first and last 'period' bars are never flagged.
+    """
+    highs = np.asarray(highs)
+    lows = np.asarray(lows)
+    n = len(highs)
+    is_up_fractal = np.zeros(n, dtype=bool)
+    is_down_fractal = np.zeros(n, dtype=bool)
+
+    window_size = 2 * period + 1
+    if period < 1 or n < window_size:
+        return is_up_fractal, is_down_fractal
+
+    # Each row is one window of 2*period+1 bars; the middle column is the candidate bar.
+    high_windows = sliding_window_view(highs, window_size)
+    low_windows = sliding_window_view(lows, window_size)
+    neighbour_cols = np.r_[0:period, period + 1:window_size]
+    centre_highs = high_windows[:, period, None]
+    centre_lows = low_windows[:, period, None]
+
+    # Written as "no neighbour is >= / <=" (instead of "all neighbours are < / >") so that
+    # NaN neighbours behave exactly like in the original scalar loop.
+    is_up_fractal[period:n - period] = ~(high_windows[:, neighbour_cols] >= centre_highs).any(axis=1)
+    is_down_fractal[period:n - period] = ~(low_windows[:, neighbour_cols] <= centre_lows).any(axis=1)
+    return is_up_fractal, is_down_fractal
+
+
+def _select_extreme_per_day(is_fractal, levels, bar_days, n_days: int, highest: bool):
+    """
+    Per day, the highest (lowest) flagged level and the position of its first occurrence, like
+    max()/min() over the day's fractals in order: a NaN first fractal makes the day's level NaN
+    (no position); later NaN fractals are ignored.
+
+    Returns:
+        tuple: (levels, positions) arrays of length n_days; NaN / -1 where a day has no usable fractal.
+    """
+    day_levels = np.full(n_days, np.nan)
+    day_positions = np.full(n_days, -1, dtype=np.int64)
+    fractal_positions = np.flatnonzero(is_fractal)
+    if len(fractal_positions) == 0:
+        return day_levels, day_positions
+
+    values = levels[fractal_positions]
+    groups = bar_days[fractal_positions]
+    group_starts = np.flatnonzero(np.r_[True, np.diff(groups) > 0])
+    reducer = np.maximum if highest else np.minimum
+    best = reducer.reduceat(np.where(np.isnan(values), -np.inf if highest else np.inf, values), group_starts)
+    best[np.isnan(values[group_starts])] = np.nan
+
+    group_sizes = np.diff(np.r_[group_starts, len(values)])
+    candidates = np.where(values == np.repeat(best, group_sizes), np.arange(len(values)), len(values))
+    first_match = np.minimum.reduceat(candidates, group_starts)
+    found = first_match < len(values)
+    day_levels[groups[group_starts]] = best
+    day_positions[groups[group_starts][found]] = fractal_positions[first_match[found]]
+    return day_levels, day_positions
+
+
+def asia_fractals_by_day(h1_data, period: int, start_hour: int, end_hour_exclusive: int):
+    """
+    Highest up fractal and lowest down fractal of every day's Asia window in one pass.
+
+    Per day, the H1 bars with start_hour <= hour < end_hour_exclusive are taken on their own (as
+    H3MEngine.find_asia_fractals does) and fractals are searched within them; windows never span
+    two days.
+
+    Args:
+        h1_data (pd.DataFrame): Chronological H1 bars with 'high'/'low' columns, indexed by datetime.
+        period (int): Number of bars to check on each side of a potential fractal.
+        start_hour (int): First UTC hour of the window.
+        end_hour_exclusive (int): UTC hour at which the window ends.
+
+    Returns:
+        pd.DataFrame: One row per date with H1 bars: 'asia_bars' (bars in the window), 'high' and
+                      'high_time' (highest up fractal), 'low' and 'low_time' (lowest down fractal).
+                      Levels are NaN and times NaT where a day has no such fractal.
+    """
+    days = DayIndex(h1_data.index)
+    n_days = len(days.dates)
+    hours = h1_data.index.hour.to_numpy()
+    positions = np.flatnonzero((hours >= start_hour) & (hours < end_hour_exclusive))
+    bar_days = np.repeat(np.arange(n_days), days.ends - days.starts)[positions]
+
+    highs = h1_data['high'].to_numpy(dtype=np.float64)[positions]
+    lows = h1_data['low'].to_numpy(dtype=np.float64)[positions]
+    is_up_fractal, is_down_fractal = find_fractal_flags(highs, lows, period)
+    if period >= 1 and len(positions) > 2 * period:
+        same_day = np.zeros(len(positions), dtype=bool)
+        same_day[period:-period] = bar_days[:-2 * period] == bar_days[2 * period:]
+        is_up_fractal &= same_day
+        is_down_fractal &= same_day
+
+    high_levels, high_positions = _select_extreme_per_day(is_up_fractal, highs, bar_days, n_days, highest=True)
+    low_levels, low_positions = _select_extreme_per_day(is_down_fractal, lows, bar_days, n_days, highest=False)
+
+    def bar_times(window_positions):
+        found = window_positions >= 0
+        bar_positions = np.zeros(n_days, dtype=np.int64)
+        bar_positions[found] = positions[window_positions[found]]
+        return h1_data.index.take(bar_positions).where(found)
+
+    return pd.DataFrame({'asia_bars': np.bincount(bar_days, minlength=n_days),
+                         'high': high_levels, 'high_time': bar_times(high_positions),
+                         'low': low_levels, 'low_time': bar_times(low_positions)},
+                        index=pd.Index(days.dates, name='date'))
+
+
+class FractalIndex:
+    """
+    Sorted up/down fractal levels for O(log n) take-profit lookups.
+
+    Built once per backtest instead of rescanning the H1 history for every trade candidate.
+    Bars can be appended incrementally with update(); only the last 2*period bars are kept
+    around, which is all that is needed to confirm the fractals of newly arrived bars.
+
+    Fractals are stored in the order they were confirmed, i.e. when the last of their
+    'period' right-hand bars closed. As-of queries only see fractals confirmed by the
+    given timestamp, so TP selection has no lookahead and never slices the H1 DataFrame.
+    """
+
+    def __init__(self, period: int, bar_duration=np.timedelta64(1, 'h')):
+        if period < 1:
+            raise ValueError(f"FractalIndex requires period >= 1, got {period}.")
+        self.period = period
+        self.bar_duration = np.timedelta64(bar_duration, 'ns')
+        self._up_store = _FractalStore()
+        self._down_store = _FractalStore()
+        self._tail_highs = np.empty(0)
+        self._tail_lows = np.empty(0)
+        self._tail_times = np.empty(0, dtype='datetime64[ns]')
+
+    @classmethod
+    def from_frame(cls, h1_data, period: int, bar_duration=np.timedelta64(1, 'h')):
+        """Builds an index over a DataFrame with 'high'/'low' columns indexed by datetime."""
+        index = cls(period, bar_duration)
+        if h1_data is not None and not h1_data.empty:
+            index.update(h1_data['high'].to_numpy(), h1_data['low'].to_numpy(), h1_data.index)
+        return index
+
+    def update(self, highs, lows, times):
+        """
+        Appends new bars (chronological, after every bar already added) and indexes the
+        fractals that they confirm.
+
+        Returns:
+            tuple: (new_up_fractals, new_down_fractals) as lists of (price, time) tuples.
+        """
+        if len(highs) == 0:
+            return [], []
+        highs = np.concatenate([self._tail_highs, np.asarray(highs)])
+        lows = np.concatenate([self._tail_lows, np.asarray(lows)])
+        times = np.concatenate([self._tail_times, np.asarray(times, dtype='datetime64[ns]')])
+
+        # Centres in the kept tail were either already evaluated or still lack right-hand bars,
+        # so every fractal found here is new.
+        is_up_fractal, is_down_fractal = find_fractal_flags(highs, lows, self.period)
+        confirmed_at = np.empty(len(times), dtype='datetime64[ns]')
+        confirmed_at[:max(0, len(times) - self.period)] = times[self.period:] + self.bar_duration # Fewer bars than 'period': none
+        confirmed_ns = confirmed_at.view(np.int64)
+
+        new_up, new_down = [], []
+        for position in np.flatnonzero(is_up_fractal):
+            self._up_store.append(confirmed_ns[position], highs[position], times[position])
+            new_up.append((highs[position], times[position]))
+        for position in np.flatnonzero(is_down_fractal):
+            self._down_store.append(confirmed_ns[position], lows[position], times[position])
+            new_down.append((lows[position], times[position]))
+        if new_up:
+            self._up_store.build_sorted_view()
+        if new_down:
+            self._down_store.build_sorted_view()
+
+        keep = 2 * self.period
+        self._tail_highs, self._tail_lows, self._tail_times = highs[-keep:], lows[-keep:], times[-keep:]
+        return new_up, new_down
+
+    def fractals_as_of(self, as_of=None):
+        """
+        Returns the fractals confirmed by as_of (all of them if None), oldest first.
+
+        Returns:
+            tuple: (list_of_up_fractals, list_of_down_fractals) of (price, time) tuples.
+        """
+        as_of_ns = _to_ns(as_of)
+        return self._up_store.fractals_as_of(as_of_ns), self._down_store.fractals_as_of(as_of_ns)
+
+    def nearest_levels(self, trade_type: str, entry_price: float, as_of=None):
+        """
+        Finds the nearest fractal level beyond entry_price in the trade direction and the next one after it.
+        'bullish' looks at up fractals above the entry, 'bearish' at down fractals below it.
+        If as_of is given, only fractals confirmed by that timestamp are considered.
+
+        Returns:
+            tuple: (nearest_level, next_level), either of which may be None.
+        """
+        store = self._up_store if trade_type == "bullish" else self._down_store
+        return store.nearest_two_as_of(_to_ns(as_of), trade_type, entry_price)
+
+    def arrays(self):
+        """
+        The fractals as NumPy arrays, for array kernels such as h3m_kernel.
+
+        Returns:
+            tuple: (up_confirmed_ns, up_levels, up_tree, down_confirmed_ns, down_levels, down_tree):
+                   confirmation times (int64 epoch nanoseconds, ascending) and the level-sorted view of
+                   _FractalStore (levels ascending without NaN, and the min-rank segment tree over them).
+        """
+        return self._up_store.arrays() + self._down_store.arrays()
+
+
+class _FractalStore:
+    """
+    Fractals of one kind in confirmation order, plus a level-sorted view for as-of queries.
+
+    The view is a segment tree over the levels in ascending order whose nodes hold the smallest
+    confirmation rank below them, so "first level beyond the entry confirmed by as-of" is one
+    O(log n) descent instead of a scan over every level beyond the entry.
+
+    Queries never change the store: they only read the sorted view, which FractalIndex.update()
+    rebuilds after appending. A FractalIndex that is no longer updated can therefore be shared
+    by engines running in several threads.
+    """
+
+    def __init__(self):
+        self.confirmed_ns = []  # ascending, used for the as-of binary search
+        self.levels = []
+        self.times = []
+        self._sorted = None  # (levels ascending without NaN, min-rank tree, leaf offset)
+        self.build_sorted_view()
+
+    def append(self, confirmed_ns, level, time):
+        """Adds a fractal; call build_sorted_view() after the last append of a batch."""
+        self.confirmed_ns.append(int(confirmed_ns))
+        self.levels.append(level)
+        self.times.append(time)
+
+    def count_as_of(self, as_of_ns):
+        if as_of_ns is None:
+            return len(self.levels)
+        return bisect.bisect_right(self.confirmed_ns, as_of_ns)
+
+    def fractals_as_of(self, as_of_ns):
+        count = self.count_as_of(as_of_ns)
+        return list(zip(self.levels[:count], self.times[:count]))
+
+    def arrays(self):
+        """(confirmed_ns, sorted levels, min-rank tree) as NumPy arrays; the tree has 2 * leaves nodes."""
+        levels, tree, _ = self._sorted
+        return np.asarray(self.confirmed_ns, dtype=np.int64), levels, np.asarray(tree, dtype=np.int64)
+
+    def build_sorted_view(self):
+        """Rebuilds the level-sorted view over every fractal appended so far."""
+        levels = np.asarray(self.levels, dtype=np.float64)
+        ranks = np.flatnonzero(~np.isnan(levels)) # NaN levels are never valid TP targets
+        order = np.argsort(levels[ranks], kind='stable')
+        leaves = 1 << max(0, len(order) - 1).bit_length()
+        tree = np.full(2 * leaves, len(levels), dtype=np.int64) # Padding: a rank no query can see
+        tree[leaves:leaves + len(order)] = ranks[order]
+        width = leaves
+        while width > 1: # Each level of nodes holds the minimum of its two children
+            tree[width // 2:width] = np.minimum(tree[width:2 * width:2], tree[width + 1:2 * width:2])
+            width //= 2
+        self._sorted = (levels[ranks][order], tree.tolist(), leaves)
+
+    @staticmethod
+    def _first_visible(tree, leaves, start, count):
+        """Smallest sorted position >= start whose rank is below count, or -1."""
+        if start >= leaves:
+            return -1
+        node = start + leaves
+        while tree[node] >= count: # Move to the next subtree on the right
+            while node & 1:
+                node >>= 1
+            if node == 0:
+                return -1
+            node += 1
+        while node < leaves:
+            node = 2 * node if tree[2 * node] < count else 2 * node + 1
+        return node - leaves
+
+    @staticmethod
+    def _last_visible(tree, leaves, stop, count):
+        """Largest sorted position < stop whose rank is below count, or -1."""
+        if stop <= 0:
+            return -1
+        node = stop - 1 + leaves
+        while tree[node] >= count: # Move to the next subtree on the left
+            while not node & 1:
+                node >>= 1
+            if node == 1:
+                return -1
+            node -= 1
+        while node < leaves:
+            node = 2 * node + 1 if tree[2 * node + 1] < count else 2 * node
+        return node - leaves
+
+    def nearest_two_as_of(self, as_of_ns, trade_type: str, entry_price: float):
+        """
+        Nearest and next-nearest level beyond entry_price among the fractals confirmed by as_of_ns:
+        the lowest two distinct levels above it ('bullish') or the highest two below it ('bearish').
+
+        Returns:
+            tuple: (nearest_level, next_level), either of which may be None.
+        """
+        levels, tree, leaves = self._sorted
+        count = self.count_as_of(as_of_ns)
+        if trade_type == "bullish":
+            position = self._first_visible(tree, leaves, int(np.searchsorted(levels, entry_price, side='right')), count)
+            if position < 0:
+                return None, None
+            nearest = levels[position]
+            position = self._first_visible(tree, leaves, int(np.searchsorted(levels, nearest, side='right')), count)
+            return nearest, (levels[position] if position >= 0 else None)
+        if trade_type == "bearish":
+            position = self._last_visible(tree, leaves, int(np.searchsorted(levels, entry_price, side='left')), count)
+            if position < 0:
+                return None, None
+            nearest = levels[position]
+            position = self._last_visible(tree, leaves, int(np.searchsorted(levels, nearest, side='left')), count)
+            return nearest, (levels[position] if position >= 0 else None)
+        return None, None
+
+
+def _to_ns(timestamp):
+    """Converts a pandas/NumPy/datetime timestamp to int64 nanoseconds (None passes through)."""
+    if timestamp is None:
+        return None
+    if hasattr(timestamp, 'to_datetime64'):
+        timestamp = timestamp.to_datetime64()
+    return int(np.datetime64(timestamp, 'ns').astype(np.int64))
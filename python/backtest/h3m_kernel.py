@@ -0,0 +1,441 @@
+# --- H3M Kernel ---
+# The per-day H3M state machine of H3MEngine.process_bar_data (Asia level -> sweep -> BOS ->
+# SL/TP -> position size -> exit) as one loop over flat arrays, for parameter sweeps and long
+# histories where the engine's logging and per-trade charts are not needed.
+#
+# All inputs that do not depend on the M5 bar loop (daily trend, Asia fractal levels, day
+# bounds, H1 fractals with their confirmation times and FractalIndex's level-sorted view) are
+# prepared once with pandas/NumPy by prepare_kernel_inputs(); the loop itself only touches
+# float/int arrays and scalars, and finds TP levels with the same O(log n) tree searches as
+# FractalIndex.nearest_levels. It is
+# compiled with Numba when it is installed (optional dependency, not required by the backtester)
+# and runs as plain Python otherwise. Trades are written into a preallocated structured array
+# (TRADE_DTYPE), one slot per tradable day.
+#
+# Every trade matches H3MEngine.process_bar_data exactly (see tests/test_h3m_kernel.py and
+# 'benchmarks.py kernel'): prices are rounded like the engine's round() on NumPy floats, and
+# balances accumulate the rounded PnL.
+
+import numpy as np
+import pandas as pd
+
+from bar_arrays import BarArrays
+from trade_resolver import SL_HIT, TP_HIT, CLOSED_EOD, ERROR_NO_BARS
+from trend_context import TrendContext
+
+try:
+    import numba
+    from numba.extending import register_jitable
+    NUMBA_AVAILABLE = True
+except ImportError:
+    numba = None
+    NUMBA_AVAILABLE = False
+
+
+def _jitable(function):
+    """
+    Kernel helper: stays a plain Python function (what the interpreted loop calls) and, when Numba is
+    installed, is also compiled into the jitted loop that calls it (numba.extending.register_jitable).
+    """
+    return register_jitable(function) if NUMBA_AVAILABLE else function
+
+
+OUTCOMES = (SL_HIT, TP_HIT, CLOSED_EOD, ERROR_NO_BARS) # Outcome codes of TRADE_DTYPE, by index
+_SL, _TP, _EOD, _NO_BARS = 0, 1, 2, 3
+
+TRADE_DTYPE = np.dtype([
+    ('day', np.int64),               # Position of the day in the M5 DayIndex
+    ('direction', np.int8),          # 1: bullish (buy), -1: bearish (sell)
+    ('outcome', np.int8),            # Index into OUTCOMES
+    ('entry_position', np.int64),    # M5 bar position of the BOS/entry bar
+    ('exit_position', np.int64),     # M5 bar position of the exit (the entry bar for ERROR_NO_BARS)
+    ('entry_price', np.float64),
+    ('sl_price', np.float64),
+    ('tp_price', np.float64),
+    ('rr', np.float64),
+    ('position_size_lots', np.float64),
+    ('exit_price', np.float64),
+    ('pnl_pips', np.float64),
+    ('pnl_currency', np.float64),
+    ('balance', np.float64),         # Account balance after the trade
+])
+
+
+class KernelInputs:
+    """Arrays and scalars of one (data, params) combination, as passed to the kernel loop."""
+    __slots__ = ('times_ns', 'high', 'low', 'close', 'hours',
+                 'day_numbers', 'day_starts', 'day_ends', 'day_directions', 'day_levels',
+                 'up_confirmed_ns', 'up_levels', 'up_tree', 'down_confirmed_ns', 'down_levels', 'down_tree', 'settings')
+
+    def arrays(self):
+        return (self.times_ns, self.high, self.low, self.close, self.hours,
+                self.day_starts, self.day_ends, self.day_directions, self.day_levels,
+                self.up_confirmed_ns, self.up_levels, self.up_tree, self.down_confirmed_ns, self.down_levels, self.down_tree)
+
+
+def prepare_kernel_inputs(data, params=None) -> KernelInputs:
+    """
+    Flattens a BacktestData and StrategyParams into kernel inputs.
+
+    Days are kept only if the engine would scan their M5 bars: a BULLISH/BEARISH H1 trend, Asia H1
+    bars for a full fractal, an Asia fractal on the trend side, and M5 bars.
+
+    Args:
+        data (backtest.BacktestData): Prepared data (its caches are used and filled).
+        params (backtest.StrategyParams): Parameter combination (default: the module configuration).
+
+    Returns:
+        KernelInputs
+    """
+    import backtest
+
+    params = params if params is not None else backtest.StrategyParams()
+    pip_size = data.pip_size
+    m5_days = data.m5_days
+    inputs = KernelInputs()
+
+    trends = data.trend_table()['trend'].to_numpy()
+    asia = data.asia_fractals(params.asia_h1_fractal_period, params.asia_start_hour_utc,
+                              params.asia_fractal_eval_hour_utc_exclusive).reindex(m5_days.dates)
+    bullish = trends == TrendContext.BULLISH
+    enough_bars = asia['asia_bars'].fillna(0).to_numpy() >= 2 * params.asia_h1_fractal_period + 1
+    levels = np.where(bullish, asia['low'].to_numpy(dtype=np.float64), asia['high'].to_numpy(dtype=np.float64))
+    level_times = np.where(bullish, asia['low_time'].isna().to_numpy(), asia['high_time'].isna().to_numpy())
+    # A level of exactly 0.0 fails the engine's truthiness check, like a missing one
+    tradable = ((bullish | (trends == TrendContext.BEARISH)) & enough_bars & ~level_times &
+                (levels != 0) & ~np.isnan(levels) & (m5_days.ends > m5_days.starts))
+
+    inputs.day_numbers = np.flatnonzero(tradable)
+    inputs.day_starts = m5_days.starts[tradable].astype(np.int64)
+    inputs.day_ends = m5_days.ends[tradable].astype(np.int64)
+    inputs.day_directions = np.where(bullish[tradable], 1, -1).astype(np.int64)
+    inputs.day_levels = levels[tradable]
+
+    if data.m5_arrays is not None:
+        bars = data.m5_arrays
+    else:
+        bars = BarArrays.from_frame(data.m5_compact.to_frame())
+    inputs.times_ns, inputs.high, inputs.low, inputs.close, inputs.hours = bars.times_ns, bars.high, bars.low, bars.close, bars.hours
+
+    fractal_index = data.fractal_index(params.h1_fractal_period)
+    (inputs.up_confirmed_ns, inputs.up_levels, inputs.up_tree,
+     inputs.down_confirmed_ns, inputs.down_levels, inputs.down_tree) = fractal_index.arrays()
+
+    inputs.settings = (
+        pip_size, 5 if pip_size == 0.0001 else 3, 3, # K bars before the sweep for the BOS level, as process_bar_data
+        params.stop_loss_buffer_pips, params.min_sl_pips, params.min_rr, params.max_rr, params.max_bos_distance_pips,
+        params.frankfurt_session_start_hour_utc, params.frankfurt_session_end_hour_utc, params.london_session_end_hour_utc,
+        backtest.INITIAL_ACCOUNT_BALANCE, backtest.RISK_PERCENT, backtest.PIP_VALUE_PER_LOT_STD_PAIR,
+        backtest.MIN_LOT_SIZE_STD, backtest.LOT_STEP_STD, backtest.MAX_LOT_SIZE_STD,
+        int(np.timedelta64(backtest.M5_BAR_DURATION, 'ns').astype(np.int64)))
+    return inputs
+
+
+# --- Kernel ---
+@_jitable
+def _round(value, digits):
+    # NumPy's rounding (what round() does on NumPy floats in the engine), not Python's correctly rounded one
+    scale = 10.0 ** digits
+    return np.rint(value * scale) / scale
+
+
+@_jitable
+def _bisect(values, value, right):
+    """bisect_right (right=True) or bisect_left of 'value' in the ascending 'values'."""
+    low, high = 0, len(values)
+    while low < high:
+        middle = (low + high) // 2
+        if values[middle] < value or (right and values[middle] == value):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+@_jitable
+def _first_visible(tree, start, count):
+    """_FractalStore._first_visible: smallest sorted position >= start whose rank is below count, or -1."""
+    leaves = len(tree) // 2
+    if start >= leaves:
+        return -1
+    node = start + leaves
+    while tree[node] >= count: # Move to the next subtree on the right
+        while node & 1:
+            node >>= 1
+        if node == 0:
+            return -1
+        node += 1
+    while node < leaves:
+        node = 2 * node if tree[2 * node] < count else 2 * node + 1
+    return node - leaves
+
+
+@_jitable
+def _last_visible(tree, stop, count):
+    """_FractalStore._last_visible: largest sorted position < stop whose rank is below count, or -1."""
+    leaves = len(tree) // 2
+    if stop <= 0:
+        return -1
+    node = stop - 1 + leaves
+    while tree[node] >= count: # Move to the next subtree on the left
+        while not node & 1:
+            node >>= 1
+        if node == 1:
+            return -1
+        node -= 1
+    while node < leaves:
+        node = 2 * node + 1 if tree[2 * node + 1] < count else 2 * node
+    return node - leaves
+
+
+@_jitable
+def _nearest_beyond(levels, tree, count, bound, above):
+    """Nearest level strictly above (or below) 'bound' among the first 'count' fractals confirmed; NaN if none."""
+    if above:
+        position = _first_visible(tree, _bisect(levels, bound, True), count)
+    else:
+        position = _last_visible(tree, _bisect(levels, bound, False), count)
+    return levels[position] if position >= 0 else np.nan
+
+
+@_jitable
+def _take_profit(bullish, entry_price, sl_price, pip_size, digits, min_rr, max_rr, confirmed_ns, levels, tree, as_of_ns):
+    """calculate_take_profit on the fractal arrays: (tp_price, rr), tp_price NaN if no fractal fits the RR range."""
+    sl_pips = abs(entry_price - sl_price) / pip_size
+    if sl_pips == 0:
+        return np.nan, 0.0
+    count = _bisect(confirmed_ns, as_of_ns, True) # Fractals confirmed by as_of_ns
+    first = _nearest_beyond(levels, tree, count, entry_price, bullish)
+    if first != first:
+        return np.nan, 0.0
+    rr1 = abs(first - entry_price) / pip_size / sl_pips
+    if min_rr <= rr1 <= max_rr:
+        return _round(first, digits), rr1
+    if rr1 > max_rr:
+        return np.nan, rr1
+    second = _nearest_beyond(levels, tree, count, first, bullish)
+    if second != second:
+        return np.nan, rr1
+    rr2 = abs(second - entry_price) / pip_size / sl_pips
+    if min_rr <= rr2 <= max_rr:
+        return _round(second, digits), rr2
+    return np.nan, rr2
+
+
+@_jitable
+def _position_size(balance, risk_percent, sl_pips, pip_value_per_lot, min_lot, lot_step, max_lot):
+    """calculate_position_size without the logging; 0.0 if no position can be taken."""
+    if sl_pips <= 0:
+        return 0.0
+    amount_per_lot = sl_pips * pip_value_per_lot
+    if amount_per_lot <= 0:
+        return 0.0
+    raw_lots = balance * (risk_percent / 100.0) / amount_per_lot
+    lots = min(max_lot, max(min_lot, (raw_lots // lot_step) * lot_step))
+    if lots <= 0:
+        return 0.0
+    return _round(lots, 2)
+
+
+def _run_days(times_ns, high, low, close, hours,
+              day_starts, day_ends, day_directions, day_levels,
+              up_confirmed_ns, up_levels, up_tree, down_confirmed_ns, down_levels, down_tree,
+              pip_size, digits, lookback, stop_buffer_pips, min_sl_pips, min_rr, max_rr, max_bos_distance_pips,
+              frankfurt_start, frankfurt_end, london_end,
+              initial_balance, risk_percent, pip_value_per_lot, min_lot, lot_step, max_lot, bar_duration_ns,
+              trades):
+    """
+    Runs every prepared day through the sweep/BOS state machine and fills 'trades' (TRADE_DTYPE,
+    one slot per day, 'day' holds the index into day_starts); returns (trade count, final balance).
+    """
+    balance = initial_balance
+    count = 0
+    for d in range(len(day_starts)):
+        start, end = day_starts[d], day_ends[d]
+        bullish = day_directions[d] > 0
+        asia_level = day_levels[d]
+        level_armed = True      # False once a BOS too far from its level invalidates the Asia level
+        swept = False
+        sweep_position = -1
+        bos_armed = False       # A BOS level was taken from bars before the sweep (it may be NaN)
+        bos_level = np.nan
+        for i in range(start, end):
+            hour = hours[i]
+            in_active = frankfurt_start <= hour < london_end
+
+            # Sweep of the Asia level (check_sweep)
+            if level_armed and not swept and (in_active or frankfurt_start <= hour < frankfurt_end):
+                if (low[i] <= asia_level) if bullish else (high[i] >= asia_level):
+                    swept = True
+                    sweep_position = i
+                    bars_used = min(i - start, lookback)
+                    bos_armed = bars_used > 0
+                    bos_level = np.nan
+                    for j in range(i - bars_used, i): # nanmax / nanmin of the bars before the sweep
+                        price = high[j] if bullish else low[j]
+                        if price == price and not (price <= bos_level if bullish else price >= bos_level):
+                            bos_level = price
+                    bos_level = _round(bos_level, digits)
+
+            # Close beyond the BOS level (check_bos)
+            if not (swept and bos_armed and in_active):
+                continue
+            entry_price = close[i]
+            if not (entry_price > bos_level if bullish else entry_price < bos_level):
+                continue
+            distance_pips = (entry_price - bos_level) / pip_size if bullish else (bos_level - entry_price) / pip_size
+            if distance_pips > max_bos_distance_pips:
+                level_armed, swept, bos_armed = False, False, False
+                continue
+
+            # Stop loss beyond the sweep bar, at least min_sl_pips away
+            if bullish:
+                sl_price = _round(low[sweep_position] - stop_buffer_pips * pip_size, digits)
+                if (entry_price - sl_price) / pip_size < min_sl_pips:
+                    sl_price = _round(entry_price - min_sl_pips * pip_size, digits)
+                sl_pips = (entry_price - sl_price) / pip_size
+            else:
+                sl_price = _round(high[sweep_position] + stop_buffer_pips * pip_size, digits)
+                if (sl_price - entry_price) / pip_size < min_sl_pips:
+                    sl_price = _round(entry_price + min_sl_pips * pip_size, digits)
+                sl_pips = (sl_price - entry_price) / pip_size
+            if not sl_pips > 0:
+                swept, bos_armed = False, False
+                continue
+
+            entry_ns = times_ns[i]
+            if bullish:
+                tp_price, rr = _take_profit(True, entry_price, sl_price, pip_size, digits, min_rr, max_rr,
+                                            up_confirmed_ns, up_levels, up_tree, entry_ns + bar_duration_ns)
+            else:
+                tp_price, rr = _take_profit(False, entry_price, sl_price, pip_size, digits, min_rr, max_rr,
+                                            down_confirmed_ns, down_levels, down_tree, entry_ns + bar_duration_ns)
+            if tp_price != tp_price: # No TP: wait for a new sweep of the same level
+                swept, bos_armed = False, False
+                continue
+            lots = _position_size(balance, risk_percent, sl_pips, pip_value_per_lot, min_lot, lot_step, max_lot)
+            if lots <= 0:
+                continue
+
+            # Exit: first later bar reaching SL or TP (SL first within a bar), else the close of the day
+            outcome, exit_position, exit_price = _NO_BARS, i, entry_price
+            if i + 1 < end:
+                outcome, exit_position, exit_price = _EOD, end - 1, close[end - 1]
+                for j in range(i + 1, end):
+                    if times_ns[j] <= entry_ns:
+                        continue
+                    if (low[j] <= sl_price) if bullish else (high[j] >= sl_price):
+                        outcome, exit_position, exit_price = _SL, j, sl_price
+                        break
+                    if (high[j] >= tp_price) if bullish else (low[j] <= tp_price):
+                        outcome, exit_position, exit_price = _TP, j, tp_price
+                        break
+            if outcome == _NO_BARS:
+                pnl_pips, pnl_currency = 0.0, 0.0
+            else:
+                pnl_pips = (exit_price - entry_price) / pip_size if bullish else (entry_price - exit_price) / pip_size
+                pnl_currency = _round(pnl_pips * lots * pip_value_per_lot, 2)
+                pnl_pips = _round(pnl_pips, 2)
+                exit_price = _round(exit_price, digits)
+            balance += pnl_currency
+
+            trade = trades[count]
+            trade['day'] = d
+            trade['direction'] = 1 if bullish else -1
+            trade['outcome'] = outcome
+            trade['entry_position'] = i
+            trade['exit_position'] = exit_position
+            trade['entry_price'] = entry_price
+            trade['sl_price'] = sl_price
+            trade['tp_price'] = tp_price
+            trade['rr'] = rr
+            trade['position_size_lots'] = lots
+            trade['exit_price'] = exit_price
+            trade['pnl_pips'] = pnl_pips
+            trade['pnl_currency'] = pnl_currency
+            trade['balance'] = balance
+            count += 1
+            break # One trade per day
+    return count, balance
+
+
+# The compiled loop; the interpreted one is _run_days itself, calling the plain Python helpers
+_run_days_compiled = numba.njit(cache=True)(_run_days) if NUMBA_AVAILABLE else None
+
+
+def run_kernel(data, params=None, inputs: KernelInputs = None, compiled: bool = None):
+    """
+    Runs the H3M strategy over 'data' with the kernel.
+
+    Args:
+        data (backtest.BacktestData): Prepared data.
+        params (backtest.StrategyParams): Parameter combination (default: the module configuration).
+        inputs (KernelInputs): Inputs from prepare_kernel_inputs(data, params), if already built.
+        compiled (bool): True/False forces the Numba-compiled/interpreted loop (None: compiled if Numba is installed).
+
+    Returns:
+        tuple: (trades, final_balance); trades is a TRADE_DTYPE array, 'day' being the position of
+               the trade's date in data.m5_days.dates.
+    """
+    inputs = inputs if inputs is not None else prepare_kernel_inputs(data, params)
+    trades = np.zeros(len(inputs.day_starts), dtype=TRADE_DTYPE)
+    arrays = inputs.arrays()
+    compiled = NUMBA_AVAILABLE if compiled is None else compiled
+    if compiled and not NUMBA_AVAILABLE:
+        raise RuntimeError("run_kernel(compiled=True) needs Numba, which is not installed.")
+    run_days = _run_days_compiled if compiled else _run_days
+    if not compiled:
+        # Interpreted loop: list indexing is much cheaper than NumPy scalar indexing from Python
+        arrays = tuple(array.tolist() for array in arrays)
+    count, final_balance = run_days(*arrays, *inputs.settings, trades)
+    trades = trades[:count]
+    trades['day'] = inputs.day_numbers[trades['day']]
+    return trades, float(final_balance)
+
+
+def trade_records(trades: np.ndarray, data) -> list:
+    """
+    Converts kernel trades to the trade dicts of H3MEngine.process_bar_data (simulate_trade_outcome
+    records), e.g. for backtest.summarize_trades or comparisons with the engine.
+    """
+    if data.m5_compact is None:
+        index = data.m5_dataframe.index
+    else:
+        index = data.m5_compact.index()
+    records = []
+    for trade in trades:
+        entry_time = index[trade['entry_position']]
+        outcome = OUTCOMES[trade['outcome']]
+        if outcome == ERROR_NO_BARS:
+            records.append({'outcome': outcome, 'exit_price': trade['entry_price'], 'exit_time': entry_time,
+                            'pnl_pips': 0, 'pnl_currency': 0, 'position_size_lots': trade['position_size_lots']})
+            continue
+        records.append({
+            'outcome': outcome,
+            'entry_price': trade['entry_price'],
+            'entry_time': entry_time,
+            'sl_price': trade['sl_price'],
+            'tp_price': trade['tp_price'],
+            'trade_direction': TrendContext.BULLISH if trade['direction'] > 0 else TrendContext.BEARISH,
+            'exit_price': trade['exit_price'],
+            'exit_time': index[trade['exit_position']],
+            'pnl_pips': trade['pnl_pips'],
+            'pnl_currency': trade['pnl_currency'],
+            'position_size_lots': trade['position_size_lots'],
+        })
+    return records
+
+
+def trades_frame(trades: np.ndarray, data) -> pd.DataFrame:
+    """Kernel trades as a DataFrame with dates, times, direction and outcome names instead of positions and codes."""
+    frame = pd.DataFrame(trades)
+    if data.m5_compact is None:
+        index = data.m5_dataframe.index
+    else:
+        index = data.m5_compact.index()
+    frame.insert(0, 'date', [data.m5_days.dates[day] for day in trades['day']])
+    frame['entry_time'] = index[trades['entry_position']]
+    frame['exit_time'] = index[trades['exit_position']]
+    frame['direction'] = np.where(trades['direction'] > 0, TrendContext.BULLISH, TrendContext.BEARISH)
+    frame['outcome'] = np.asarray(OUTCOMES, dtype=object)[trades['outcome']]
+    return frame.drop(columns=['day'])
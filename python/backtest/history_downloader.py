@@ -0,0 +1,159 @@
+# --- History Downloader ---
+# Paginated download of long OHLC ranges from Twelve Data.
+# One time_series request returns at most OUTPUTSIZE_LIMIT bars (about 17 trading days of M5),
+# so a long range is split into windows that fit the limit. Windows are fetched over one pooled
+# requests.Session within a request-rate budget and streamed into the OHLCCache as they arrive;
+# the cache de-duplicates the shared boundary bars.
+#
+# Usage (from python/backtest):
+#   python history_downloader.py --symbols EUR/USD GBP/USD --intervals 5min 1h \
+#       --start_date "2021-01-01 00:00:00" --end_date "2024-01-01 00:00:00" --requests-per-minute 8
+
+import argparse
+import time as sleep_timer
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+from bar_store import INTERVAL_DURATIONS
+
+OUTPUTSIZE_LIMIT = 5000 # Max bars per Twelve Data time_series request
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class RateBudget:
+    """
+    Sliding-window request limiter: at most max_requests calls of acquire() per per_seconds.
+    RateBudget(8, 60) matches the Twelve Data free plan.
+    """
+
+    def __init__(self, max_requests: int, per_seconds: float):
+        self.max_requests = max_requests
+        self.per_seconds = per_seconds
+        self._request_times = deque()
+
+    def acquire(self):
+        """Blocks until another request fits into the budget, then records it."""
+        while True:
+            now = sleep_timer.monotonic()
+            while self._request_times and now - self._request_times[0] >= self.per_seconds:
+                self._request_times.popleft()
+            if len(self._request_times) < self.max_requests:
+                self._request_times.append(now)
+                return
+            sleep_timer.sleep(self.per_seconds - (now - self._request_times[0]))
+
+
+def split_range(start, end, interval: str, max_bars: int = OUTPUTSIZE_LIMIT):
+    """
+    Splits [start, end] into consecutive windows of at most max_bars bars of 'interval'
+    (calendar time, so market closures only make windows smaller). Adjacent windows share
+    their boundary timestamp. Unknown intervals give a single window.
+
+    Returns:
+        list: (window_start, window_end) Timestamps, oldest first.
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    duration = INTERVAL_DURATIONS.get(interval)
+    if duration is None or end <= start:
+        return [(start, end)]
+    span = duration * (max_bars - 1)
+    windows = []
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + span, end)
+        windows.append((window_start, window_end))
+        window_start = window_end
+    return windows
+
+
+def iter_chunks(fetcher, symbol: str, interval: str, start, end, api_key: str,
+                rate_budget: RateBudget = None, max_bars: int = OUTPUTSIZE_LIMIT):
+    """
+    Fetches [start, end] window by window.
+
+    A response with max_bars bars may have been truncated, so it only counts as covering the span
+    between its first and last bar; the rest of its window is requested again. Either end is
+    handled, whichever side the API dropped.
+
+    A window without bars (the last window of a range often lies on a weekend) gives an empty
+    chunk that still covers the whole window, so it is not requested again.
+
+    Args:
+        fetcher (callable): fetcher(symbol, interval, start_str, end_str, api_key) -> DataFrame (empty if the
+                            window has no bars) or None on a transport/API error
+                            (e.g. backtest_data.get_historical_data bound to a session).
+        rate_budget (RateBudget): Acquired before every request (None: no limit).
+
+    Yields:
+        tuple: (chunk_dataframe, covered_start, covered_end). Raises RuntimeError only if a request fails.
+    """
+    pending = split_range(start, end, interval, max_bars)[::-1] # Stack, oldest window on top
+    while pending:
+        window_start, window_end = pending.pop()
+        if rate_budget is not None:
+            rate_budget.acquire()
+        chunk = fetcher(symbol, interval, window_start.strftime(DATE_FORMAT), window_end.strftime(DATE_FORMAT), api_key)
+        if chunk is None:
+            raise RuntimeError(f"Request for {symbol} ({interval}) {window_start} to {window_end} failed.")
+        if chunk.empty:
+            print(f"[Downloader] No {symbol} ({interval}) bars from {window_start} to {window_end}; window marked as covered.")
+            yield chunk, window_start, window_end
+            continue
+
+        if len(chunk) < max_bars:
+            yield chunk, window_start, window_end
+            continue
+
+        index = chunk.index.tz_convert('UTC').tz_localize(None) if chunk.index.tz is not None else chunk.index
+        first_bar, last_bar = max(index.min(), window_start), min(index.max(), window_end)
+        if first_bar > last_bar:
+            print(f"[Downloader] Response for {symbol} ({interval}) lies outside {window_start} to {window_end}; skipping window.")
+            yield chunk, window_start, window_end
+            continue
+        print(f"[Downloader] {symbol} ({interval}) {window_start} to {window_end} truncated at {len(chunk)} bars "
+              f"({first_bar} to {last_bar}); requesting the rest.")
+        yield chunk, first_bar, last_bar
+        if last_bar < window_end:
+            pending.append((last_bar, window_end))
+        if first_bar > window_start:
+            pending.append((window_start, first_bar))
+
+
+if __name__ == '__main__':
+    import requests
+    from functools import partial
+
+    import config
+    import backtest_data
+    from ohlc_cache import OHLCCache, DEFAULT_CACHE_DIR
+
+    parser = argparse.ArgumentParser(description="Bulk OHLC history downloader (Twelve Data -> local OHLC cache)")
+    parser.add_argument("--symbols", type=str, nargs='+', required=True, help="Trading symbols, e.g. EUR/USD GBP/USD")
+    parser.add_argument("--intervals", type=str, nargs='+', default=["5min", "1h"], help="Intervals (default: 5min 1h)")
+    parser.add_argument("--start_date", type=str, required=True, help="Start date (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--end_date", type=str, required=True, help="End date (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--requests-per-minute", type=int, default=8, help="Request budget (default: 8, the free plan limit)")
+    parser.add_argument("--cache-dir", type=str, default=DEFAULT_CACHE_DIR, help="Directory of the local OHLC cache")
+    args = parser.parse_args()
+
+    try:
+        datetime.strptime(args.start_date, DATE_FORMAT)
+        datetime.strptime(args.end_date, DATE_FORMAT)
+    except ValueError:
+        print("Error: Invalid date format. Please use YYYY-MM-DD HH:MM:SS for start_date and end_date.")
+        exit(1)
+
+    with requests.Session() as session:
+        cache = OHLCCache(args.cache_dir, partial(backtest_data.get_historical_data, session=session),
+                          RateBudget(args.requests_per_minute, 60))
+        for symbol in args.symbols:
+            for interval in args.intervals:
+                started = sleep_timer.perf_counter()
+                data = cache.get(symbol, interval, args.start_date, args.end_date, config.TWELVE_DATA_API_KEY)
+                if data is None:
+                    print(f"[Downloader] {symbol} ({interval}) incomplete; rerun to resume from the cached part.")
+                else:
+                    print(f"[Downloader] {symbol} ({interval}): {len(data)} bars cached "
+                          f"({sleep_timer.perf_counter() - started:.1f}s, {cache.requests_made} requests so far).")
@@ -0,0 +1,213 @@
+# --- Multi-Symbol Backtest Runner ---
+# Runs the H3M backtest for many symbols in parallel on a process pool.
+# OHLC data is copied once into shared-memory blocks; worker processes attach to them by
+# name instead of receiving pickled DataFrames. Per-symbol trade lists and balance curves
+# are merged into one report.
+#
+# Usage (from python/backtest):
+#   python multi_symbol_backtest.py --symbols EUR/USD GBP/USD USD/JPY \
+#       --start_date "2024-01-01 00:00:00" --end_date "2024-03-01 00:00:00" --workers 4
+
+import argparse
+import contextlib
+import io
+import os
+import time as perf_timer
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import backtest
+
+OHLC_COLUMNS = ('open', 'high', 'low', 'close')
+
+
+class SharedOHLC:
+    """
+    An OHLC frame copied into one shared-memory block laid out as 5 contiguous rows:
+    int64 epoch-ns times (UTC), then float64 open/high/low/close.
+    Only the small picklable 'descriptor' is sent to worker processes; it carries the index's
+    time zone so attached frames have the same timestamp types as the original.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        n_rows = len(df)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, (1 + len(OHLC_COLUMNS)) * n_rows * 8))
+        block = np.ndarray((1 + len(OHLC_COLUMNS), n_rows), dtype=np.float64, buffer=self.shm.buf)
+        index = df.index.tz_convert('UTC').tz_localize(None) if df.index.tz is not None else df.index
+        block[0].view(np.int64)[:] = np.asarray(index, dtype='datetime64[ns]').view(np.int64)
+        for row, column in enumerate(OHLC_COLUMNS, start=1):
+            block[row] = df[column].to_numpy(dtype=np.float64)
+        self.descriptor = (self.shm.name, n_rows, df.index.tz)
+
+    def release(self):
+        """Closes and unlinks the block (call from the process that created it)."""
+        self.shm.close()
+        self.shm.unlink()
+
+
+def attach_shared_ohlc(descriptor):
+    """
+    Attaches to a SharedOHLC block and wraps it in a DataFrame backed by the shared memory.
+    Returns: (shared_memory_handle, DataFrame). Drop the DataFrame before closing the handle.
+    """
+    name, n_rows, tz = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    block = np.ndarray((1 + len(OHLC_COLUMNS), n_rows), dtype=np.float64, buffer=shm.buf)
+    index = pd.DatetimeIndex(block[0].view(np.int64).view('datetime64[ns]'), name='datetime')
+    if tz is not None: # Stored as naive UTC
+        index = index.tz_localize('UTC').tz_convert(tz)
+    df = pd.DataFrame({column: block[row] for row, column in enumerate(OHLC_COLUMNS, start=1)}, index=index, copy=False)
+    return shm, df
+
+
+def _backtest_shared_symbol(symbol, h1_descriptor, m5_descriptor, quiet):
+    h1_shm, h1_dataframe = attach_shared_ohlc(h1_descriptor)
+    m5_shm, m5_dataframe = attach_shared_ohlc(m5_descriptor)
+    engine = backtest.H3MEngine(symbol, make_charts=False)
+    if quiet:
+        with contextlib.redirect_stdout(io.StringIO()):
+            trades, final_balance = engine.process_bar_data(h1_dataframe, m5_dataframe)
+    else:
+        trades, final_balance = engine.process_bar_data(h1_dataframe, m5_dataframe)
+    return (h1_shm, m5_shm), trades, final_balance, list(engine.balance_curve)
+
+
+def _run_symbol_worker(symbol, h1_descriptor, m5_descriptor, quiet=True):
+    """Process-pool task: runs one H3MEngine over shared-memory OHLC data for 'symbol'."""
+    started = perf_timer.perf_counter()
+    # The frames (views into the shared blocks) are gone once the helper returns, so the handles can be closed
+    handles, trades, final_balance, balance_curve = _backtest_shared_symbol(symbol, h1_descriptor, m5_descriptor, quiet)
+    for shm in handles:
+        try:
+            shm.close()
+        except BufferError:
+            pass # Still referenced somewhere; released when the worker exits
+    return {
+        'symbol': symbol,
+        'trades': trades,
+        'final_balance': final_balance,
+        'balance_curve': balance_curve,
+        'seconds': perf_timer.perf_counter() - started,
+    }
+
+
+def run_backtests_parallel(data_by_symbol: dict, max_workers: int = None, quiet: bool = True):
+    """
+    Backtests several symbols in parallel.
+
+    Args:
+        data_by_symbol (dict): symbol -> (h1_dataframe, m5_dataframe).
+        max_workers (int): Worker processes (default: os.cpu_count()).
+        quiet (bool): Suppress the per-bar strategy logs of the workers.
+
+    Returns:
+        dict: symbol -> {'trades', 'final_balance', 'balance_curve', 'seconds'} (or {'error': str}).
+    """
+    shared_blocks = []
+    results = {}
+    try:
+        tasks = {}
+        for symbol, (h1_dataframe, m5_dataframe) in data_by_symbol.items():
+            h1_shared, m5_shared = SharedOHLC(h1_dataframe), SharedOHLC(m5_dataframe)
+            shared_blocks.extend([h1_shared, m5_shared])
+            tasks[symbol] = (h1_shared.descriptor, m5_shared.descriptor)
+
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(_run_symbol_worker, symbol, h1_desc, m5_desc, quiet): symbol
+                       for symbol, (h1_desc, m5_desc) in tasks.items()}
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    results[symbol] = future.result()
+                    print(f"[MULTI] {symbol}: {len(results[symbol]['trades'])} trades in {results[symbol]['seconds']:.1f}s")
+                except Exception as e:
+                    print(f"[MULTI_ERROR] Backtest for {symbol} failed: {e}")
+                    results[symbol] = {'symbol': symbol, 'error': str(e)}
+    finally:
+        for block in shared_blocks:
+            block.release()
+    return results
+
+
+def build_report(results: dict):
+    """
+    Merges per-symbol results.
+
+    Returns:
+        tuple: (summary_df, trades_df, balance_df)
+            summary_df: one row per symbol with summarize_trades() statistics and the final balance.
+            trades_df: all trades with a 'symbol' column, ordered by entry time.
+            balance_df: per-symbol balance after every trade plus 'combined_pnl', the running
+                        sum of PnL over all symbols in exit-time order.
+    """
+    summary_rows, trade_rows, balance_rows = [], [], []
+    for symbol in sorted(results):
+        result = results[symbol]
+        if 'error' in result:
+            summary_rows.append({'symbol': symbol, 'error': result['error']})
+            continue
+        summary_rows.append({'symbol': symbol, **backtest.summarize_trades(result['trades']),
+                             'final_balance': result['final_balance']})
+        trade_rows.extend({'symbol': symbol, **trade} for trade in result['trades'])
+        balance_rows.extend({'symbol': symbol, 'time': exit_time, 'balance': balance}
+                            for exit_time, balance in result['balance_curve'])
+
+    summary_df = pd.DataFrame(summary_rows).set_index('symbol') if summary_rows else pd.DataFrame()
+    trades_df = pd.DataFrame(trade_rows)
+    if not trades_df.empty:
+        trades_df = trades_df.sort_values('entry_time', kind='stable').reset_index(drop=True)
+    balance_df = pd.DataFrame(balance_rows)
+    if not balance_df.empty:
+        balance_df = balance_df.sort_values('time', kind='stable').reset_index(drop=True)
+        balance_df['pnl'] = balance_df.groupby('symbol')['balance'].diff().fillna(
+            balance_df['balance'] - backtest.INITIAL_ACCOUNT_BALANCE)
+        balance_df['combined_pnl'] = balance_df['pnl'].cumsum()
+    return summary_df, trades_df, balance_df
+
+
+if __name__ == '__main__':
+    import config
+
+    parser = argparse.ArgumentParser(description="H3M Bot multi-symbol parallel backtester")
+    parser.add_argument("--symbols", type=str, nargs='+', required=True, help="Trading symbols, e.g. EUR/USD GBP/USD USD/JPY")
+    parser.add_argument("--start_date", type=str, required=True, help="Backtest start date (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--end_date", type=str, required=True, help="Backtest end date (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--output-dir", type=str, default=None, help="Directory for summary/trades/balance CSV files")
+    parser.add_argument("--verbose", action="store_true", help="Show the strategy logs of the workers")
+    args = parser.parse_args()
+
+    try:
+        datetime.strptime(args.start_date, "%Y-%m-%d %H:%M:%S")
+        datetime.strptime(args.end_date, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        print("Error: Invalid date format. Please use YYYY-MM-DD HH:MM:SS for start_date and end_date.")
+        exit(1)
+
+    data_by_symbol = {}
+    for symbol in args.symbols:
+        print(f"\n=== Loading data for {symbol} ===")
+        h1_data, m5_data = backtest.load_backtest_data(symbol, args.start_date, args.end_date, config.TWELVE_DATA_API_KEY)
+        if h1_data is None or h1_data.empty or m5_data is None or m5_data.empty:
+            print(f"[MULTI_WARN] No data for {symbol}. Skipping.")
+            continue
+        data_by_symbol[symbol] = (h1_data, m5_data)
+
+    results = run_backtests_parallel(data_by_symbol, args.workers, quiet=not args.verbose)
+    summary_df, trades_df, balance_df = build_report(results)
+
+    print("\n--- Multi-Symbol Summary ---")
+    print(summary_df.to_string() if not summary_df.empty else "No symbols were backtested.")
+    if not balance_df.empty:
+        print(f"\nCombined PnL (all symbols): {balance_df['combined_pnl'].iloc[-1]:.2f} (currency)")
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        summary_df.to_csv(os.path.join(args.output_dir, "summary.csv"))
+        trades_df.to_csv(os.path.join(args.output_dir, "trades.csv"), index=False)
+        balance_df.to_csv(os.path.join(args.output_dir, "balance_curve.csv"), index=False)
+        print(f"Report written to {os.path.abspath(args.output_dir)}")
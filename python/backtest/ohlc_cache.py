@@ -0,0 +1,224 @@
+# --- OHLC Cache ---
+# Persistent local store for historical OHLC data, one Parquet file per (symbol, interval).
+# A JSON sidecar records which time ranges have already been requested from the API, so a
+# backtest only fetches the gaps of its range and repeated/overlapping runs cost no API calls.
+# Gaps longer than one API response are paginated (history_downloader.iter_chunks) and every
+# chunk is written to the store as soon as it arrives, so an interrupted download resumes.
+# Chunks go to small part files and are merged into the main file once per get() (compact),
+# so a long download writes each bar a constant number of times instead of once per chunk.
+#
+# Layout of cache_dir:
+#   EUR-USD_5min.parquet        bars, naive-UTC DatetimeIndex 'datetime', open/high/low/close[/volume]
+#   EUR-USD_5min.parts/         000001.parquet, ... chunks not merged yet (newer parts win on duplicate times)
+#   EUR-USD_5min.coverage.json  [["2024-01-01 00:00:00", "2024-02-01 00:00:00"], ...] (inclusive, merged)
+
+import json
+import os
+
+import pandas as pd
+
+from history_downloader import OUTPUTSIZE_LIMIT, RateBudget, iter_chunks
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_cache")
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _to_utc_naive(timestamp) -> pd.Timestamp:
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tz is not None:
+        timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+    return timestamp
+
+
+def merge_ranges(ranges):
+    """Sorts (start, end) ranges and merges the ones that overlap or touch."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_ranges(start, end, covered):
+    """Returns the parts of [start, end] not inside any of the merged 'covered' ranges."""
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in covered:
+        if covered_end < cursor:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class OHLCCache:
+    """
+    Read-through cache in front of a historical data fetcher.
+
+    Args:
+        cache_dir (str): Directory for the Parquet/coverage files (created on first write).
+        fetcher (callable): fetcher(symbol, interval, start_str, end_str, api_key) -> DataFrame (empty if the
+                            range has no bars, e.g. a weekend) or None on failure.
+                            Defaults to backtest_data.get_historical_data.
+        rate_budget (RateBudget): Limit for the API requests made through the cache
+                                  (default: one per second, replacing the fixed sleep between fetches).
+        outputsize_limit (int): Bars per response at which the API truncates; longer gaps are paginated.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, fetcher=None, rate_budget: RateBudget = None,
+                 outputsize_limit: int = OUTPUTSIZE_LIMIT):
+        if fetcher is None:
+            import backtest_data
+            fetcher = backtest_data.get_historical_data
+        self.cache_dir = cache_dir
+        self.fetcher = fetcher
+        self.rate_budget = rate_budget if rate_budget is not None else RateBudget(1, 1.0)
+        self.outputsize_limit = outputsize_limit
+        self.requests_made = 0
+
+    # --- Paths and metadata ---
+    def _base_path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.cache_dir, f"{symbol.replace('/', '-')}_{interval}")
+
+    def data_path(self, symbol: str, interval: str) -> str:
+        return self._base_path(symbol, interval) + ".parquet"
+
+    def parts_dir(self, symbol: str, interval: str) -> str:
+        return self._base_path(symbol, interval) + ".parts"
+
+    def _part_paths(self, symbol: str, interval: str):
+        """Part files of symbol/interval, oldest first."""
+        parts_dir = self.parts_dir(symbol, interval)
+        if not os.path.isdir(parts_dir):
+            return []
+        return [os.path.join(parts_dir, name) for name in sorted(os.listdir(parts_dir)) if name.endswith(".parquet")]
+
+    def coverage_path(self, symbol: str, interval: str) -> str:
+        return self._base_path(symbol, interval) + ".coverage.json"
+
+    def coverage(self, symbol: str, interval: str):
+        """Merged list of (start, end) Timestamps already fetched for symbol/interval."""
+        path = self.coverage_path(symbol, interval)
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return merge_ranges((pd.Timestamp(start), pd.Timestamp(end)) for start, end in json.load(f))
+
+    def missing_ranges(self, symbol: str, interval: str, start, end):
+        """(start, end) Timestamp ranges inside [start, end] that still have to be fetched."""
+        return subtract_ranges(_to_utc_naive(start), _to_utc_naive(end), self.coverage(symbol, interval))
+
+    # --- Reading and writing ---
+    def _read_bars(self, symbol: str, interval: str) -> pd.DataFrame:
+        """Main file merged with the part files not compacted yet; None if nothing is cached."""
+        path = self.data_path(symbol, interval)
+        frames = ([pd.read_parquet(path)] if os.path.exists(path) else []) + \
+                 [pd.read_parquet(part_path) for part_path in self._part_paths(symbol, interval)]
+        if not frames:
+            return None
+        if len(frames) == 1:
+            return frames[0]
+        df = pd.concat(frames)
+        return df[~df.index.duplicated(keep='last')].sort_index()
+
+    def load(self, symbol: str, interval: str, start=None, end=None) -> pd.DataFrame:
+        """Cached bars for symbol/interval between start and end (inclusive); None if nothing is cached."""
+        df = self._read_bars(symbol, interval)
+        if df is None:
+            return None
+        if start is not None or end is not None:
+            df = df.loc[None if start is None else _to_utc_naive(start):None if end is None else _to_utc_naive(end)]
+        return df
+
+    def store(self, symbol: str, interval: str, df: pd.DataFrame, covered_start, covered_end):
+        """
+        Adds 'df' to the cached bars as a new part file (its rows win over older ones on duplicate times;
+        compact() merges the parts) and marks [covered_start, covered_end] as fetched (nothing is marked
+        if covered_end < covered_start).
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if df is not None and not df.empty:
+            df = df.copy()
+            if df.index.tz is not None:
+                df.index = df.index.tz_convert('UTC').tz_localize(None)
+            df.index.name = 'datetime'
+            df = df.sort_index()
+            parts_dir = self.parts_dir(symbol, interval)
+            os.makedirs(parts_dir, exist_ok=True)
+            part_paths = self._part_paths(symbol, interval)
+            part_number = int(os.path.basename(part_paths[-1]).split('.')[0]) + 1 if part_paths else 1
+            _atomic_write(os.path.join(parts_dir, f"{part_number:06d}.parquet"), lambda tmp_path: df.to_parquet(tmp_path))
+
+        covered_start, covered_end = _to_utc_naive(covered_start), _to_utc_naive(covered_end)
+        if covered_end < covered_start:
+            return
+        covered = merge_ranges(self.coverage(symbol, interval) + [(covered_start, covered_end)])
+        payload = [[s.strftime(DATE_FORMAT), e.strftime(DATE_FORMAT)] for s, e in covered]
+        _atomic_write(self.coverage_path(symbol, interval), lambda tmp_path: _write_json(tmp_path, payload))
+
+    def compact(self, symbol: str, interval: str):
+        """Merges the part files into the main Parquet file and removes them (no-op without parts)."""
+        part_paths = self._part_paths(symbol, interval)
+        if not part_paths:
+            return
+        df = self._read_bars(symbol, interval)
+        _atomic_write(self.data_path(symbol, interval), lambda tmp_path: df.to_parquet(tmp_path))
+        for part_path in part_paths: # Removed only after the merged file is in place
+            os.remove(part_path)
+        os.rmdir(self.parts_dir(symbol, interval))
+
+    # --- Read-through access ---
+    def get(self, symbol: str, interval: str, start_date_str: str, end_date_str: str, api_key: str):
+        """
+        Same contract as backtest_data.get_historical_data, but only the uncovered parts of the
+        range are requested from the API; the result is the merged cached frame for the range.
+        Gaps the API has no bars for (weekends, holidays) are marked as covered, so they are not
+        requested again. Returns None if a gap could not be fetched.
+        """
+        start, end = _to_utc_naive(start_date_str), _to_utc_naive(end_date_str)
+        now = pd.Timestamp.now('UTC').tz_localize(None)
+        gaps = self.missing_ranges(symbol, interval, start, end)
+        if not gaps:
+            print(f"[OHLCCache] {symbol} ({interval}) {start_date_str} to {end_date_str} served from cache.")
+
+        try:
+            for gap_start, gap_end in gaps:
+                for chunk, covered_start, covered_end in iter_chunks(self._fetch, symbol, interval, gap_start, gap_end, api_key,
+                                                                     self.rate_budget, self.outputsize_limit):
+                    # Bars after 'now' do not exist yet, so that part of the range must be fetched again later
+                    self.store(symbol, interval, chunk, covered_start, min(covered_end, now))
+        except RuntimeError as e:
+            print(f"[OHLCCache] {e}")
+            return None
+        finally:
+            self.compact(symbol, interval) # Also keeps the chunks of an interrupted download
+
+        cached = self.load(symbol, interval, start, end)
+        if cached is None:
+            return pd.DataFrame(columns=['open', 'high', 'low', 'close'], index=pd.DatetimeIndex([], name='datetime'))
+        return cached
+
+    def _fetch(self, symbol, interval, start_date_str, end_date_str, api_key):
+        self.requests_made += 1
+        return self.fetcher(symbol, interval, start_date_str, end_date_str, api_key)
+
+
+def _write_json(path, payload):
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=1)
+
+
+def _atomic_write(path, write):
+    """Writes via a temporary file and os.replace so an interrupted run never leaves a truncated file."""
+    tmp_path = path + ".tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
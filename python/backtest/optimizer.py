@@ -0,0 +1,176 @@
+# --- Parameter Sweep Optimizer ---
+# Grid search over the H3M strategy parameters (see backtest.StrategyParams).
+# The data is fetched once and wrapped in a backtest.BacktestData whose day indexes, daily H1
+# trends and H1 fractal indexes are precomputed before the pool starts; every worker process
+# receives it once (pool initializer) and then only gets StrategyParams per combination.
+#
+# Usage (from python/backtest):
+#   python optimizer.py --symbol EUR/USD --start_date "2024-01-01 00:00:00" --end_date "2024-06-01 00:00:00" \
+#       --param min_rr=1.5:3.0:0.5 --param max_bos_distance_pips=10,15,20 --param h1_fractal_period=2,3 \
+#       --output optimizer_results.csv
+# Add --kernel to evaluate the combinations with h3m_kernel (same trades, no per-bar logging; compiled
+# with Numba when it is installed).
+
+import argparse
+import contextlib
+import functools
+import io
+import itertools
+import os
+import time as perf_timer
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import backtest
+import h3m_kernel
+
+_worker_data = None # BacktestData of the current worker process, set by _init_worker
+
+
+def parse_param_range(spec: str):
+    """
+    Parses "name=start:stop:step" (stop inclusive) or "name=v1,v2,..." into (name, [values]).
+    Values are cast to the type of the parameter's default (int parameters stay ints); non-integral
+    values for an int parameter raise ValueError.
+    """
+    name, sep, values_spec = spec.partition('=')
+    name = name.strip()
+    if not sep or name not in backtest.StrategyParams.__slots__:
+        raise ValueError(f"Invalid parameter range '{spec}'. Expected name=start:stop:step or name=v1,v2 "
+                         f"with name one of: {', '.join(backtest.StrategyParams.__slots__)}")
+    cast = type(getattr(backtest.StrategyParams(), name))
+
+    if ':' in values_spec:
+        start, stop, step = (float(part) for part in values_spec.split(':'))
+        if step <= 0:
+            raise ValueError(f"Step must be positive in '{spec}'.")
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        values = [round(start + i * step, 10) for i in range(max(count, 0))]
+    else:
+        values = [float(part) for part in values_spec.split(',') if part.strip()]
+    if not values:
+        raise ValueError(f"No values in parameter range '{spec}'.")
+    if cast is int:
+        fractional = [value for value in values if value != int(value)]
+        if fractional: # int() would truncate them into duplicate combinations
+            raise ValueError(f"'{name}' is an integer parameter, but '{spec}' gives non-integral values: "
+                             f"{', '.join(f'{value:g}' for value in fractional)}.")
+    return name, [cast(value) for value in values]
+
+
+def build_grid(param_ranges: dict):
+    """Returns one {name: value} dict per combination of the given {name: [values]} ranges."""
+    names = list(param_ranges)
+    return [dict(zip(names, combination)) for combination in itertools.product(*param_ranges.values())]
+
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+
+def _evaluate(overrides: dict, data=None, use_kernel: bool = False):
+    """Runs one combination quietly (no charts) and returns its summarize_trades() row."""
+    data = data if data is not None else _worker_data
+    started = perf_timer.perf_counter()
+    try:
+        params = backtest.StrategyParams(**overrides)
+        if use_kernel:
+            kernel_trades, final_balance = h3m_kernel.run_kernel(data, params)
+            trades = h3m_kernel.trade_records(kernel_trades, data)
+        else:
+            engine = backtest.H3MEngine(data.symbol, make_charts=False, params=params)
+            with contextlib.redirect_stdout(io.StringIO()):
+                trades, final_balance = engine.process_bar_data(data=data)
+        row = {**overrides, **backtest.summarize_trades(trades), 'final_balance': final_balance}
+    except Exception as e:
+        row = {**overrides, 'error': str(e)}
+    row['seconds'] = perf_timer.perf_counter() - started
+    return row
+
+
+def run_grid(data, grid, max_workers: int = None, rank_by: str = 'total_pnl_currency', use_kernel: bool = False):
+    """
+    Evaluates every combination of 'grid' over the prepared 'data'.
+
+    Args:
+        data (backtest.BacktestData): Prepared data, shared by all combinations.
+        grid (list): {parameter_name: value} dicts, e.g. from build_grid().
+        max_workers (int): Worker processes (default: os.cpu_count()); 1 runs in-process.
+        rank_by (str): Result column to sort by, descending.
+        use_kernel (bool): Evaluate with h3m_kernel.run_kernel instead of H3MEngine.
+
+    Returns:
+        pd.DataFrame: One row per combination, best first.
+    """
+    # Warm the shared caches once so the workers start with every trend, fractal index and Asia table ready
+    defaults = backtest.StrategyParams().as_dict()
+    settings = [{**defaults, **combination} for combination in grid]
+    with contextlib.redirect_stdout(io.StringIO()):
+        data.precompute(sorted({setting['h1_fractal_period'] for setting in settings}))
+    for asia_window in sorted({(setting['asia_h1_fractal_period'], setting['asia_start_hour_utc'],
+                                setting['asia_fractal_eval_hour_utc_exclusive']) for setting in settings}):
+        data.asia_fractals(*asia_window)
+
+    if max_workers == 1:
+        rows = [_evaluate(combination, data, use_kernel) for combination in grid]
+    else:
+        workers = max_workers or os.cpu_count() or 1 # ProcessPoolExecutor's own default
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data,)) as pool:
+            rows = list(pool.map(functools.partial(_evaluate, use_kernel=use_kernel), grid, chunksize=max(1, len(grid) // (4 * workers))))
+
+    results = pd.DataFrame(rows)
+    if rank_by in results.columns:
+        results = results.sort_values(rank_by, ascending=False, kind='stable', na_position='last')
+    results = results.reset_index(drop=True)
+    results.index.name = 'rank'
+    return results
+
+
+if __name__ == '__main__':
+    import config
+
+    parser = argparse.ArgumentParser(description="H3M Bot parameter grid-search optimizer")
+    parser.add_argument("--start_date", type=str, required=True, help="Backtest start date (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--end_date", type=str, required=True, help="Backtest end date (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--symbol", type=str, default=backtest.SYMBOL_TO_TRADE, help=f"Trading symbol (default: {backtest.SYMBOL_TO_TRADE})")
+    parser.add_argument("--param", type=str, action='append', required=True,
+                        help="Parameter range, name=start:stop:step or name=v1,v2 (repeatable), e.g. min_rr=1.5:3:0.5")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--rank-by", type=str, default='total_pnl_currency', help="Result column to rank by (default: total_pnl_currency)")
+    parser.add_argument("--top", type=int, default=20, help="Rows of the ranking to print (default: 20)")
+    parser.add_argument("--kernel", action='store_true', help="Evaluate with the array kernel (h3m_kernel; compiled if Numba is installed)")
+    parser.add_argument("--output", type=str, default="optimizer_results.csv", help="CSV file for the full ranked results")
+    args = parser.parse_args()
+
+    try:
+        datetime.strptime(args.start_date, "%Y-%m-%d %H:%M:%S")
+        datetime.strptime(args.end_date, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        print("Error: Invalid date format. Please use YYYY-MM-DD HH:MM:SS for start_date and end_date.")
+        exit(1)
+
+    try:
+        param_ranges = dict(parse_param_range(spec) for spec in args.param)
+    except ValueError as e:
+        print(f"Error: {e}")
+        exit(1)
+    grid = build_grid(param_ranges)
+    print(f"Optimizing {', '.join(param_ranges)} over {len(grid)} combinations.")
+
+    h1_data, m5_data = backtest.load_backtest_data(args.symbol, args.start_date, args.end_date, config.TWELVE_DATA_API_KEY)
+    if h1_data is None or h1_data.empty or m5_data is None or m5_data.empty:
+        print("\nFailed to fetch necessary data. Aborting optimization.")
+        exit(1)
+
+    started = perf_timer.perf_counter()
+    results = run_grid(backtest.BacktestData(h1_data, m5_data, args.symbol), grid, args.workers, args.rank_by, args.kernel)
+    print(f"\nEvaluated {len(results)} combinations in {perf_timer.perf_counter() - started:.1f}s")
+
+    print(f"\n--- Top {min(args.top, len(results))} by {args.rank_by} ---")
+    print(results.head(args.top).to_string())
+    results.to_csv(args.output)
+    print(f"Results written to {args.output}")
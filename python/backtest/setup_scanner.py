@@ -0,0 +1,85 @@
+# --- Sweep / BOS Scanner ---
+# Vectorized scans for the M5 stage of the H3M strategy. Instead of testing every M5 bar of a
+# day in Python, DayScanner finds, from H3MEngine's current state, the next bar on which the
+# per-bar logic of process_bar_data can do anything (print, sweep, BOS) with argmax over boolean
+# masks of the day's BarArrays, so the bars in between are skipped without being visited.
+#
+# The log windows in which the engine prints every bar are defined here once (trace_window,
+# m5_debug_window) and used both by the engine's print conditions and by the scanner's masks.
+
+import numpy as np
+
+from bar_arrays import BarArrays
+
+TRACE_HOUR = 6          # [SWEEP_TRACE]/[BOS_TRACE]: check_sweep/check_bos trace bars of this UTC hour...
+TRACE_MINUTES = 20      # ...whose minute is below this
+M5_DEBUG_FRANKFURT_MINUTES = 30 # [M5_DEBUG]: bars of the Frankfurt open hour with minute below this...
+M5_DEBUG_LONDON_MINUTES = 15    # ...and of the London open hour with minute below this
+
+
+def trace_window(hours, minutes):
+    """True for bars check_sweep/check_bos trace. Works on scalars and on NumPy arrays alike."""
+    return (hours == TRACE_HOUR) & (minutes < TRACE_MINUTES)
+
+
+def m5_debug_window(hours, minutes, params):
+    """True for bars process_bar_data prints as [M5_DEBUG] ('params' is a backtest.StrategyParams). Scalars or arrays."""
+    return (((hours == params.frankfurt_session_start_hour_utc) & (minutes < M5_DEBUG_FRANKFURT_MINUTES)) |
+            ((hours == params.london_session_start_hour_utc) & (minutes < M5_DEBUG_LONDON_MINUTES)))
+
+
+def first_true(mask: np.ndarray, start: int = 0) -> int:
+    """Position of the first True at or after 'start', or -1."""
+    if start >= len(mask):
+        return -1
+    offset = int(np.argmax(mask[start:]))
+    return start + offset if mask[start + offset] else -1
+
+
+def session_masks(hours: np.ndarray, params):
+    """
+    (sweep_session, active_session) boolean masks for M5 bar hours, as the engine's session checks:
+    sweeps from the Frankfurt open, BOS/entries from the Frankfurt open to the London close.
+    'params' is a backtest.StrategyParams.
+    """
+    frankfurt = (hours >= params.frankfurt_session_start_hour_utc) & (hours < params.frankfurt_session_end_hour_utc)
+    active = (hours >= params.frankfurt_session_start_hour_utc) & (hours < params.london_session_end_hour_utc)
+    return frankfurt | active, active
+
+
+class DayScanner:
+    """
+    Next-event search over one day's M5 bars for the engine's per-bar logic.
+
+    A bar needs to be visited only if it is printed regardless of state (the M5_DEBUG and
+    SWEEP/BOS trace windows), could sweep an armed Asia level, or closes beyond an armed BOS level.
+    """
+    __slots__ = ('bars', 'sweep_session', 'active_session', 'always')
+
+    def __init__(self, bars: BarArrays, params):
+        self.bars = bars
+        self.sweep_session, self.active_session = session_masks(bars.hours, params)
+        self.always = m5_debug_window(bars.hours, bars.minutes, params) | trace_window(bars.hours, bars.minutes)
+
+    def next_event(self, start: int, sweep_low=None, sweep_high=None, bos_low=None, bos_high=None) -> int:
+        """
+        First position >= start that must be visited, or -1.
+
+        Args:
+            sweep_low / sweep_high: Armed Asia low / high levels (None: not being watched).
+            bos_low / bos_high: Armed bullish (break above) / bearish (break below) BOS levels.
+        """
+        if start >= len(self.always):
+            return -1
+        window = slice(start, None)
+        mask = self.always[window].copy()
+        if sweep_low is not None:
+            mask |= self.sweep_session[window] & (self.bars.low[window] <= sweep_low)
+        if sweep_high is not None:
+            mask |= self.sweep_session[window] & (self.bars.high[window] >= sweep_high)
+        if bos_low is not None:
+            mask |= self.active_session[window] & (self.bars.close[window] > bos_low)
+        if bos_high is not None:
+            mask |= self.active_session[window] & (self.bars.close[window] < bos_high)
+        offset = first_true(mask)
+        return start + offset if offset >= 0 else -1
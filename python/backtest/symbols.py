@@ -0,0 +1,12 @@
+# --- Symbols ---
+# Pip sizes per symbol, shared by the backtester and the live bot (which only needs these, not
+# the whole backtest module).
+
+PIP_SIZE_DEFAULT = 0.0001     # For EURUSD like pairs
+PIP_SIZE_JPY = 0.01         # For JPY pairs
+
+
+def get_pip_size(symbol_str):
+    if "JPY" in symbol_str.upper():
+        return PIP_SIZE_JPY
+    return PIP_SIZE_DEFAULT
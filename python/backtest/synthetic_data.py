@@ -0,0 +1,30 @@
+# --- Synthetic OHLC Data ---
+# Reproducible EUR/USD- or USD/JPY-like M5 and H1 bars for the benchmarks and tests, so neither
+# needs an API key or network access.
+
+import numpy as np
+import pandas as pd
+
+
+def make_synthetic_ohlc(days: int = 260, seed: int = 0, pip_size: float = 0.0001, start: str = "2023-01-02"):
+    """
+    Generates a random-walk M5 series (weekdays only) and the H1 series resampled from it.
+
+    Returns:
+        tuple: (h1_dataframe, m5_dataframe) with open/high/low/close columns, indexed by UTC datetime.
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=days * 288, freq="5min")
+    index = index[index.dayofweek < 5]
+    n = len(index)
+    base_price = 150.0 if pip_size == 0.01 else 1.08
+    drift = np.repeat(rng.normal(0, 0.6, n // 600 + 1), 600)[:n] # Trending stretches so the strategy trades
+    close = base_price + np.cumsum(rng.normal(drift, 3.0, n)) * pip_size
+    open_ = np.r_[base_price, close[:-1]]
+    high = np.maximum(open_, close) + np.abs(rng.normal(0, 1.5, n)) * pip_size
+    low = np.minimum(open_, close) - np.abs(rng.normal(0, 1.5, n)) * pip_size
+    decimals = 3 if pip_size == 0.01 else 5
+    m5 = pd.DataFrame({"open": open_, "high": high, "low": low, "close": close}, index=index).round(decimals)
+    m5.index.name = "datetime"
+    h1 = m5.resample("1h").agg({"open": "first", "high": "max", "low": "min", "close": "last"}).dropna()
+    return h1, m5
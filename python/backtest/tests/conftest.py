@@ -0,0 +1,12 @@
+# --- Test Setup ---
+# The backtest modules are flat scripts run from python/backtest, and some import config.py from
+# python/; put both directories on the path so `python -m pytest` works from anywhere.
+
+import os
+import sys
+
+BACKTEST_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PYTHON_DIR = os.path.dirname(BACKTEST_DIR) # config.py lives there
+for directory in (BACKTEST_DIR, PYTHON_DIR):
+    if directory not in sys.path:
+        sys.path.append(directory)
@@ -0,0 +1,11 @@
+# --- Test Helpers ---
+# Shared by the test modules (plain imports; the tests directory is on the path under pytest).
+
+import contextlib
+import io
+
+
+def run_quietly(function, *args, **kwargs):
+    """function(*args, **kwargs) with its stdout (the engine's per-bar and per-day logging) discarded."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
@@ -0,0 +1,82 @@
+# --- Async Data Fetcher Tests ---
+# Runs async_data against a local aiohttp stub of the Twelve Data /time_series endpoint.
+
+import asyncio
+import time as perf_timer
+
+import pandas as pd
+from aiohttp import web
+
+import async_data
+
+START, END = "2024-05-01 00:00:00", "2024-05-01 02:00:00"
+
+
+def _values(symbol):
+    """Newest-first values, as Twelve Data returns them; prices differ per symbol."""
+    base = 1.0 + len(symbol) / 100
+    return [{"datetime": f"2024-05-01 0{hour}:00:00", "open": f"{base + hour:.5f}", "high": f"{base + hour + 0.5:.5f}",
+             "low": f"{base + hour - 0.5:.5f}", "close": f"{base + hour + 0.25:.5f}"} for hour in (1, 0)]
+
+
+def _expected_frame(symbol):
+    base = 1.0 + len(symbol) / 100
+    index = pd.DatetimeIndex(["2024-05-01 00:00:00", "2024-05-01 01:00:00"], name='datetime')
+    return pd.DataFrame({'open': [base, base + 1], 'high': [base + 0.5, base + 1.5],
+                         'low': [base - 0.5, base + 0.5], 'close': [base + 0.25, base + 1.25]}, index=index)
+
+
+async def _run_against_stub(fetch_requests, limiter):
+    """Serves /time_series on a free local port and fetches 'fetch_requests' from it."""
+    arrivals = []
+
+    async def time_series(request):
+        arrivals.append(perf_timer.monotonic())
+        symbol = request.query["symbol"]
+        if symbol == "BAD/SYM":
+            return web.json_response({"code": 400, "message": "symbol not found", "status": "error"})
+        if symbol == "EMPTY/SYM":
+            return web.json_response({"code": 400, "status": "error",
+                                      "message": "No data is available on the specified dates. Try setting different start/end dates."})
+        return web.json_response({"meta": {"symbol": symbol}, "values": _values(symbol), "status": "ok"})
+
+    app = web.Application()
+    app.router.add_get("/time_series", time_series)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        results = await async_data.afetch_many(fetch_requests, "test-key", base_url=f"http://127.0.0.1:{port}",
+                                               limiter=limiter)
+    finally:
+        await runner.cleanup()
+    return results, arrivals
+
+
+def test_afetch_many_decodes_frames_and_reports_errors():
+    symbols = ["EUR/USD", "GBP/USD", "USD/JPY", "AUD/USD"]
+    fetch_requests = [(symbol, "1h", START, END) for symbol in symbols]
+    fetch_requests += [("BAD/SYM", "1h", START, END), ("EMPTY/SYM", "1h", START, END)]
+
+    results, arrivals = asyncio.run(_run_against_stub(fetch_requests, async_data.TokenBucket(rate=1000, capacity=100)))
+
+    assert list(results) == fetch_requests
+    assert len(arrivals) == len(fetch_requests)
+    for symbol in symbols:
+        pd.testing.assert_frame_equal(results[(symbol, "1h", START, END)], _expected_frame(symbol), check_freq=False)
+    assert results[("BAD/SYM", "1h", START, END)] is None
+    assert results[("EMPTY/SYM", "1h", START, END)].empty
+
+
+def test_token_bucket_spaces_requests():
+    rate = 20.0 # One request every 50 ms once the single-token burst is spent
+    fetch_requests = [(symbol, "5min", START, END) for symbol in ("EUR/USD", "GBP/USD", "USD/JPY", "AUD/USD", "NZD/USD")]
+
+    results, arrivals = asyncio.run(_run_against_stub(fetch_requests, async_data.TokenBucket(rate=rate, capacity=1)))
+
+    assert all(df is not None and len(df) == 2 for df in results.values())
+    gaps = [later - earlier for earlier, later in zip(sorted(arrivals), sorted(arrivals)[1:])]
+    assert min(gaps) >= 0.8 / rate # Tolerance for timer and scheduling jitter
+    assert arrivals[-1] - arrivals[0] >= 0.9 * (len(fetch_requests) - 1) / rate
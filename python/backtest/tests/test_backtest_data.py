@@ -0,0 +1,95 @@
+# --- Time Series Decoding Tests ---
+# parse_time_series must decode a Twelve Data time_series response like the generic pandas path,
+# fall back to that path for records the column-wise decoder rejects, and tell the API's
+# "no data" answer (an empty range) apart from a failure.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest_data
+from backtest_data import decode_values_fast, is_no_data_response, parse_time_series
+from support import run_quietly
+
+
+def _records(count=50, daily=False, volume=True):
+    """time_series "values" as the API sends them: newest first, every field a string."""
+    times = pd.date_range("2024-01-02", periods=count, freq="1D" if daily else "5min")
+    rng = np.random.default_rng(0)
+    records = []
+    for time, price in zip(times, 1.08 + np.cumsum(rng.normal(0, 0.0003, count))):
+        record = {"datetime": time.strftime("%Y-%m-%d" if daily else "%Y-%m-%d %H:%M:%S"),
+                  "open": f"{price:.5f}", "high": f"{price + 0.0004:.5f}", "low": f"{price - 0.0004:.5f}",
+                  "close": f"{price + 0.0001:.5f}"}
+        if volume:
+            record["volume"] = str(int(rng.integers(0, 500)))
+        records.append(record)
+    return records[::-1]
+
+
+@pytest.fixture
+def generic_calls(monkeypatch):
+    calls = []
+    generic = backtest_data._decode_values_generic
+    def counting_generic(values, symbol, interval):
+        calls.append(len(values))
+        return generic(values, symbol, interval)
+    monkeypatch.setattr(backtest_data, "_decode_values_generic", counting_generic)
+    return calls
+
+
+@pytest.mark.parametrize("daily, volume", [(False, True), (False, False), (True, False)])
+def test_fast_decode_matches_generic(daily, volume):
+    records = _records(daily=daily, volume=volume)
+    expected = backtest_data._decode_values_generic(records, "EUR/USD", "5min")
+
+    pd.testing.assert_frame_equal(decode_values_fast(records), expected)
+    shuffled = [records[i] for i in np.random.default_rng(1).permutation(len(records))]
+    pd.testing.assert_frame_equal(decode_values_fast(shuffled), expected)
+    pd.testing.assert_frame_equal(decode_values_fast(records[::-1]), expected)
+
+
+def test_null_values_decode_like_the_generic_path():
+    records = _records()
+    records[3]["close"] = None
+
+    df = run_quietly(parse_time_series, {"values": records, "status": "ok"}, "EUR/USD", "5min")
+
+    pd.testing.assert_frame_equal(df, backtest_data._decode_values_generic(records, "EUR/USD", "5min"))
+    assert np.isnan(df["close"].iloc[-4]) and df["close"].isna().sum() == 1
+
+
+def test_missing_fields_use_the_generic_path(generic_calls):
+    records = _records()
+    del records[5]["volume"]
+
+    df = run_quietly(parse_time_series, {"values": records, "status": "ok"}, "EUR/USD", "5min")
+
+    assert generic_calls == [len(records)]
+    assert df.index.is_monotonic_increasing and len(df) == len(records)
+    assert df["volume"].isna().sum() == 1
+
+
+def test_other_datetime_formats_use_the_generic_path(generic_calls):
+    records = _records()
+    for record in records:
+        record["datetime"] = record["datetime"].replace(" ", "T")
+
+    df = run_quietly(parse_time_series, {"values": records, "status": "ok"}, "EUR/USD", "5min")
+
+    assert generic_calls == [len(records)]
+    pd.testing.assert_frame_equal(df, decode_values_fast(_records()))
+
+
+def test_no_data_answer_is_an_empty_range(generic_calls):
+    no_data = {"code": 400, "status": "error",
+               "message": "No data is available on the specified dates. Try setting different start/end dates."}
+
+    assert is_no_data_response(no_data)
+    df = run_quietly(parse_time_series, no_data, "EUR/USD", "5min")
+    assert df is not None and df.empty and list(df.columns) == ["open", "high", "low", "close"]
+    assert generic_calls == []
+
+    failure = {"code": 429, "status": "error", "message": "You have run out of API credits for the current minute."}
+    assert not is_no_data_response(failure)
+    assert run_quietly(parse_time_series, failure, "EUR/USD", "5min") is None
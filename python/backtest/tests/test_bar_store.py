@@ -0,0 +1,81 @@
+# --- Bar Store Tests ---
+# BarSeries must only expose rows committed in meta.json, skip bars that are not newer than the
+# stored ones, see appends made through other instances, and round-trip DataFrames.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import bar_store
+from bar_store import BarStore
+from synthetic_data import make_synthetic_ohlc
+
+
+def _bars(count, start="2024-01-02", seed=0):
+    _, m5 = make_synthetic_ohlc(1, seed=seed, start=start)
+    m5 = m5.iloc[:count]
+    m5.index = m5.index.as_unit('ns') # The store's resolution
+    return m5
+
+
+def test_frame_round_trips(tmp_path):
+    store = BarStore(str(tmp_path))
+    m5 = _bars(50).tz_localize("UTC")
+    m5['volume'] = np.arange(50.0)
+
+    assert store.series("EUR/USD", "5min").append_frame(m5) == 50
+    pd.testing.assert_frame_equal(store.frame("EUR/USD", "5min"), m5.tz_localize(None)[['open', 'high', 'low', 'close']],
+                                  check_freq=False)
+    view = store.view("EUR/USD", "5min", m5.index[10], m5.index[19])
+    assert len(view) == 10 # start and end are inclusive
+    assert view.volume.tolist() == list(np.arange(10.0, 20.0))
+    assert BarStore(str(tmp_path)).series("EUR/USD", "5min").view().volume.tolist() == list(np.arange(50.0)) # Reopened
+
+
+def test_append_skips_bars_that_are_not_newer(tmp_path):
+    series = BarStore(str(tmp_path)).series("EUR/USD", "5min")
+    m5 = _bars(30)
+    assert series.append_frame(m5.iloc[:20]) == 20
+
+    assert series.append_frame(m5.iloc[5:15]) == 0 # Already stored
+    assert series.append_frame(m5.iloc[15:25]) == 5 # Only the bars after the last stored one
+    shuffled = pd.concat([m5.iloc[[29, 25, 27]], m5.iloc[[26, 28, 27]]])
+    assert series.append_frame(shuffled) == 5 # Sorted, duplicates dropped
+    pd.testing.assert_frame_equal(series.view().to_frame(), m5, check_freq=False)
+    assert series.last_time() == m5.index[-1]
+
+
+def test_rows_become_visible_only_with_meta_json(tmp_path, monkeypatch):
+    series = BarStore(str(tmp_path)).series("EUR/USD", "5min")
+    m5 = _bars(20)
+    series.append_frame(m5.iloc[:10])
+
+    def crash(*args):
+        raise OSError("writer crashed before committing")
+    monkeypatch.setattr(bar_store.os, "replace", crash)
+    with pytest.raises(OSError):
+        series.append_frame(m5.iloc[10:])
+    monkeypatch.undo()
+
+    # Column files already hold the uncommitted bars, but readers only see the committed rows
+    assert len(series) == 10
+    assert len(series.view()) == 10 and len(series.tail(100)) == 10
+    assert series.append_frame(m5.iloc[10:]) == 10 # The uncommitted bytes are overwritten
+    pd.testing.assert_frame_equal(series.view().to_frame(), m5, check_freq=False)
+
+
+def test_view_and_tail_see_appends_from_other_instances(tmp_path):
+    reader = BarStore(str(tmp_path)).series("EUR/USD", "5min")
+    writer = BarStore(str(tmp_path)).series("EUR/USD", "5min")
+    m5 = _bars(40)
+    assert len(reader.view()) == 0 and len(reader.tail(5)) == 0
+
+    writer.append_frame(m5.iloc[:20])
+    first_view = reader.view()
+    assert reader.tail(5).times_ns.tolist() == first_view.times_ns[-5:].tolist()
+
+    writer.append_frame(m5.iloc[20:])
+    assert len(first_view) == 20 # Earlier views keep their range
+    assert len(reader.view()) == 40
+    pd.testing.assert_frame_equal(reader.tail(3).to_frame(), m5.iloc[-3:], check_freq=False)
+    assert len(reader.view(m5.index[35])) == 5
@@ -0,0 +1,83 @@
+# --- Chart Pool Tests ---
+# A store-backed chart job must give the worker the same H1/M5 bars trade_charts._trade_bars slices
+# from the full frames, and ChartPool.close must shut the workers down even when a job failed.
+
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import pytest
+
+import chart_pool
+from bar_store import BarStore
+from chart_pool import ChartJob, ChartPool
+from synthetic_data import make_synthetic_ohlc
+from trade_charts import _trade_bars
+
+
+@pytest.fixture
+def bars(tmp_path, monkeypatch):
+    h1, m5 = make_synthetic_ohlc(10, seed=4)
+    h1, m5 = (frame.tz_localize("UTC") for frame in (h1, m5))
+    store = BarStore(str(tmp_path))
+    store.series("EUR/USD", "1h").append_frame(h1)
+    store.series("EUR/USD", "5min").append_frame(m5)
+    monkeypatch.setattr(chart_pool, '_worker_store', store)
+    return h1, m5
+
+
+def _trades(m5):
+    first, last = m5.index[0], m5.index[-1]
+    return [
+        {'entry_time': m5.index[300], 'exit_time': m5.index[340]}, # Same day
+        {'entry_time': m5.index[500], 'exit_time': m5.index[900]}, # Over several days
+        {'entry_time': m5.index[700], 'exit_time': None},
+        {'entry_time': first, 'exit_time': first + pd.Timedelta(minutes=30)}, # M5 window starts before the data
+        {'entry_time': last - pd.Timedelta(minutes=30), 'exit_time': last}, # ... and ends after it
+    ]
+
+
+def test_store_backed_job_selects_the_trade_bars(bars):
+    h1, m5 = bars
+    for trade in _trades(m5):
+        job = ChartJob(trade, "EUR/USD", "test", None, None, None, 0.0001)
+        h1_bars, m5_bars = chart_pool._job_bars(job)
+        expected_h1, expected_m5 = _trade_bars(trade, h1, m5, verbose=False)
+
+        assert len(m5_bars) and len(h1_bars), trade
+        pd.testing.assert_frame_equal(h1_bars, expected_h1.tz_localize(None), check_freq=False, check_index_type=False)
+        pd.testing.assert_frame_equal(m5_bars, expected_m5.tz_localize(None), check_freq=False, check_index_type=False)
+
+
+def test_frame_backed_job_carries_the_trade_bars(bars):
+    h1, m5 = bars
+    for trade in _trades(m5):
+        (h1_start, h1_end), (m5_start, m5_end) = chart_pool.chart_ranges(trade)
+        job = ChartJob(trade, "EUR/USD", "test", None, None, None, 0.0001,
+                       chart_pool._window(h1, h1_start, h1_end), chart_pool._window(m5, m5_start, m5_end))
+        expected_h1, expected_m5 = _trade_bars(trade, h1, m5, verbose=False)
+
+        h1_bars, m5_bars = chart_pool._job_bars(job)
+        pd.testing.assert_frame_equal(h1_bars, expected_h1)
+        pd.testing.assert_frame_equal(m5_bars, expected_m5)
+
+
+class RecordingExecutor:
+    def __init__(self):
+        self.shut_down = False
+
+    def shutdown(self):
+        self.shut_down = True
+
+
+def test_close_shuts_down_a_broken_pool():
+    pool = ChartPool(max_workers=1)
+    pool._executor.shutdown() # No job was submitted, so no worker was started
+    executor = RecordingExecutor()
+    failed = Future()
+    failed.set_exception(BrokenProcessPool("worker died"))
+    pool._executor, pool._futures = executor, [failed]
+
+    with pytest.raises(BrokenProcessPool):
+        pool.close()
+    assert executor.shut_down
@@ -0,0 +1,25 @@
+# --- CompactOHLC Equivalence Tests ---
+# The backtest must give identical trades whether the M5 bars come as a float64 DataFrame or as
+# integer-pip CompactOHLC columns.
+
+import pytest
+
+import backtest
+from compact_ohlc import CompactOHLC
+from support import run_quietly
+from synthetic_data import make_synthetic_ohlc
+
+DAYS = 60
+
+
+@pytest.mark.parametrize("symbol, pip_size", [("EUR/USD", 0.0001), ("USD/JPY", 0.01)])
+def test_compact_m5_matches_frame(symbol, pip_size):
+    h1, m5 = make_synthetic_ohlc(DAYS, seed=7, pip_size=pip_size)
+
+    frame_trades, frame_balance = run_quietly(backtest.process_bar_data, h1, m5, symbol, make_charts=False)
+    compact_trades, compact_balance = run_quietly(backtest.process_bar_data, h1, CompactOHLC.from_frame(m5, pip_size), symbol,
+                                                  make_charts=False)
+
+    assert frame_trades, "the synthetic data should produce trades"
+    assert compact_trades == frame_trades
+    assert compact_balance == frame_balance
@@ -0,0 +1,150 @@
+# --- Custom Chart Plotter Tests ---
+# read_h1_bars reads the cBot log in chunks; with a chunk size far below the file size it must still
+# skip malformed H1_BAR rows, keep the last of duplicate timestamps across chunks and sort the bars.
+# write_chart_feed must split every level (H1 and its H4/D1 downsampling) into one file per period
+# whose bars add up to the input, and list each file with its [start, end, file] in the page's feed.
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from custom_chart_plotter import FEED_CHUNKS, read_h1_bars, write_chart_feed
+from support import run_quietly
+from synthetic_data import make_synthetic_ohlc
+
+HEADER = "Timestamp;EventType;H1_Open;H1_High;H1_Low;H1_Close;Comment"
+
+
+def _write_log(path, rows):
+    path.write_text("\n".join([HEADER] + [";".join(row) for row in rows]) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def _log_rows(count, seed=0):
+    """H1_BAR rows (some out of order, some repeated later with new prices) mixed with other events and bad rows."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2024-03-01")
+    rows = []
+    for i in range(count):
+        hour = int(rng.integers(0, count // 2)) if i % 7 == 6 else i # Every 7th bar repeats an earlier hour
+        price = 1.1 + i / 1000
+        rows.append([(start + pd.Timedelta(hours=hour)).strftime("%Y-%m-%dT%H:%M:%S"), "H1_BAR",
+                     f"{price:.5f}", f"{price + 0.002:.5f}", f"{price - 0.002:.5f}", f"{price + 0.001:.5f}", "bar"])
+        if i % 5 == 0:
+            rows.append([rows[-1][0], "SWEEP", "", "", "", "", "not a bar"])
+    bad = [["2024-03-01T99:00:00", "H1_BAR", "1.1", "1.2", "1.0", "1.1", "bad time"],
+           ["2024-03-01T05:00:00", "H1_BAR", "1.1", "abc", "1.0", "1.1", "bad price"],
+           ["2024-03-01T06:00:00", "H1_BAR", "1.1", "1.2", "", "1.1", "missing price"]]
+    for offset, row in enumerate(bad):
+        rows.insert(len(rows) * (offset + 1) // 4, row)
+    return rows
+
+
+def _expected(rows):
+    """Reference: valid H1_BAR rows, the last one of each timestamp wins, sorted by time."""
+    bars = {}
+    for timestamp, event, *prices, _ in rows:
+        if event != "H1_BAR":
+            continue
+        try:
+            time = int(pd.Timestamp(pd.to_datetime(timestamp, format="%Y-%m-%dT%H:%M:%S")).timestamp())
+            values = [float(price) for price in prices]
+        except ValueError:
+            continue
+        bars[time] = values
+    times = sorted(bars)
+    return pd.DataFrame({'time': np.array(times, dtype=np.int64),
+                         **{column: [bars[time][k] for time in times] for k, column in enumerate(('open', 'high', 'low', 'close'))}})
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 3, 16, 10_000])
+def test_chunked_read_matches_whole_log(tmp_path, chunk_rows):
+    rows = _log_rows(60)
+    bars, skipped = read_h1_bars(_write_log(tmp_path / "log.csv", rows), chunk_rows=chunk_rows)
+
+    assert skipped == 3
+    assert bars['time'].is_monotonic_increasing and bars['time'].is_unique
+    pd.testing.assert_frame_equal(bars, _expected(rows))
+
+
+def test_duplicate_across_chunks_keeps_the_last_row(tmp_path):
+    rows = [["2024-03-01T01:00:00", "H1_BAR", "1.0", "1.0", "1.0", "1.0", ""],
+            ["2024-03-01T00:00:00", "H1_BAR", "2.0", "2.0", "2.0", "2.0", ""],
+            ["2024-03-01T02:00:00", "H1_BAR", "3.0", "3.0", "3.0", "3.0", ""],
+            ["2024-03-01T01:00:00", "H1_BAR", "4.0", "4.0", "4.0", "4.0", ""], # Second chunk repeats the first bar
+            ["2024-03-01T01:00:00", "H1_BAR", "5.0", "x", "5.0", "5.0", ""]] # ... a malformed repeat does not count
+    bars, skipped = read_h1_bars(_write_log(tmp_path / "log.csv", rows), chunk_rows=2)
+
+    assert skipped == 1
+    assert bars['open'].tolist() == [2.0, 4.0, 3.0]
+    assert bars['time'].diff().dropna().tolist() == [3600, 3600]
+
+
+def test_log_without_bars(tmp_path):
+    bars, skipped = read_h1_bars(_write_log(tmp_path / "log.csv", [["2024-03-01T00:00:00", "SWEEP", "", "", "", "", ""]]),
+                                 chunk_rows=1)
+
+    assert bars.empty and skipped == 0
+    assert list(bars.columns) == ['time', 'open', 'high', 'low', 'close']
+
+
+def _feed_bars():
+    _, m5 = make_synthetic_ohlc(45, seed=5, start="2023-12-04") # Weekdays over a month and a year boundary
+    h1 = m5.resample('1h').agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last'}).dropna()
+    return h1
+
+
+def _as_feed_frame(ohlc):
+    return pd.DataFrame({'time': ohlc.index.to_numpy(dtype='datetime64[s]').astype('int64'), 'open': ohlc['open'].to_numpy(),
+                         'high': ohlc['high'].to_numpy(), 'low': ohlc['low'].to_numpy(), 'close': ohlc['close'].to_numpy()})
+
+
+def _read_feed(output_html_path):
+    with open(output_html_path, encoding='utf-8') as f:
+        line = next(line for line in f if line.strip().startswith("const feed = "))
+    return json.loads(line.strip()[len("const feed = "):].rstrip(';'))
+
+
+def _read_chunk(path):
+    with open(path, encoding='utf-8') as f:
+        script = f.read()
+    assert script.startswith("h3mFeedChunk(") and script.endswith(");\n")
+    level, file_name, columns = json.loads("[" + script[len("h3mFeedChunk("):-len(");\n")] + "]")
+    return level, file_name, pd.DataFrame({'time': columns['t'], 'open': columns['o'], 'high': columns['h'],
+                                           'low': columns['l'], 'close': columns['c']})
+
+
+@pytest.mark.parametrize("chunk", sorted(FEED_CHUNKS))
+def test_feed_files_and_table_of_contents_match_the_bars(tmp_path, chunk):
+    h1 = _feed_bars()
+    output_html_path = str(tmp_path / "chart.html")
+    run_quietly(write_chart_feed, _as_feed_frame(h1), "test", output_html_path, "1h", chunk)
+
+    feed = _read_feed(output_html_path)
+    feed_dir = tmp_path / "chart_data"
+    assert feed['directory'] == "chart_data"
+    assert [(level['name'], level['seconds']) for level in feed['levels']] == [("1h", 3600), ("4h", 4 * 3600), ("1d", 24 * 3600)]
+
+    aggregation = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last'}
+    expected_levels = {"1h": (h1, FEED_CHUNKS[chunk]), "4h": (h1.resample('4h').agg(aggregation).dropna(), 'M'),
+                       "1d": (h1.resample('1D').agg(aggregation).dropna(), 'Y')}
+    for level in feed['levels']:
+        expected, period = expected_levels[level['name']]
+        chunks = level['chunks']
+        assert sorted(os.listdir(feed_dir / level['name'])) == sorted(file_name for _, _, file_name in chunks)
+
+        parts = []
+        for (start, end, file_name), next_chunk in zip(chunks, chunks[1:] + [None]):
+            name, chunk_file, part = _read_chunk(feed_dir / level['name'] / file_name)
+            periods = pd.to_datetime(part['time'], unit='s').dt.to_period(period)
+
+            assert (name, chunk_file) == (level['name'], file_name)
+            assert periods.nunique() == 1 and file_name == f"{periods.iloc[0].start_time.date()}.js"
+            assert (start, end) == (part['time'].iloc[0], part['time'].iloc[-1] + level['seconds'])
+            assert next_chunk is None or end <= next_chunk[0]
+            parts.append(part)
+        assert len(chunks) > 1, level['name'] # The bars span several periods of every level
+        pd.testing.assert_frame_equal(pd.concat(parts, ignore_index=True), _as_feed_frame(expected))
@@ -0,0 +1,125 @@
+# --- Fractal Engine Tests ---
+# FractalIndex must find the same fractals as find_fractal_flags, whether it is built from a whole
+# frame or fed one bar at a time, including histories shorter than the fractal window.
+# asia_fractals_by_day must select what a day-by-day search of each Asia window selects.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fractal_engine import FractalIndex, asia_fractals_by_day, find_fractal_flags
+from synthetic_data import make_synthetic_ohlc
+
+
+def _expected(h1, period):
+    is_up_fractal, is_down_fractal = find_fractal_flags(h1['high'].to_numpy(), h1['low'].to_numpy(), period)
+    return ([(h1['high'].iloc[i], h1.index[i].to_datetime64()) for i in np.flatnonzero(is_up_fractal)],
+            [(h1['low'].iloc[i], h1.index[i].to_datetime64()) for i in np.flatnonzero(is_down_fractal)])
+
+
+def _h1(bars):
+    _, m5 = make_synthetic_ohlc(3, seed=11)
+    h1 = m5.resample('1h').agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last'})
+    return h1.iloc[:bars]
+
+
+@pytest.mark.parametrize("bars", [0, 1, 2, 5, 7, 40])
+@pytest.mark.parametrize("period", [1, 2, 3])
+def test_bar_by_bar_update_matches_flags(bars, period):
+    h1 = _h1(bars)
+    index = FractalIndex(period)
+    found_up, found_down = [], []
+    for position in range(len(h1)):
+        new_up, new_down = index.update(h1['high'].to_numpy()[position:position + 1], h1['low'].to_numpy()[position:position + 1],
+                                        h1.index[position:position + 1])
+        found_up += new_up
+        found_down += new_down
+
+    assert (found_up, found_down) == _expected(h1, period)
+    assert index.fractals_as_of() == _expected(h1, period)
+
+
+@pytest.mark.parametrize("bars", [1, 2, 40])
+def test_from_frame_matches_flags(bars):
+    h1 = _h1(bars)
+    index = FractalIndex.from_frame(h1, 3)
+
+    assert index.fractals_as_of() == _expected(h1, 3)
+    if bars < 7:
+        assert index.nearest_levels("bullish", 0.0) == (None, None)
+
+
+def test_fractals_are_visible_once_confirmed():
+    h1 = pd.DataFrame({'high': [1.0, 1.2, 3.0, 1.1, 1.0], 'low': [0.9, 0.5, 0.8, 0.7, 0.95]},
+                      index=pd.date_range("2024-01-01", periods=5, freq="1h"))
+    index = FractalIndex.from_frame(h1, 1)
+
+    assert index.nearest_levels("bullish", 2.0, as_of=pd.Timestamp("2024-01-01 03:59")) == (None, None)
+    assert index.nearest_levels("bullish", 2.0, as_of=pd.Timestamp("2024-01-01 04:00")) == (3.0, None)
+    assert index.nearest_levels("bearish", 1.0) == (0.7, 0.5)
+
+
+def test_nearest_levels_match_brute_force():
+    h1 = _h1(72)
+    index = FractalIndex.from_frame(h1, 1)
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        as_of = h1.index[int(rng.integers(0, len(h1)))]
+        entry_price = float(rng.uniform(h1['low'].min(), h1['high'].max()))
+        ups, downs = index.fractals_as_of(as_of)
+        above = sorted({level for level, _ in ups if level > entry_price})
+        below = sorted({level for level, _ in downs if level < entry_price}, reverse=True)
+        expected_up = (above + [None, None])[:2]
+        expected_down = (below + [None, None])[:2]
+
+        assert list(index.nearest_levels("bullish", entry_price, as_of)) == expected_up
+        assert list(index.nearest_levels("bearish", entry_price, as_of)) == expected_down
+
+
+def _asia_fractals_day_by_day(h1, period, start_hour, end_hour_exclusive):
+    """Reference: each day's Asia window searched on its own, highest up / lowest down fractal, first occurrence."""
+    rows = {}
+    for date, day in h1.groupby(h1.index.date):
+        window = day[(day.index.hour >= start_hour) & (day.index.hour < end_hour_exclusive)]
+        is_up_fractal, is_down_fractal = find_fractal_flags(window['high'].to_numpy(), window['low'].to_numpy(), period)
+        ups, downs = window[is_up_fractal], window[is_down_fractal]
+        rows[date] = (len(window),
+                      ups['high'].max() if len(ups) else np.nan, ups['high'].idxmax() if len(ups) else pd.NaT,
+                      downs['low'].min() if len(downs) else np.nan, downs['low'].idxmin() if len(downs) else pd.NaT)
+    return rows
+
+
+@pytest.mark.parametrize("period", [1, 2, 3])
+@pytest.mark.parametrize("start_hour, end_hour_exclusive", [(0, 6), (0, 8), (2, 5)])
+def test_asia_fractals_by_day_matches_day_by_day(period, start_hour, end_hour_exclusive):
+    _, m5 = make_synthetic_ohlc(20, seed=12)
+    h1 = m5.resample('1h').agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last'}).dropna()
+    h1 = h1[~((h1.index.date == pd.Timestamp("2023-01-10").date()) & (h1.index.hour < 4))] # A day with a short Asia window
+
+    table = asia_fractals_by_day(h1, period, start_hour, end_hour_exclusive)
+    expected = _asia_fractals_day_by_day(h1, period, start_hour, end_hour_exclusive)
+
+    assert list(table.index) == list(expected)
+    for row in table.itertuples():
+        actual = (row.asia_bars, row.high, row.high_time, row.low, row.low_time)
+        assert all((pd.isna(a) and pd.isna(b)) or a == b for a, b in zip(actual, expected[row.Index])), row.Index
+    assert table['high'].isna().any() or table['low'].isna().any(), "some days should have no Asia fractal"
+
+
+@pytest.mark.parametrize("period", [0, -1])
+def test_period_below_one_is_rejected(period):
+    with pytest.raises(ValueError):
+        FractalIndex(period)
+
+
+def test_queries_do_not_change_the_index():
+    h1 = _h1(40)
+    index = FractalIndex.from_frame(h1.iloc[:30], 1)
+    views = (index._up_store._sorted, index._down_store._sorted)
+
+    index.nearest_levels("bullish", 0.0, h1.index[20])
+    index.nearest_levels("bearish", 10.0)
+    assert (index._up_store._sorted, index._down_store._sorted) == views
+
+    index.update(h1['high'].to_numpy()[30:], h1['low'].to_numpy()[30:], h1.index[30:])
+    assert index.nearest_levels("bullish", 0.0) == FractalIndex.from_frame(h1, 1).nearest_levels("bullish", 0.0)
@@ -0,0 +1,50 @@
+# --- H3M Kernel Equivalence Tests ---
+# h3m_kernel.run_kernel must reproduce H3MEngine.process_bar_data exactly (trades and final balance),
+# both as the interpreted loop and, when Numba is installed, compiled.
+
+import pytest
+
+import backtest
+import h3m_kernel
+from support import run_quietly
+from synthetic_data import make_synthetic_ohlc
+
+DAYS = 120
+COMBINATIONS = [{}, {'min_rr': 2.0, 'max_rr': 4.0}, {'max_bos_distance_pips': 5.0},
+                {'h1_fractal_period': 2, 'min_sl_pips': 8.0}]
+
+
+@pytest.fixture(scope="module")
+def data():
+    h1, m5 = make_synthetic_ohlc(DAYS, seed=3)
+    return run_quietly(backtest.BacktestData(h1, m5, "EUR/USD").precompute, (2, 3))
+
+
+def _assert_kernel_matches_engine(data, overrides, compiled):
+    params = backtest.StrategyParams(**overrides)
+    trades, final_balance = run_quietly(backtest.H3MEngine(data.symbol, make_charts=False, params=params).process_bar_data, data=data)
+    kernel_trades, kernel_balance = h3m_kernel.run_kernel(data, params, compiled=compiled)
+
+    assert trades, "the synthetic data should produce trades"
+    assert h3m_kernel.trade_records(kernel_trades, data) == trades
+    assert kernel_balance == final_balance
+
+
+@pytest.mark.parametrize("overrides", COMBINATIONS)
+def test_python_kernel_matches_engine(data, overrides, monkeypatch):
+    # The default path of a machine without Numba, even where it is installed
+    monkeypatch.setattr(h3m_kernel, 'NUMBA_AVAILABLE', False)
+    _assert_kernel_matches_engine(data, overrides, None)
+
+
+def test_python_kernel_calls_no_numba_dispatchers():
+    namespace = h3m_kernel._run_days.__globals__
+    for name in ('_run_days', '_round', '_bisect', '_first_visible', '_last_visible', '_nearest_beyond',
+                 '_take_profit', '_position_size'):
+        assert not hasattr(namespace[name], 'py_func'), name
+
+
+@pytest.mark.parametrize("overrides", COMBINATIONS)
+def test_numba_kernel_matches_engine(data, overrides):
+    pytest.importorskip("numba")
+    _assert_kernel_matches_engine(data, overrides, True)
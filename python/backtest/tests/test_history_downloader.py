@@ -0,0 +1,95 @@
+# --- History Downloader Tests ---
+# split_range must cover a range with windows of at most max_bars bars, and iter_chunks must cover
+# every window exactly once: truncated responses by their bars, empty ones as a whole.
+
+import pandas as pd
+import pytest
+
+from history_downloader import RateBudget, iter_chunks, split_range
+from support import run_quietly
+from synthetic_data import make_synthetic_ohlc
+
+T = pd.Timestamp
+
+
+class NoWait(RateBudget):
+    """RateBudget that never blocks but counts the requests."""
+
+    def __init__(self):
+        super().__init__(0, 0.0)
+        self.acquired = 0
+
+    def acquire(self):
+        self.acquired += 1
+
+
+def _stub_fetcher(bars, limit):
+    """Fetcher returning the newest 'limit' bars of 'bars' in [start, end]."""
+    def fetch(symbol, interval, start_date_str, end_date_str, api_key):
+        return bars.loc[T(start_date_str):T(end_date_str)].iloc[-limit:]
+    return fetch
+
+
+def _chunks(fetcher, start, end, max_bars, budget=None):
+    return run_quietly(list, iter_chunks(fetcher, "EUR/USD", "5min", T(start), T(end), "key", budget, max_bars))
+
+
+def test_split_range_windows_share_boundaries():
+    windows = split_range("2024-01-01 00:00", "2024-01-01 10:00", "5min", max_bars=25)
+
+    assert windows[0] == (T("2024-01-01 00:00"), T("2024-01-01 02:00")) # 25 bars, both ends included
+    assert windows[-1][1] == T("2024-01-01 10:00")
+    assert all(previous[1] == following[0] for previous, following in zip(windows, windows[1:]))
+    assert len(windows) == 5
+
+
+@pytest.mark.parametrize("start, end, interval", [("2024-01-01", "2024-01-01", "5min"),
+                                                  ("2024-01-02", "2024-01-01", "1h"),
+                                                  ("2024-01-01", "2024-06-01", "1week")])
+def test_split_range_single_window(start, end, interval):
+    assert split_range(start, end, interval, max_bars=10) == [(T(start), T(end))]
+
+
+def test_split_range_last_window_may_be_short():
+    windows = split_range("2024-01-01 00:00", "2024-01-01 01:00", "5min", max_bars=10)
+    assert windows == [(T("2024-01-01 00:00"), T("2024-01-01 00:45")), (T("2024-01-01 00:45"), T("2024-01-01 01:00"))]
+
+
+def test_iter_chunks_covers_truncated_windows():
+    _, m5 = make_synthetic_ohlc(3, seed=2, start="2024-01-01")
+    budget = NoWait()
+
+    chunks = _chunks(_stub_fetcher(m5, 100), m5.index[0], m5.index[-1], 100, budget)
+
+    received = pd.concat([chunk for chunk, _, _ in chunks])
+    pd.testing.assert_frame_equal(received[~received.index.duplicated()].sort_index(), m5, check_freq=False)
+    assert budget.acquired == len(chunks)
+    for chunk, covered_start, covered_end in chunks:
+        assert len(chunk) <= 100
+        assert covered_start <= chunk.index[0] and chunk.index[-1] <= covered_end
+
+
+def test_iter_chunks_truncated_at_the_window_start():
+    _, m5 = make_synthetic_ohlc(1, seed=2, start="2024-01-01")
+    oldest_first = lambda symbol, interval, start, end, api_key: m5.loc[T(start):T(end)].iloc[:30]
+
+    chunks = _chunks(oldest_first, m5.index[0], m5.index[99], 30)
+
+    assert [(start, end) for _, start, end in chunks][0] == (m5.index[0], m5.index[29])
+    assert max(end for _, _, end in chunks) == m5.index[99]
+
+
+def test_windows_without_bars_are_covered_empty_chunks():
+    _, m5 = make_synthetic_ohlc(7, seed=2, start="2024-01-01") # Monday to Friday, then a weekend without bars
+    chunks = _chunks(_stub_fetcher(m5, 300), "2024-01-05 12:00", "2024-01-07 23:55", 300)
+
+    empty = [(start, end) for chunk, start, end in chunks if chunk.empty]
+    assert len(chunks) == 3 and len(empty) == 2
+    assert all(start >= T("2024-01-06") for start, _ in empty)
+    assert chunks[-1][2] == T("2024-01-07 23:55") # The weekend window is covered, not requested again
+    assert sum(len(chunk) for chunk, _, _ in chunks) == len(m5.loc["2024-01-05 12:00":"2024-01-07 23:55"])
+
+
+def test_failed_request_raises():
+    with pytest.raises(RuntimeError):
+        _chunks(lambda *request: None, "2024-01-01", "2024-01-02", 100)
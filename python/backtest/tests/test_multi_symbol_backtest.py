@@ -0,0 +1,44 @@
+# --- Multi-Symbol Backtest Tests ---
+# Workers read the OHLC data from shared memory; their results must be those of a serial
+# H3MEngine run over the original frames, timestamp types included.
+
+import pandas as pd
+import pytest
+
+import backtest
+from multi_symbol_backtest import SharedOHLC, attach_shared_ohlc, run_backtests_parallel
+from support import run_quietly
+from synthetic_data import make_synthetic_ohlc
+
+
+@pytest.mark.parametrize("tz", [None, "UTC", "Europe/London"])
+def test_attached_frame_matches_original(tz):
+    _, m5 = make_synthetic_ohlc(2)
+    if tz is not None:
+        m5 = m5.tz_localize("UTC").tz_convert(tz)
+    shared = SharedOHLC(m5)
+    try:
+        shm, attached = attach_shared_ohlc(shared.descriptor)
+        pd.testing.assert_frame_equal(attached, m5[['open', 'high', 'low', 'close']], check_index_type=False,
+                                      check_freq=False)
+        assert attached.index.tz == m5.index.tz
+        del attached
+        shm.close()
+    finally:
+        shared.release()
+
+
+def test_parallel_run_matches_serial_engine():
+    data_by_symbol = {}
+    for symbol, pip_size, seed in (("EUR/USD", 0.0001, 0), ("USD/JPY", 0.01, 1)):
+        h1, m5 = make_synthetic_ohlc(60, seed=seed, pip_size=pip_size)
+        data_by_symbol[symbol] = (h1.tz_localize("UTC"), m5.tz_localize("UTC"))
+
+    results = run_backtests_parallel(data_by_symbol, max_workers=2)
+
+    for symbol, (h1, m5) in data_by_symbol.items():
+        trades, final_balance = run_quietly(backtest.H3MEngine(symbol, make_charts=False).process_bar_data, h1, m5)
+        assert trades, "the synthetic data should produce trades"
+        assert results[symbol]['trades'] == trades
+        assert results[symbol]['final_balance'] == final_balance
+        assert [str(trade['entry_time'].tz) for trade in results[symbol]['trades']] == ["UTC"] * len(trades)
@@ -0,0 +1,135 @@
+# --- OHLC Cache Tests ---
+# OHLCCache must only request the gaps of a range, record what it fetched in the coverage JSON,
+# merge its part files without losing bars, and remember ranges the API has no bars for.
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from history_downloader import RateBudget
+from ohlc_cache import OHLCCache, merge_ranges, subtract_ranges
+from support import run_quietly
+from synthetic_data import make_synthetic_ohlc
+
+T = pd.Timestamp
+
+
+class FakeFetcher:
+    """get_historical_data over a fixed frame: the bars in [start, end], newest 'limit' first kept."""
+
+    def __init__(self, bars, limit=None, fail_after=None):
+        self.bars = bars
+        self.limit = limit
+        self.fail_after = fail_after # Requests answered before every further one fails
+        self.requests = []
+
+    def __call__(self, symbol, interval, start_date_str, end_date_str, api_key):
+        self.requests.append((T(start_date_str), T(end_date_str)))
+        if self.fail_after is not None and len(self.requests) > self.fail_after:
+            return None
+        window = self.bars.loc[T(start_date_str):T(end_date_str)]
+        return window.iloc[-self.limit:] if self.limit else window.copy()
+
+
+@pytest.fixture(scope="module")
+def m5():
+    _, m5 = make_synthetic_ohlc(14, seed=1) # Two weeks from Monday 2023-01-02, weekends without bars
+    return m5
+
+
+def _cache(tmp_path, fetcher, outputsize_limit=5000):
+    return OHLCCache(str(tmp_path), fetcher=fetcher, rate_budget=RateBudget(1_000_000, 1.0),
+                     outputsize_limit=outputsize_limit)
+
+
+def _get(cache, start, end):
+    return run_quietly(cache.get, "EUR/USD", "5min", start, end, "key")
+
+
+def test_merge_and_subtract_ranges():
+    assert merge_ranges([(5, 7), (1, 2), (2, 3), (6, 9)]) == [(1, 3), (5, 9)]
+    assert subtract_ranges(0, 10, [(2, 3), (5, 12)]) == [(0, 2), (3, 5)]
+    assert subtract_ranges(4, 6, [(1, 8)]) == []
+    assert subtract_ranges(4, 6, []) == [(4, 6)]
+
+
+def test_get_fetches_only_the_gaps(tmp_path, m5):
+    fetcher = FakeFetcher(m5)
+    cache = _cache(tmp_path, fetcher)
+
+    first = _get(cache, "2023-01-03 00:00:00", "2023-01-05 00:00:00")
+    second = _get(cache, "2023-01-04 00:00:00", "2023-01-06 12:00:00")
+    third = _get(cache, "2023-01-03 12:00:00", "2023-01-06 00:00:00")
+
+    assert fetcher.requests == [(T("2023-01-03"), T("2023-01-05")), (T("2023-01-05"), T("2023-01-06 12:00"))]
+    pd.testing.assert_frame_equal(first, m5.loc["2023-01-03 00:00":"2023-01-05 00:00"], check_freq=False)
+    pd.testing.assert_frame_equal(second, m5.loc["2023-01-04 00:00":"2023-01-06 12:00"], check_freq=False)
+    pd.testing.assert_frame_equal(third, m5.loc["2023-01-03 12:00":"2023-01-06 00:00"], check_freq=False)
+    with open(cache.coverage_path("EUR/USD", "5min")) as f:
+        assert json.load(f) == [["2023-01-03 00:00:00", "2023-01-06 12:00:00"]]
+
+
+def test_paginated_gap_is_merged_from_part_files(tmp_path, m5):
+    fetcher = FakeFetcher(m5, limit=500)
+    cache = _cache(tmp_path, fetcher, outputsize_limit=500)
+
+    result = _get(cache, "2023-01-02 00:00:00", "2023-01-13 23:55:00")
+
+    assert len(fetcher.requests) > 2
+    pd.testing.assert_frame_equal(result, m5.loc[:"2023-01-13 23:55"], check_freq=False)
+    assert not os.path.exists(cache.parts_dir("EUR/USD", "5min")) # Compacted into the main file
+    pd.testing.assert_frame_equal(pd.read_parquet(cache.data_path("EUR/USD", "5min")), result)
+
+
+def test_newer_parts_win_until_compacted(tmp_path, m5):
+    cache = _cache(tmp_path, FakeFetcher(m5))
+    day = m5.loc["2023-01-03"]
+    revised = day.iloc[100:].copy()
+    revised['close'] += 1.0
+
+    cache.store("EUR/USD", "5min", day, day.index[0], day.index[-1])
+    cache.store("EUR/USD", "5min", revised, revised.index[0], revised.index[-1])
+    expected = pd.concat([day.iloc[:100], revised])
+    pd.testing.assert_frame_equal(cache.load("EUR/USD", "5min"), expected, check_freq=False)
+    assert len(os.listdir(cache.parts_dir("EUR/USD", "5min"))) == 2
+
+    cache.compact("EUR/USD", "5min")
+    pd.testing.assert_frame_equal(cache.load("EUR/USD", "5min"), expected, check_freq=False)
+    assert cache.coverage("EUR/USD", "5min") == [(day.index[0], day.index[-1])]
+
+
+def test_range_without_bars_is_covered(tmp_path, m5):
+    fetcher = FakeFetcher(m5)
+    cache = _cache(tmp_path, fetcher)
+
+    weekend = _get(cache, "2023-01-07 00:00:00", "2023-01-08 12:00:00")
+    again = _get(cache, "2023-01-07 06:00:00", "2023-01-08 00:00:00")
+
+    assert len(fetcher.requests) == 1
+    assert weekend.empty and again.empty
+    assert list(weekend.columns) == ['open', 'high', 'low', 'close']
+    assert cache.coverage("EUR/USD", "5min") == [(T("2023-01-07"), T("2023-01-08 12:00"))]
+
+
+def test_failed_request_keeps_the_fetched_chunks(tmp_path, m5):
+    fetcher = FakeFetcher(m5, limit=500, fail_after=1)
+    cache = _cache(tmp_path, fetcher, outputsize_limit=500)
+
+    assert _get(cache, "2023-01-02 00:00:00", "2023-01-06 00:00:00") is None
+
+    covered = cache.coverage("EUR/USD", "5min")
+    assert len(covered) == 1
+    pd.testing.assert_frame_equal(cache.load("EUR/USD", "5min"), m5.loc[covered[0][0]:covered[0][1]], check_freq=False)
+    assert not os.path.exists(cache.parts_dir("EUR/USD", "5min"))
+
+
+def test_coverage_stops_at_now(tmp_path, m5):
+    cache = _cache(tmp_path, FakeFetcher(m5.iloc[0:0]))
+    future = pd.Timestamp.now('UTC').tz_localize(None) + pd.Timedelta(days=30)
+
+    _get(cache, "2023-01-02 00:00:00", future.strftime("%Y-%m-%d %H:%M:%S"))
+
+    (covered_start, covered_end), = cache.coverage("EUR/USD", "5min")
+    assert covered_start == T("2023-01-02") and covered_end < future
@@ -0,0 +1,65 @@
+# --- Optimizer Tests ---
+# Parameter ranges must parse into typed value lists, the grid must hold every combination, and
+# run_grid must rank the same results a direct engine run gives, with the engine or the kernel.
+
+import pytest
+
+import backtest
+from optimizer import build_grid, parse_param_range, run_grid
+from support import run_quietly
+from synthetic_data import make_synthetic_ohlc
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("min_rr=1.5:3.0:0.5", ("min_rr", [1.5, 2.0, 2.5, 3.0])),
+    ("min_rr=0.1:0.3:0.1", ("min_rr", [0.1, 0.2, 0.3])),
+    ("max_bos_distance_pips=10,15, 20", ("max_bos_distance_pips", [10.0, 15.0, 20.0])),
+    ("h1_fractal_period=2:4:1", ("h1_fractal_period", [2, 3, 4])),
+    ("asia_start_hour_utc=0,1.0", ("asia_start_hour_utc", [0, 1])),
+])
+def test_parse_param_range(spec, expected):
+    name, values = parse_param_range(spec)
+    assert (name, values) == expected
+    assert all(type(value) is type(expected[1][0]) for value in values)
+
+
+@pytest.mark.parametrize("spec", ["min_rr", "unknown=1,2", "min_rr=1:2:0", "min_rr=3:2:0.5", "min_rr=",
+                                  "h1_fractal_period=2.5,3", "h1_fractal_period=1:2:0.5"])
+def test_parse_param_range_rejects(spec):
+    with pytest.raises(ValueError):
+        parse_param_range(spec)
+
+
+def test_build_grid_holds_every_combination():
+    grid = build_grid({'min_rr': [1.5, 2.0], 'h1_fractal_period': [2, 3, 4]})
+    assert len(grid) == 6
+    assert grid[0] == {'min_rr': 1.5, 'h1_fractal_period': 2} and grid[-1] == {'min_rr': 2.0, 'h1_fractal_period': 4}
+    assert build_grid({}) == [{}]
+
+
+@pytest.fixture(scope="module")
+def data():
+    h1, m5 = make_synthetic_ohlc(60, seed=9)
+    return backtest.BacktestData(h1, m5, "EUR/USD")
+
+
+@pytest.mark.parametrize("use_kernel", [False, True])
+def test_run_grid_in_process(data, use_kernel):
+    grid = build_grid({'min_rr': [1.3, 2.5], 'asia_start_hour_utc': [0, 1]})
+
+    results = run_grid(data, grid, max_workers=1, use_kernel=use_kernel)
+
+    assert len(results) == 4 and 'error' not in results.columns
+    assert results['total_pnl_currency'].is_monotonic_decreasing
+    assert {(1, hour, backtest.ASIA_FRACTAL_EVAL_HOUR_UTC_EXCLUSIVE) for hour in (0, 1)} <= set(data._asia_fractals)
+    for row in results.itertuples():
+        params = backtest.StrategyParams(min_rr=row.min_rr, asia_start_hour_utc=row.asia_start_hour_utc)
+        _, final_balance = run_quietly(backtest.H3MEngine("EUR/USD", make_charts=False, params=params).process_bar_data, data=data)
+        assert row.final_balance == final_balance
+
+
+def test_run_grid_reports_failing_combinations(data):
+    results = run_grid(data, [{'min_rr': 1.3}, {'no_such_parameter': 1}], max_workers=1)
+
+    assert len(results) == 2
+    assert results['error'].notna().sum() == 1
@@ -0,0 +1,68 @@
+# --- Setup Scanner Tests ---
+# H3MEngine skips bars with DayScanner; it must give the same trades, balance and log as an engine
+# visiting every M5 bar, including on days with a sweep but no BOS.
+
+import contextlib
+import io
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest
+from bar_arrays import BarArrays
+from setup_scanner import DayScanner
+from support import run_quietly
+from synthetic_data import make_synthetic_ohlc
+
+
+class EveryBarEngine(backtest.H3MEngine):
+    def _m5_bars_to_visit(self, m5_bars, trend_h1):
+        return (m5_bars.bar(position) for position in range(len(m5_bars)))
+
+
+@pytest.fixture(scope="module")
+def data():
+    h1, m5 = make_synthetic_ohlc(90, seed=8)
+    return run_quietly(backtest.BacktestData(h1, m5, "EUR/USD").precompute, (3,))
+
+
+def _run(engine_class, data, params):
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        trades, balance = engine_class("EUR/USD", make_charts=False, params=params).process_bar_data(data=data)
+    return trades, balance, log.getvalue()
+
+
+@pytest.mark.parametrize("overrides", [{}, {'max_bos_distance_pips': 3.0}, {'min_rr': 3.0}])
+def test_scanner_matches_every_bar(data, overrides):
+    params = backtest.StrategyParams(**overrides)
+    every_trades, every_balance, every_log = _run(EveryBarEngine, data, params)
+    trades, balance, log = _run(backtest.H3MEngine, data, params)
+
+    assert trades, "the synthetic data should produce trades"
+    assert (trades, balance) == (every_trades, every_balance)
+    assert log == every_log
+    swept_days = set(re.findall(r"SWEPT by M5 (\d{4}-\d{2}-\d{2})", log))
+    traded_days = {str(trade['entry_time'].date()) for trade in trades}
+    assert swept_days - traded_days, "the run should include days with a sweep but no BOS"
+
+
+def test_next_event_on_a_day_with_a_sweep_but_no_bos():
+    index = pd.date_range("2024-01-02", periods=288, freq="5min")
+    prices = np.full(288, 1.1)
+    lows = prices.copy()
+    lows[index.get_loc(pd.Timestamp("2024-01-02 03:00"))] = 1.098 # Below the level, but before the Frankfurt open
+    sweep = index.get_loc(pd.Timestamp("2024-01-02 08:00"))
+    lows[sweep] = 1.099
+    bars = BarArrays.from_frame(pd.DataFrame({'open': prices, 'high': prices, 'low': lows, 'close': prices}, index=index))
+    scanner = DayScanner(bars, backtest.StrategyParams())
+    always = [int(position) for position in np.flatnonzero(scanner.always)] # 06:00-06:25 and 07:00-07:10
+
+    assert scanner.next_event(0) == always[0]
+    assert scanner.next_event(always[-1] + 1) == -1
+    assert scanner.next_event(always[-1] + 1, sweep_low=1.0995) == sweep
+    assert scanner.next_event(sweep + 1, bos_low=1.1005) == -1 # No close above the BOS level
+    assert scanner.next_event(sweep + 1, bos_low=1.0995) == sweep + 1
+    assert scanner.next_event(len(index)) == -1
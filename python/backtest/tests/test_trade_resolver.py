@@ -0,0 +1,48 @@
+# --- Trade Resolver Tests ---
+# resolve_trades must give the same outcome, exit bar and PnL for every trade of a batch as
+# backtest.simulate_trade_outcome gives for that trade alone.
+
+import numpy as np
+
+import backtest
+from day_index import DayIndex
+from support import run_quietly
+from synthetic_data import make_synthetic_ohlc
+from trade_resolver import resolve_trades, CLOSED_EOD, ERROR_NO_BARS, SL_HIT, TP_HIT
+
+TRADES = 400
+
+
+def test_resolve_trades_matches_simulate_trade_outcome():
+    _, m5 = make_synthetic_ohlc(40, seed=5)
+    days = DayIndex(m5.index)
+    rng = np.random.default_rng(5)
+    day_numbers = rng.integers(0, len(days.dates), TRADES)
+    entry_positions = days.starts[day_numbers] + rng.integers(72, 144, TRADES)
+    starts, ends = entry_positions + 1, days.ends[day_numbers]
+    entry_prices = m5['close'].to_numpy()[entry_positions]
+    bullish = rng.random(TRADES) < 0.5
+    risk = rng.uniform(5, 30, TRADES) * 0.0001
+    reward = risk * rng.uniform(1.3, 4.0, TRADES)
+    sl_prices = np.where(bullish, entry_prices - risk, entry_prices + risk)
+    tp_prices = np.where(bullish, entry_prices + reward, entry_prices - reward)
+
+    records = [run_quietly(backtest.simulate_trade_outcome, entry_prices[k], sl_prices[k], tp_prices[k], "bullish" if bullish[k] else "bearish",
+                           m5.index[entry_positions[k]], m5.iloc[starts[k]:ends[k]], 0.0001, 1.0, 10.0)
+               for k in range(TRADES)]
+    batch = resolve_trades(m5['high'].to_numpy(), m5['low'].to_numpy(), m5['close'].to_numpy(), starts, ends,
+                           entry_prices, sl_prices, tp_prices, bullish, 0.0001, 1.0, 10.0)
+
+    assert {SL_HIT, TP_HIT, CLOSED_EOD} <= set(batch['outcome'])
+    assert list(batch['outcome']) == [record['outcome'] for record in records]
+    assert [m5.index[position] for position in batch['exit_position']] == [record['exit_time'] for record in records]
+    assert [round(pnl, 2) for pnl in batch['pnl_currency']] == [record['pnl_currency'] for record in records]
+
+
+def test_resolve_trades_reports_empty_ranges():
+    highs, lows, closes = np.array([1.2, 1.3]), np.array([1.0, 1.1]), np.array([1.1, 1.2])
+    batch = resolve_trades(highs, lows, closes, [2, 0], [2, 2], [1.1, 1.1], [1.0, 0.9], [1.5, 1.5], [True, True], 0.0001)
+
+    assert list(batch['outcome']) == [ERROR_NO_BARS, CLOSED_EOD]
+    assert list(batch['exit_position']) == [-1, 1]
+    assert batch['exit_price'].tolist() == [1.1, 1.2]
@@ -0,0 +1,39 @@
+# --- Trend Context Tests ---
+# trend_by_day must give, for every date, the decision determine_h1_trend_context makes from the
+# H1 bars before 00:00 UTC of that date, and BacktestData.trend_for must read it from that table.
+
+import pandas as pd
+import pytest
+
+import backtest
+from support import run_quietly
+from synthetic_data import make_synthetic_ohlc
+from trend_context import TREND_COLUMNS, rolling_trend, trend_by_day
+
+
+@pytest.mark.parametrize("pip_size", [0.0001, 0.01])
+def test_trend_by_day_matches_per_day_prefix(pip_size):
+    h1, _ = make_synthetic_ohlc(60, seed=2, pip_size=pip_size)
+    dates = backtest.DayIndex(h1.index).dates
+    table = trend_by_day(h1, pip_size, dates)
+
+    per_day = [run_quietly(backtest.determine_h1_trend_context, h1[h1.index < pd.Timestamp(date)], pip_size) for date in dates]
+    assert list(table['trend']) == per_day
+    assert set(per_day) == {"bullish", "bearish", "neutral"}
+
+
+def test_trend_by_day_reuses_a_rolling_frame():
+    h1, _ = make_synthetic_ohlc(20, seed=4)
+    table = trend_by_day(h1, 0.0001, rolling=rolling_trend(h1, 0.0001))
+
+    pd.testing.assert_frame_equal(table, trend_by_day(h1, 0.0001))
+    assert list(table.columns) == list(TREND_COLUMNS) + ['h1_bars']
+
+
+def test_trend_for_reads_the_trend_table():
+    h1, m5 = make_synthetic_ohlc(30, seed=6)
+    data = backtest.BacktestData(h1, m5, "EUR/USD")
+    trends = [run_quietly(data.trend_for, date) for date in data.m5_days.dates]
+
+    assert trends == list(data.trend_table()['trend'])
+    assert data.trend_table() is data.trend_table()
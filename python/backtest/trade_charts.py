@@ -0,0 +1,350 @@
+# --- Trade Charts ---
+# Two-panel H1/M5 chart of a simulated trade (Asia fractal, sweep bar, BOS level, entry, SL/TP
+# and exit), rendered with mplfinance and saved to charts/.
+#
+# Kept out of backtest.py so the strategy and backtest core import with NumPy/pandas only:
+# backtest.plot_trade_with_context imports this module on the first chart, and matplotlib is
+# never loaded by headless runs (optimizer and multi-symbol workers, make_charts=False).
+#
+# plot_trade_with_context() renders one chart in its own figure. TradeChartBatch renders many:
+# the mplfinance column views are prepared once per H1/M5 frame and one figure is reused for
+# every trade, written as PNG files, a single multi-page PDF, or one PNG sprite sheet.
+
+import math
+import os # For creating directories
+from datetime import timedelta
+
+import matplotlib.pyplot as plt
+import mplfinance as mpf
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_pdf import PdfPages
+
+from trend_context import TrendContext
+
+MPLFINANCE_COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+OHLC_COLUMNS = ['Open', 'High', 'Low', 'Close']
+FIGURE_SIZE = (16, 10)
+
+
+def chart_path(trade_info: dict, symbol: str, plot_filename_prefix: str, extension: str = "png") -> str:
+    """File name of a trade's chart under charts/."""
+    filename_safe_time = trade_info['entry_time'].strftime("%Y%m%d_%H%M%S")
+    return os.path.join("charts", f"{plot_filename_prefix}_{symbol.replace('/', '')}_{filename_safe_time}.{extension}")
+
+
+def _trade_bars(trade_info: dict, h1_all_data: pd.DataFrame, m5_all_data: pd.DataFrame, verbose: bool = True):
+    """
+    H1 and M5 bars a trade's chart shows, as positional slices of the (sorted) inputs (no copies).
+    M5: from 1 hour before the entry to 1 hour after the exit; H1: the day before the entry to the day after the exit.
+
+    Returns:
+        tuple: (h1_df_trade, m5_df_trade)
+    """
+    entry_time = trade_info['entry_time']
+    exit_time = trade_info['exit_time']
+
+    # M5 chart: from 1 hour before entry to 1 hour after exit (or end of data for that day)
+    m5_plot_start = entry_time - timedelta(hours=1)
+    m5_plot_end = exit_time + timedelta(hours=1) if exit_time else entry_time + timedelta(hours=4) # If no exit time (e.g. error), show a few hours
+
+    if verbose:
+        print(f"[PLOT_DEBUG_M5] Requested M5 plot range: {m5_plot_start} to {m5_plot_end}")
+        print(f"[PLOT_DEBUG_M5] m5_all_data shape: {m5_all_data.shape if m5_all_data is not None and not m5_all_data.empty else 'None or Empty'}")
+        print(f"[PLOT_DEBUG_M5] Entry time: {entry_time}, Exit time: {exit_time}")
+
+    # Ensure m5_plot_end does not go beyond available m5_all_data for that day or next day if trade spans
+    if not m5_all_data.empty:
+        m5_plot_end = min(m5_plot_end, m5_all_data.index.max())
+        m5_plot_start = max(m5_plot_start, m5_all_data.index.min())
+        if verbose:
+            print(f"[PLOT_DEBUG_M5] Adjusted M5 plot range: {m5_plot_start} to {m5_plot_end}")
+
+    m5_df_trade = m5_all_data.iloc[m5_all_data.index.searchsorted(m5_plot_start, side='left'):
+                                   m5_all_data.index.searchsorted(m5_plot_end, side='right')]
+    if verbose:
+        print(f"[PLOT_DEBUG_M5] m5_df_trade shape after filtering: {m5_df_trade.shape}")
+
+    # H1 chart: Show a window of H1 bars around the trade day(s)
+    h1_plot_start_date = entry_time.date() - timedelta(days=1)
+    h1_plot_end_date = (exit_time.date() if exit_time else entry_time.date()) + timedelta(days=1)
+
+    h1_df_trade = h1_all_data.iloc[h1_all_data.index.searchsorted(pd.Timestamp(h1_plot_start_date, tz=h1_all_data.index.tz), side='left'):
+                                   h1_all_data.index.searchsorted(pd.Timestamp(h1_plot_end_date + timedelta(days=1), tz=h1_all_data.index.tz), side='left')]
+    return h1_df_trade, m5_df_trade
+
+
+def _draw_trade(fig, ax_h1, ax_m5, trade_info: dict, h1_df_trade: pd.DataFrame, m5_df_trade: pd.DataFrame, symbol: str,
+                asia_level_data: dict = None, sweep_bar_m5_data: dict = None, bos_level_data: dict = None,
+                verbose: bool = True, coerce: bool = True):
+    """
+    Draws a trade onto the two (empty) axes of a chart figure. The bar frames must have the mplfinance
+    column names (MPLFINANCE_COLUMNS). verbose prints the M5 debug log; coerce converts the M5 prices
+    to numbers first (TradeChartBatch converts its frames once instead).
+    """
+    entry_time = trade_info['entry_time']
+    exit_time = trade_info['exit_time']
+    entry_price = trade_info['entry_price']
+    sl_price = trade_info['sl_price']
+    tp_price = trade_info['tp_price']
+    exit_price = trade_info['exit_price']
+    trade_direction = trade_info['trade_direction']
+
+    fig.suptitle(f"{symbol} - Trade at {entry_time.strftime('%Y-%m-%d %H:%M')} ({trade_direction.capitalize()})\nOutcome: {trade_info['outcome']}, PnL: {trade_info['pnl_pips']:.1f} pips", fontsize=14)
+
+    # --- Plot H1 Data ---
+    if not h1_df_trade.empty:
+        mpf.plot(h1_df_trade, type='candle', ax=ax_h1, style='yahoo',
+                 ylabel='Price (H1)', xrotation=0)
+        ax_h1.set_title('H1 Context')
+        ax_h1.grid(True, linestyle='--', alpha=0.7)
+
+        # Add Entry, SL, TP lines to H1 chart
+        if entry_price: ax_h1.axhline(entry_price, color='blue', linestyle='-', linewidth=1.5, label=f'Entry: {entry_price:.5f}') # Increased linewidth
+        if sl_price: ax_h1.axhline(sl_price, color='red', linestyle='--', linewidth=1.5, label=f'SL: {sl_price:.5f}') # Increased linewidth, changed to dashed
+        if tp_price: ax_h1.axhline(tp_price, color='green', linestyle=':', linewidth=1.5, label=f'TP: {tp_price:.5f}') # Increased linewidth, changed to dotted
+
+        if asia_level_data and asia_level_data.get('level') is not None and asia_level_data.get('time') is not None:
+            ax_h1.axhline(asia_level_data['level'], color='purple', linestyle='-.', linewidth=1.2,
+                          label=f"Asia {asia_level_data['type'].capitalize()} Fr. ({asia_level_data['level']:.5f} @ {asia_level_data['time'].strftime('%H:%M')})")
+        ax_h1.legend(fontsize='small')
+
+    # --- Plot M5 Data ---
+    if not m5_df_trade.empty:
+        ohlc_present = all(col in m5_df_trade.columns for col in OHLC_COLUMNS)
+        if verbose:
+            print(f"[PLOT_DEBUG_M5] m5_df_trade.head():\n{m5_df_trade.head()}")
+            print(f"[PLOT_DEBUG_M5] m5_df_trade.tail():\n{m5_df_trade.tail()}")
+            print(f"[PLOT_DEBUG_M5] Required columns (Open, High, Low, Close) for mplfinance present? {ohlc_present}")
+
+        if coerce:
+            # Ensure correct data types before plotting
+            m5_df_trade.index = pd.to_datetime(m5_df_trade.index)
+            for col in OHLC_COLUMNS:
+                if col in m5_df_trade.columns:
+                    m5_df_trade[col] = pd.to_numeric(m5_df_trade[col], errors='coerce')
+            m5_df_trade.dropna(subset=OHLC_COLUMNS, inplace=True) # Drop rows if coerce created NaNs
+
+        if len(m5_df_trade) < 2 or not ohlc_present:
+            warning_message = f"M5 data insufficient for candles ({len(m5_df_trade)} row(s))"
+            if not ohlc_present:
+                warning_message += " or OHLC columns missing/incorrectly named for mplfinance."
+            print(f"[PLOT_WARN_M5] {warning_message}")
+            ax_m5.text(0.5, 0.5, warning_message, horizontalalignment='center', verticalalignment='center', transform=ax_m5.transAxes, wrap=True)
+            ax_m5.set_title('M5 Execution & Management (Candles Not Plotted)')
+            ax_m5.grid(True, linestyle='--', alpha=0.7)
+        else:
+            try:
+                if verbose:
+                    print(f"[PLOT_DEBUG_M5] Plotting M5 candles with m5_df_trade (shape: {m5_df_trade.shape}).")
+
+                # Plot M5 candles FIRST, then the lines and markers on top
+                mpf.plot(m5_df_trade, type='candle', ax=ax_m5, style='yahoo',
+                         ylabel='Price (M5)', xrotation=0)
+
+                ax_m5.set_title('M5 Execution & Management') # Set title after main plot
+                ax_m5.grid(True, linestyle='--', alpha=0.7) # Set grid after main plot
+
+                if sl_price: ax_m5.axhline(sl_price, color='red', linestyle='-', linewidth=1, label=f'SL: {sl_price:.5f}')
+                if tp_price: ax_m5.axhline(tp_price, color='green', linestyle='-', linewidth=1, label=f'TP: {tp_price:.5f}')
+
+                entry_marker_style = '^' if trade_direction == TrendContext.BULLISH else 'v'
+                if entry_price and entry_time:
+                    ax_m5.plot(entry_time, entry_price, marker=entry_marker_style,
+                               color='blue', markersize=12, label=f'Entry @ {entry_price:.5f}')
+                    va_offset = 'bottom' if trade_direction == TrendContext.BULLISH else 'top'
+                    ha_offset = 'left'
+                    ax_m5.text(entry_time, entry_price, f" {entry_price:.5f}",
+                               color='blue',
+                               verticalalignment=va_offset,
+                               horizontalalignment=ha_offset,
+                               fontsize=9,
+                               bbox=dict(boxstyle='round,pad=0.2', fc='yellow', alpha=0.6, ec='blue'))
+
+                if exit_time and exit_price:
+                    ax_m5.plot(exit_time, exit_price, marker='o', color='black', markersize=10, label=f'Exit: {exit_price:.5f}')
+
+                if asia_level_data and asia_level_data.get('level') is not None:
+                     ax_m5.axhline(asia_level_data['level'], color='purple', linestyle=':', linewidth=1.2,
+                                  label=f"Asia Lvl ({asia_level_data['level']:.5f})")
+
+                if sweep_bar_m5_data and sweep_bar_m5_data.get('time') is not None:
+                    sweep_time = sweep_bar_m5_data['time']
+                    sweep_marker_price = sweep_bar_m5_data['low'] if trade_direction == TrendContext.BULLISH else sweep_bar_m5_data['high']
+                    ax_m5.plot(sweep_time, sweep_marker_price, marker='s', color='orange', markersize=7,
+                               label=f"Sweep Bar @ {sweep_time.strftime('%H:%M')}")
+
+                if bos_level_data and bos_level_data.get('level') is not None and bos_level_data.get('type'):
+                    bos_line_label = f"BOS Lvl (Sweep H): {bos_level_data['level']:.5f}" if bos_level_data['type'] == 'sweep_high' else f"BOS Lvl (Sweep L): {bos_level_data['level']:.5f}"
+                    ax_m5.axhline(bos_level_data['level'], color='cyan', linestyle=':', linewidth=1.2, label=bos_line_label)
+
+                ax_m5.legend(fontsize='small') # Legend after all plottable items are added
+
+            except Exception as e_mpf_m5:
+                print(f"[PLOT_ERROR_M5] Error during M5 mplfinance.plot or subsequent M5 plotting: {e_mpf_m5}")
+                error_text = f"Error plotting M5: {str(e_mpf_m5)[:100]}" # Limit error message length
+                ax_m5.text(0.5, 0.5, error_text, horizontalalignment='center', verticalalignment='center', transform=ax_m5.transAxes, wrap=True, color='red')
+                ax_m5.set_title('M5 Execution & Management (Error)')
+                ax_m5.grid(True, linestyle='--', alpha=0.7)
+
+        ax_m5.legend(fontsize='small')
+    else:
+        if verbose:
+            print("[PLOT_INFO_M5] m5_df_trade is empty. Displaying 'No M5 data' message.")
+        ax_m5.text(0.5, 0.5, "No M5 data for this plot period", horizontalalignment='center', verticalalignment='center', transform=ax_m5.transAxes)
+        ax_m5.set_title('M5 Execution & Management (No Data)')
+        ax_m5.grid(True, linestyle='--', alpha=0.7) # Add grid and title for consistency
+
+    # Fine-tune layout
+    fig.tight_layout(rect=[0, 0, 1, 0.96])
+
+
+def plot_trade_with_context(trade_info: dict,
+                            h1_all_data: pd.DataFrame,
+                            m5_all_data: pd.DataFrame,
+                            symbol: str,
+                            plot_filename_prefix: str,
+                            asia_level_data: dict = None, # {'level': float, 'time': pd.Timestamp, 'type': 'high'/'low'}
+                            sweep_bar_m5_data: dict = None, # {'time': pd.Timestamp, 'high': float, 'low': float, 'close': float}
+                            bos_level_data: dict = None,    # {'level': float, 'time': pd.Timestamp}
+                            pip_size: float = 0.0001
+                            ):
+    """
+    Plots H1 and M5 charts for a given trade, including context like fractals, sweep, and BOS.
+    Saves the plot to a file.
+    """
+    if not os.path.exists("charts"):
+        os.makedirs("charts")
+
+    h1_df_trade, m5_df_trade = _trade_bars(trade_info, h1_all_data, m5_all_data)
+    if m5_df_trade.empty and h1_df_trade.empty:
+        print(f"[PLOT_WARN] No data available for plotting trade at {trade_info['entry_time']}. Skipping plot.")
+        return
+
+    # Prepare data for mplfinance (expects capitalized column names); rename returns new frames, the inputs are never modified
+    m5_df_trade = m5_df_trade.rename(columns=MPLFINANCE_COLUMNS)
+    h1_df_trade = h1_df_trade.rename(columns=MPLFINANCE_COLUMNS)
+
+    # --- Create Plot ---
+    fig, axes = plt.subplots(2, 1, figsize=FIGURE_SIZE, sharex=False, gridspec_kw={'height_ratios': [1, 2]})
+    _draw_trade(fig, axes[0], axes[1], trade_info, h1_df_trade, m5_df_trade, symbol, asia_level_data, sweep_bar_m5_data, bos_level_data)
+
+    # Save the plot
+    plot_path = chart_path(trade_info, symbol, plot_filename_prefix)
+    try:
+        plt.savefig(plot_path)
+        print(f"[PLOT] Trade chart saved to: {plot_path}")
+    except Exception as e:
+        print(f"[PLOT_ERROR] Failed to save chart: {e}")
+    plt.close(fig) # Close the figure to free memory
+
+
+# --- Batch Rendering ---
+class TradeChartBatch:
+    """
+    Collects trade charts and renders them together with a single reused figure.
+
+    submit() takes the arguments of plot_trade_with_context, so a batch can stand in for a
+    chart_pool.ChartPool on H3MEngine; the charts are drawn by close(). Each distinct H1/M5 frame
+    is renamed to the mplfinance columns and converted to float once, and every trade then only
+    slices it; the figure and its two axes are cleared and redrawn instead of being recreated.
+
+    Args:
+        output (str): 'png' (one file per trade under charts/, as plot_trade_with_context),
+                      'pdf' (one page per trade) or 'sprite' (one PNG sheet of all charts).
+        path (str): Output file for 'pdf'/'sprite' (default: charts/trades.pdf or charts/trades_sprite.png).
+        sprite_columns (int): Charts per row of the sprite sheet.
+        sprite_dpi (int): Resolution of each chart in the sprite sheet (a 16x10 in figure is 640x400 px at 40 dpi).
+    """
+    __slots__ = ('output', 'path', 'sprite_columns', 'sprite_dpi', '_jobs', '_prepared')
+
+    OUTPUTS = ('png', 'pdf', 'sprite')
+
+    def __init__(self, output: str = 'png', path: str = None, sprite_columns: int = 4, sprite_dpi: int = 40):
+        if output not in self.OUTPUTS:
+            raise ValueError(f"Unknown chart batch output '{output}'. Expected one of: {', '.join(self.OUTPUTS)}")
+        self.output = output
+        self.path = path or {'png': "charts", 'pdf': os.path.join("charts", "trades.pdf"),
+                             'sprite': os.path.join("charts", "trades_sprite.png")}[output]
+        self.sprite_columns = sprite_columns
+        self.sprite_dpi = sprite_dpi
+        self._jobs = []
+        self._prepared = {} # id(frame) -> (frame, mplfinance view)
+
+    def submit(self, trade_info: dict, h1_data: pd.DataFrame, m5_data: pd.DataFrame, symbol: str, prefix: str,
+               asia_level_data: dict = None, sweep_bar_data: dict = None, bos_level_data: dict = None,
+               pip_size: float = 0.0001):
+        """Queues a chart (same arguments as plot_trade_with_context)."""
+        self._jobs.append((trade_info, self._mplfinance_view(h1_data), self._mplfinance_view(m5_data), symbol, prefix,
+                           asia_level_data, sweep_bar_data, bos_level_data))
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def _mplfinance_view(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """The frame with mplfinance column names and float OHLC (NaN rows dropped), built once per frame."""
+        entry = self._prepared.get(id(frame))
+        if entry is None or entry[0] is not frame:
+            view = frame.rename(columns=MPLFINANCE_COLUMNS)
+            present = [col for col in OHLC_COLUMNS if col in view.columns]
+            view = view.astype({col: np.float64 for col in present}).dropna(subset=present)
+            entry = self._prepared[id(frame)] = (frame, view) # Holding the frame keeps its id unique
+        return entry[1]
+
+    def close(self) -> int:
+        """
+        Renders every queued chart into the configured output.
+
+        Returns:
+            int: Number of charts drawn.
+        """
+        if not self._jobs:
+            print("[PLOT_BATCH] No charts to render.")
+            return 0
+        os.makedirs(self.path if self.output == 'png' else (os.path.dirname(self.path) or "."), exist_ok=True)
+        dpi = self.sprite_dpi if self.output == 'sprite' else None
+        fig = plt.figure(figsize=FIGURE_SIZE, dpi=dpi)
+        pdf = PdfPages(self.path) if self.output == 'pdf' else None
+        tiles = []
+        drawn = 0
+        try:
+            for trade_info, h1_view, m5_view, symbol, prefix, asia_level_data, sweep_bar_data, bos_level_data in self._jobs:
+                h1_df_trade, m5_df_trade = _trade_bars(trade_info, h1_view, m5_view, verbose=False)
+                if m5_df_trade.empty and h1_df_trade.empty:
+                    print(f"[PLOT_WARN] No data available for plotting trade at {trade_info['entry_time']}. Skipping plot.")
+                    continue
+                fig.clear() # Fresh axes on the same figure and canvas: cleared axes keep mplfinance's tick locator state
+                axes = fig.subplots(2, 1, sharex=False, gridspec_kw={'height_ratios': [1, 2]})
+                _draw_trade(fig, axes[0], axes[1], trade_info, h1_df_trade, m5_df_trade, symbol,
+                            asia_level_data, sweep_bar_data, bos_level_data, verbose=False, coerce=False)
+                if self.output == 'png':
+                    fig.savefig(os.path.join(self.path, os.path.basename(chart_path(trade_info, symbol, prefix))))
+                elif self.output == 'pdf':
+                    pdf.savefig(fig)
+                else:
+                    fig.canvas.draw()
+                    tiles.append(np.asarray(fig.canvas.buffer_rgba()).copy())
+                drawn += 1
+        finally:
+            if pdf is not None:
+                pdf.close()
+            plt.close(fig)
+
+        if self.output == 'sprite' and tiles:
+            tile_height, tile_width = tiles[0].shape[:2]
+            columns = min(self.sprite_columns, len(tiles))
+            sheet = np.full((math.ceil(len(tiles) / columns) * tile_height, columns * tile_width, 4), 255, dtype=np.uint8)
+            for k, tile in enumerate(tiles):
+                row, column = divmod(k, columns)
+                sheet[row * tile_height:(row + 1) * tile_height, column * tile_width:(column + 1) * tile_width] = tile
+            plt.imsave(self.path, sheet)
+        print(f"[PLOT_BATCH] {drawn} trade chart(s) rendered to {self.path} ({self.output}).")
+        self._jobs = []
+        self._prepared = {}
+        return drawn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
@@ -0,0 +1,103 @@
+# --- Trade Resolver ---
+# Array-based SL/TP resolution for simulated trades. The first bar whose range reaches the stop
+# loss or the take profit is found with one boolean mask and argmax instead of iterating bars;
+# within a bar the stop loss takes precedence (the bar could have hit both, and the simulation
+# assumes the worse one). Trades without a hit are closed at the close of their last bar.
+#
+# first_exit() resolves one trade and backs backtest.simulate_trade_outcome; resolve_trades()
+# resolves a whole batch of trades over shared bar arrays at once (parameter sweeps, multi-symbol runs).
+
+import numpy as np
+import pandas as pd
+
+SL_HIT = 'SL_HIT'
+TP_HIT = 'TP_HIT'
+CLOSED_EOD = 'CLOSED_EOD'
+ERROR_NO_BARS = 'ERROR_NO_BARS'
+
+
+def first_exit(highs: np.ndarray, lows: np.ndarray, sl_price: float, tp_price: float, bullish: bool, eligible: np.ndarray = None):
+    """
+    First bar that hits the stop loss or the take profit of one trade.
+
+    Args:
+        highs, lows (np.ndarray): High/low prices of the bars after the entry, chronological.
+        sl_price, tp_price (float): Stop loss and take profit prices.
+        bullish (bool): True for a buy (SL below, TP above), False for a sell.
+        eligible (np.ndarray): Optional boolean mask of the bars that may close the trade.
+
+    Returns:
+        tuple: (position, outcome) with outcome SL_HIT or TP_HIT, or (-1, None) if neither is hit.
+    """
+    if bullish:
+        sl_hit, tp_hit = lows <= sl_price, highs >= tp_price
+    else:
+        sl_hit, tp_hit = highs >= sl_price, lows <= tp_price
+    hit = sl_hit | tp_hit
+    if eligible is not None:
+        hit &= eligible
+    if not hit.any():
+        return -1, None
+    position = int(np.argmax(hit))
+    return position, SL_HIT if sl_hit[position] else TP_HIT
+
+
+def resolve_trades(highs, lows, closes, starts, ends, entry_prices, sl_prices, tp_prices, bullish,
+                   pip_size: float, position_sizes=1.0, pip_value_per_lot: float = 10.0) -> pd.DataFrame:
+    """
+    Resolves a batch of trades over shared bar arrays without a Python loop per trade or per bar.
+
+    Args:
+        highs, lows, closes (np.ndarray): Bar prices, chronological (e.g. a whole M5 history).
+        starts, ends (np.ndarray): Per trade, the bar positions [start, end) it can exit in
+                                   (typically the bar after the entry bar up to the end of that day).
+        entry_prices, sl_prices, tp_prices (np.ndarray): Per-trade prices.
+        bullish (np.ndarray): Per trade, True for a buy and False for a sell.
+        pip_size (float): Pip size of the symbol.
+        position_sizes (float or np.ndarray): Lots per trade (for pnl_currency).
+        pip_value_per_lot (float): Value of one pip for one lot.
+
+    Returns:
+        pd.DataFrame: One row per trade: 'outcome' (SL_HIT, TP_HIT, CLOSED_EOD, or ERROR_NO_BARS for an
+                      empty range), 'exit_position' (bar position, -1 if none), 'exit_price', 'pnl_pips'
+                      and 'pnl_currency'. Values are not rounded (simulate_trade_outcome rounds its record).
+    """
+    starts, ends = np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+    entry_prices, sl_prices, tp_prices = (np.asarray(prices, dtype=np.float64) for prices in (entry_prices, sl_prices, tp_prices))
+    bullish = np.asarray(bullish, dtype=bool)
+    n_trades = len(starts)
+
+    # All (trade, bar) pairs of the batch, trade by trade
+    lengths = np.maximum(ends - starts, 0)
+    offsets = np.cumsum(lengths) - lengths
+    total = int(lengths.sum())
+    trade_of_pair = np.repeat(np.arange(n_trades), lengths)
+    bar_of_pair = np.arange(total) - np.repeat(offsets, lengths) + np.repeat(starts, lengths)
+
+    pair_highs, pair_lows = highs[bar_of_pair], lows[bar_of_pair]
+    pair_bullish = bullish[trade_of_pair]
+    pair_sl, pair_tp = sl_prices[trade_of_pair], tp_prices[trade_of_pair]
+    sl_hit = np.where(pair_bullish, pair_lows <= pair_sl, pair_highs >= pair_sl)
+    tp_hit = np.where(pair_bullish, pair_highs >= pair_tp, pair_lows <= pair_tp)
+
+    first_pair = np.full(n_trades, total, dtype=np.int64)
+    has_bars = lengths > 0
+    if total:
+        candidates = np.where(sl_hit | tp_hit, np.arange(total), total)
+        first_pair[has_bars] = np.minimum.reduceat(candidates, offsets[has_bars])
+    hit = first_pair < total
+    hit_pair = np.where(hit, first_pair, 0)
+    stopped = hit & sl_hit[hit_pair] if total else hit
+
+    outcome = np.full(n_trades, ERROR_NO_BARS, dtype=object)
+    outcome[has_bars] = CLOSED_EOD
+    outcome[hit] = TP_HIT
+    outcome[stopped] = SL_HIT
+    exit_position = np.where(hit, bar_of_pair[hit_pair] if total else -1, np.where(has_bars, ends - 1, -1))
+
+    exit_price = np.where(stopped, sl_prices, np.where(hit, tp_prices, entry_prices))
+    closed_eod = has_bars & ~hit
+    exit_price[closed_eod] = closes[ends[closed_eod] - 1]
+    pnl_pips = np.where(bullish, exit_price - entry_prices, entry_prices - exit_price) / pip_size
+    return pd.DataFrame({'outcome': outcome, 'exit_position': exit_position, 'exit_price': exit_price,
+                         'pnl_pips': pnl_pips, 'pnl_currency': pnl_pips * position_sizes * pip_value_per_lot})
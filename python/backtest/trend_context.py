@@ -0,0 +1,216 @@
+# --- H1 Trend Context ---
+# Streaming version of the H3M H1 trend filter (SimpleTrendContext in the cBot).
+# The trend is decided from the last 25 closed H1 bars:
+#   - bar counts: bullish (close > open) vs bearish (close < open) bars of the last 25,
+#   - impulse: close of the last bar minus open of the 5th-last bar, in pips (> 40 is strong),
+#   - structure: any higher high / higher low / lower low / lower high between consecutive
+#     bars of the last 10.
+# TrendCalculator keeps rolling counters for all three and updates in O(1) per bar, so the
+# live bot can advance it one closed H1 bar at a time. rolling_trend/trend_by_day compute the
+# same decisions for a whole H1 history at once with cumulative-sum windows (backtests).
+
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from day_index import DayIndex
+
+TREND_BARS = 25 # Bars needed before a trend can be decided; also the bar-count window
+STRUCTURE_BARS = 10
+IMPULSE_BARS = 5
+IMPULSE_THRESHOLD_PIPS = 40
+BAR_COUNT_MARGIN = 5 # Bullish bars must exceed bearish bars by more than this (and vice versa)
+TREND_COLUMNS = ('trend', 'bullish_bars', 'bearish_bars', 'impulse_pips',
+                 'higher_highs', 'higher_lows', 'lower_lows', 'lower_highs')
+
+
+class TrendContext:
+    BULLISH = "bullish"
+    BEARISH = "bearish"
+    NEUTRAL = "neutral"
+
+
+def decide_trend(bullish_bars, bearish_bars, impulse_pips, higher_highs, higher_lows, lower_lows, lower_highs) -> str:
+    """The SimpleTrendContext decision rule; bullish conditions take precedence."""
+    if (bullish_bars > bearish_bars + BAR_COUNT_MARGIN) or (higher_highs and higher_lows) or impulse_pips > IMPULSE_THRESHOLD_PIPS:
+        return TrendContext.BULLISH
+    if (bearish_bars > bullish_bars + BAR_COUNT_MARGIN) or (lower_lows and lower_highs) or impulse_pips < -IMPULSE_THRESHOLD_PIPS:
+        return TrendContext.BEARISH
+    return TrendContext.NEUTRAL
+
+
+class TrendSnapshot:
+    """Trend decision plus the diagnostics it was based on."""
+    __slots__ = ('trend', 'bullish_bars', 'bearish_bars', 'impulse_pips',
+                 'higher_highs', 'higher_lows', 'lower_lows', 'lower_highs')
+
+    def __init__(self, trend, bullish_bars, bearish_bars, impulse_pips, higher_highs, higher_lows, lower_lows, lower_highs):
+        self.trend = trend
+        self.bullish_bars = bullish_bars
+        self.bearish_bars = bearish_bars
+        self.impulse_pips = impulse_pips
+        self.higher_highs = higher_highs
+        self.higher_lows = higher_lows
+        self.lower_lows = lower_lows
+        self.lower_highs = lower_highs
+
+    @classmethod
+    def from_row(cls, row):
+        """Snapshot from a rolling_trend / trend_by_day row."""
+        return cls(row['trend'], int(row['bullish_bars']), int(row['bearish_bars']), float(row['impulse_pips']),
+                   bool(row['higher_highs']), bool(row['higher_lows']), bool(row['lower_lows']), bool(row['lower_highs']))
+
+    def log_message(self, date) -> str:
+        """The [TREND_H1] log line of the backtester for a decision made with bars up to 'date'."""
+        return (f"[TREND_H1] Determined for {date}: {self.trend}. Bars B/M: {self.bullish_bars}/{self.bearish_bars}, "
+                f"Impulse:{self.impulse_pips:.1f} pips, HH:{self.higher_highs}, HL:{self.higher_lows}, "
+                f"LL:{self.lower_lows}, LH:{self.lower_highs}")
+
+
+class TrendCalculator:
+    """
+    Rolling H1 trend context. Feed closed H1 bars in order with update(); trend and snapshot()
+    then describe the trend as determine_h1_trend_context would for those bars.
+    """
+
+    def __init__(self, pip_size: float):
+        self.pip_size = pip_size
+        self.bars_seen = 0
+        self._directions = deque(maxlen=TREND_BARS) # +1 bullish, -1 bearish, 0 doji
+        self._bullish_bars = 0
+        self._bearish_bars = 0
+        self._opens = deque(maxlen=IMPULSE_BARS)
+        self._last_close = None
+        # One (HH, HL, LL, LH) tuple per consecutive pair of the last STRUCTURE_BARS bars
+        self._pairs = deque(maxlen=STRUCTURE_BARS - 1)
+        self._pair_counts = [0, 0, 0, 0]
+        self._last_high = None
+        self._last_low = None
+
+    def update(self, open_, high, low, close):
+        """Adds one closed H1 bar (O(1))."""
+        direction = 1 if close > open_ else (-1 if close < open_ else 0)
+        if len(self._directions) == TREND_BARS:
+            self._count_direction(self._directions[0], -1)
+        self._directions.append(direction)
+        self._count_direction(direction, 1)
+
+        self._opens.append(open_)
+        self._last_close = close
+
+        if self.bars_seen:
+            pair = (high > self._last_high, low > self._last_low, low < self._last_low, high < self._last_high)
+            if len(self._pairs) == self._pairs.maxlen:
+                for flag, dropped in enumerate(self._pairs[0]):
+                    self._pair_counts[flag] -= dropped
+            self._pairs.append(pair)
+            for flag, added in enumerate(pair):
+                self._pair_counts[flag] += added
+        self._last_high = high
+        self._last_low = low
+        self.bars_seen += 1
+
+    def _count_direction(self, direction, delta):
+        if direction > 0:
+            self._bullish_bars += delta
+        elif direction < 0:
+            self._bearish_bars += delta
+
+    @property
+    def ready(self) -> bool:
+        return self.bars_seen >= TREND_BARS
+
+    def snapshot(self) -> TrendSnapshot:
+        """Current decision and diagnostics (None before TREND_BARS bars have been seen)."""
+        if not self.ready:
+            return None
+        impulse_pips = (self._last_close - self._opens[0]) / self.pip_size
+        higher_highs, higher_lows, lower_lows, lower_highs = (count > 0 for count in self._pair_counts)
+        trend = decide_trend(self._bullish_bars, self._bearish_bars, impulse_pips, higher_highs, higher_lows, lower_lows, lower_highs)
+        return TrendSnapshot(trend, self._bullish_bars, self._bearish_bars, impulse_pips, higher_highs, higher_lows, lower_lows, lower_highs)
+
+    @property
+    def trend(self) -> str:
+        snapshot = self.snapshot()
+        return snapshot.trend if snapshot is not None else TrendContext.NEUTRAL
+
+
+# --- Vectorized Trend Series ---
+def _window_counts(flags: np.ndarray, width: int) -> np.ndarray:
+    """Number of True flags in each window of 'width' consecutive flags (one value per full window)."""
+    counts = np.concatenate(([0], np.cumsum(flags, dtype=np.int64)))
+    return counts[width:] - counts[:-width]
+
+
+def rolling_trend(h1_dataframe: pd.DataFrame, pip_size: float) -> pd.DataFrame:
+    """
+    Trend decision and diagnostics after every H1 bar, in one vectorized pass.
+
+    Args:
+        h1_dataframe (pd.DataFrame): Chronological H1 bars with open/high/low/close columns.
+        pip_size (float): Pip size of the symbol.
+
+    Returns:
+        pd.DataFrame: TREND_COLUMNS indexed like h1_dataframe; row i is what TrendCalculator.snapshot()
+                      reports after bars 0..i. Rows before bar TREND_BARS-1 are NEUTRAL with zero
+                      counts, NaN impulse and False structure flags.
+    """
+    open_, high, low, close = (h1_dataframe[column].to_numpy(dtype=np.float64) for column in ('open', 'high', 'low', 'close'))
+    n = len(close)
+    bullish_bars = np.zeros(n, dtype=np.int64)
+    bearish_bars = np.zeros(n, dtype=np.int64)
+    impulse_pips = np.full(n, np.nan)
+    structure = np.zeros((4, n), dtype=bool) # HH, HL, LL, LH
+    if n >= TREND_BARS:
+        ready = slice(TREND_BARS - 1, None)
+        bullish_bars[ready] = _window_counts(close > open_, TREND_BARS)
+        bearish_bars[ready] = _window_counts(close < open_, TREND_BARS)
+        impulse_pips[ready] = (close[ready] - open_[TREND_BARS - IMPULSE_BARS:n - IMPULSE_BARS + 1]) / pip_size
+        # Pair k compares bar k+1 with bar k; the last STRUCTURE_BARS bars up to bar i hold pairs i-9..i-1
+        pairs = (high[1:] > high[:-1], low[1:] > low[:-1], low[1:] < low[:-1], high[1:] < high[:-1])
+        first_window = TREND_BARS - STRUCTURE_BARS # Window ending at pair TREND_BARS-2
+        for flag, pair_flags in enumerate(pairs):
+            structure[flag, ready] = _window_counts(pair_flags, STRUCTURE_BARS - 1)[first_window:] > 0
+
+    higher_highs, higher_lows, lower_lows, lower_highs = structure
+    bullish = (bullish_bars > bearish_bars + BAR_COUNT_MARGIN) | (higher_highs & higher_lows) | (impulse_pips > IMPULSE_THRESHOLD_PIPS)
+    bearish = (bearish_bars > bullish_bars + BAR_COUNT_MARGIN) | (lower_lows & lower_highs) | (impulse_pips < -IMPULSE_THRESHOLD_PIPS)
+    trend = np.full(n, TrendContext.NEUTRAL, dtype=object)
+    trend[bearish] = TrendContext.BEARISH
+    trend[bullish] = TrendContext.BULLISH # Bullish conditions take precedence, as in decide_trend
+    return pd.DataFrame(dict(zip(TREND_COLUMNS, (trend, bullish_bars, bearish_bars, impulse_pips,
+                                                 higher_highs, higher_lows, lower_lows, lower_highs))),
+                        index=h1_dataframe.index)
+
+
+def trend_by_day(h1_dataframe: pd.DataFrame, pip_size: float, dates=None, rolling: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Daily H1 trend context of a whole backtest: for each date, the decision from the H1 bars before
+    00:00 UTC of that date (what determine_h1_trend_context returns for that prefix).
+
+    Args:
+        h1_dataframe (pd.DataFrame): Chronological H1 bars with open/high/low/close columns.
+        pip_size (float): Pip size of the symbol.
+        dates (iterable): datetime.date values to evaluate (default: every date with H1 bars).
+        rolling (pd.DataFrame): rolling_trend(h1_dataframe, pip_size), if already computed.
+
+    Returns:
+        pd.DataFrame: One row per date with TREND_COLUMNS plus 'h1_bars', the number of H1 bars
+                      before the date. Dates with fewer than TREND_BARS prior bars are NEUTRAL.
+    """
+    days = DayIndex(h1_dataframe.index)
+    dates = days.dates if dates is None else list(dates)
+    midnights_ns = np.asarray(pd.to_datetime(dates), dtype='datetime64[ns]').view(np.int64)
+    positions = np.searchsorted(days.times_ns, midnights_ns, side='left')
+
+    ready = positions >= TREND_BARS
+    rolling = rolling if rolling is not None else rolling_trend(h1_dataframe, pip_size)
+    neutral_row = (TrendContext.NEUTRAL, 0, 0, np.nan, False, False, False, False)
+    columns = {}
+    for column, default in zip(TREND_COLUMNS, neutral_row):
+        values = rolling[column].to_numpy()
+        columns[column] = np.full(len(dates), default, dtype=values.dtype)
+        columns[column][ready] = values[positions[ready] - 1]
+    columns['h1_bars'] = positions
+    return pd.DataFrame(columns, index=pd.Index(dates, name='date'))
@@ -1,11 +1,57 @@
+import numpy as np
 import pandas as pd
 import argparse
 import json
 import os
+import sys
 
-def generate_lightweight_chart_html(csv_file_path, output_html_path="lightweight_chart.html"):
+BACKTEST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backtest') # bar_store.py lives there
+
+CSV_COLUMNS = ['Timestamp', 'EventType', 'H1_Open', 'H1_High', 'H1_Low', 'H1_Close'] # Остальные колонки лога для свечей не нужны
+OHLC_COLUMNS = ['H1_Open', 'H1_High', 'H1_Low', 'H1_Close']
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S' # Формат LogChartEvent в H3M.cs
+CSV_CHUNK_ROWS = 500_000 # Строк CSV в памяти одновременно
+
+def read_h1_bars(csv_file_path, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Читает H1_BAR строки CSV лога cBot по частям (в памяти не больше chunk_rows строк лога),
+    векторно переводит время в epoch-секунды, а OHLC в float.
+
+    Returns:
+        tuple: (pd.DataFrame с колонками time/open/high/low/close, отсортированный по time без дублей;
+                число пропущенных H1_BAR строк с некорректными данными)
+    """
+    parts = []
+    skipped = 0
+    reader = pd.read_csv(csv_file_path, delimiter=';', usecols=CSV_COLUMNS, dtype=str, chunksize=chunk_rows)
+    for chunk in reader:
+        chunk = chunk[chunk['EventType'] == 'H1_BAR']
+        if chunk.empty:
+            continue
+        times = pd.to_datetime(chunk['Timestamp'], format=TIMESTAMP_FORMAT, errors='coerce')
+        bars = pd.DataFrame({
+            'time': times.to_numpy(dtype='datetime64[s]').astype('int64'),
+            'open': pd.to_numeric(chunk['H1_Open'], errors='coerce').to_numpy(),
+            'high': pd.to_numeric(chunk['H1_High'], errors='coerce').to_numpy(),
+            'low': pd.to_numeric(chunk['H1_Low'], errors='coerce').to_numpy(),
+            'close': pd.to_numeric(chunk['H1_Close'], errors='coerce').to_numpy(),
+        })
+        valid = times.notna().to_numpy() & bars[['open', 'high', 'low', 'close']].notna().all(axis=1).to_numpy()
+        skipped += int((~valid).sum())
+        parts.append(bars[valid].drop_duplicates('time', keep='last')) # Дубли внутри части отбрасываются сразу
+    if not parts:
+        return pd.DataFrame(columns=['time', 'open', 'high', 'low', 'close']), skipped
+    bars = pd.concat(parts, ignore_index=True).drop_duplicates('time', keep='last')
+    return bars.sort_values('time', kind='stable').reset_index(drop=True), skipped
+
+def candlestick_records(times, opens, highs, lows, closes):
+    """Список свечей в формате Lightweight Charts из колонок (epoch-секунды и OHLC)."""
+    columns = [times.tolist(), opens.tolist(), highs.tolist(), lows.tolist(), closes.tolist()]
+    return [{"time": t, "open": o, "high": h, "low": l, "close": c} for t, o, h, l, c in zip(*columns)]
+
+def generate_lightweight_chart_html(csv_file_path, output_html_path="lightweight_chart.html", feed=None):
     try:
-        df = pd.read_csv(csv_file_path, delimiter=';')
+        bars, skipped = read_h1_bars(csv_file_path)
     except FileNotFoundError:
         print(f"Ошибка: CSV файл не найден по пути: {csv_file_path}")
         return
@@ -13,48 +59,196 @@ def generate_lightweight_chart_html(csv_file_path, output_html_path="lightweight
         print(f"Ошибка при чтении CSV файла: {e}")
         return
 
-    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+    if skipped:
+        print(f"Предупреждение: Пропущено {skipped} строк H1_BAR с некорректным временем или ценами.")
+    if bars.empty:
+        print("Нет корректных данных H1_BAR для отображения.")
+        return
 
-    h1_bars_df = df[df['EventType'] == 'H1_BAR'].copy()
-    if h1_bars_df.empty:
-        print("Нет данных H1_BAR для отображения.")
+    print("Первые 5 элементов candlestick_data для проверки:")
+    head = bars.head(5)
+    for i, item in enumerate(candlestick_records(head['time'], head['open'], head['high'], head['low'], head['close'])):
+        print(f"  {i}: {item}")
+
+    chart_title = f'H3M Custom Chart for {csv_file_path.split("_")[-2]} on {pd.to_datetime(bars["time"].iloc[0], unit="s").date()}'
+    if feed:
+        write_chart_feed(bars, chart_title, output_html_path, "1h", feed)
         return
-        
-    candlestick_data = []
-    for _, row in h1_bars_df.iterrows():
-        try:
-            # Убедимся, что все значения OHLC являются числами
-            o = float(row['H1_Open'])
-            h = float(row['H1_High'])
-            l = float(row['H1_Low'])
-            c = float(row['H1_Close'])
-            time_val = int(row['Timestamp'].timestamp()) 
-            
-            candlestick_data.append({
-                "time": time_val,
-                "open": o,
-                "high": h,
-                "low": l,
-                "close": c
-            })
-        except ValueError as ve:
-            print(f"Предупреждение: Пропуск строки из-за ошибки конвертации данных в число: {row}, ошибка: {ve}")
-            continue # Пропускаем эту строку, если данные не корректны
-        except Exception as ex:
-            print(f"Предупреждение: Пропуск строки из-за неизвестной ошибки: {row}, ошибка: {ex}")
-            continue
+    candlestick_data = candlestick_records(bars['time'], bars['open'], bars['high'], bars['low'], bars['close'])
+    write_chart_html(candlestick_data, chart_title, output_html_path)
+
+def bars_from_store(symbol, timeframe, start=None, end=None, store_dir=None):
+    """Бары из хранилища (backtest/bar_store.py) как DataFrame с колонками time (epoch-секунды)/open/high/low/close."""
+    if BACKTEST_DIR not in sys.path:
+        sys.path.append(BACKTEST_DIR)
+    from bar_store import BarStore, DEFAULT_STORE_DIR
+
+    view = BarStore(store_dir or DEFAULT_STORE_DIR).view(symbol, timeframe, start, end)
+    return pd.DataFrame({'time': view.times_ns // 1_000_000_000, 'open': view.open, 'high': view.high,
+                         'low': view.low, 'close': view.close})
 
-    if not candlestick_data:
-        print("Нет корректных данных H1_BAR для отображения после фильтрации и конвертации.")
+def candlestick_data_from_store(symbol, timeframe, start=None, end=None, store_dir=None):
+    """
+    Свечи для графика напрямую из memory-mapped хранилища баров (backtest/bar_store.py),
+    без загрузки всей истории в память: читается только нужный диапазон.
+    """
+    bars = bars_from_store(symbol, timeframe, start, end, store_dir)
+    return candlestick_records(bars['time'], bars['open'], bars['high'], bars['low'], bars['close'])
+
+def generate_lightweight_chart_html_from_store(symbol, timeframe, start=None, end=None, output_html_path="lightweight_chart.html", store_dir=None, feed=None):
+    bars = bars_from_store(symbol, timeframe, start, end, store_dir)
+    if bars.empty:
+        print(f"Нет баров {symbol} ({timeframe}) в хранилище для выбранного диапазона.")
         return
+    first_date = pd.to_datetime(bars["time"].iloc[0], unit="s").date()
+    chart_title = f'H3M Chart for {symbol} ({timeframe}) from {first_date}'
+    if feed:
+        write_chart_feed(bars, chart_title, output_html_path, timeframe, feed)
+        return
+    write_chart_html(candlestick_records(bars['time'], bars['open'], bars['high'], bars['low'], bars['close']), chart_title, output_html_path)
 
-    candlestick_data = [dict(t) for t in {tuple(d.items()) for d in candlestick_data}]
-    candlestick_data.sort(key=lambda x: x['time'])
+FEED_CHUNKS = {'day': 'D', 'week': 'W'} # Период файла базового таймфрейма в режиме --feed
+FEED_LEVELS = [('4h', 4 * 3600, '4h', 'M'), ('1d', 24 * 3600, '1D', 'Y')] # Уровни прореживания: имя, секунд в баре, правило resample, период файла
+MAX_VISIBLE_BARS = 1500 # Больше свечей на экране: страница переключается на более крупный уровень
 
-    print("Первые 5 элементов candlestick_data для проверки:")
-    for i, item in enumerate(candlestick_data[:5]):
-        print(f"  {i}: {item}")
+def downsample_bars(bars, rule):
+    """OHLC прореживание (например H1 -> H4/D1) для DataFrame с колонками time/open/high/low/close."""
+    index = pd.to_datetime(bars['time'].to_numpy(), unit='s')
+    ohlc = bars[['open', 'high', 'low', 'close']].set_axis(index).resample(rule).agg(
+        {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last'}).dropna()
+    return pd.DataFrame({'time': ohlc.index.to_numpy(dtype='datetime64[s]').astype('int64'), 'open': ohlc['open'].to_numpy(),
+                         'high': ohlc['high'].to_numpy(), 'low': ohlc['low'].to_numpy(), 'close': ohlc['close'].to_numpy()})
+
+def write_feed_chunks(bars, level, seconds, period, feed_dir):
+    """
+    Записывает бары уровня файлами по периоду (день/неделя/месяц/год) в feed_dir/level/.
+    Файл - JS вызов h3mFeedChunk(level, file, {t, o, h, l, c}): страница подгружает его тегом <script>,
+    что работает и для HTML, открытого с диска (fetch из file:// браузеры блокируют).
+
+    Returns:
+        list: [начало, конец (время после последнего бара), имя файла] для каждого файла, по возрастанию времени.
+    """
+    level_dir = os.path.join(feed_dir, level)
+    os.makedirs(level_dir, exist_ok=True)
+    times = bars['time'].to_numpy()
+    periods = pd.to_datetime(times, unit='s').to_period(period)
+    codes = periods.asi8
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)]
+    chunks = []
+    for first, last in zip(starts, ends):
+        file_name = f"{periods[first].start_time.date()}.js"
+        part = bars.iloc[first:last]
+        columns = {'t': part['time'].tolist(), 'o': part['open'].tolist(), 'h': part['high'].tolist(),
+                   'l': part['low'].tolist(), 'c': part['close'].tolist()}
+        with open(os.path.join(level_dir, file_name), 'w', encoding='utf-8') as f:
+            f.write(f"h3mFeedChunk({json.dumps(level)},{json.dumps(file_name)},{json.dumps(columns, separators=(',', ':'))});\n")
+        chunks.append([int(times[first]), int(times[last - 1]) + seconds, file_name])
+    return chunks
+
+def write_chart_feed(bars, chart_title, output_html_path, timeframe="1h", chunk="week"):
+    """
+    Режим для длинной истории: бары не встраиваются в HTML, а пишутся файлами по дням/неделям в папку
+    <output>_data рядом со страницей, вместе с прореженными уровнями H4/D1. Страница содержит только
+    оглавление файлов и подгружает нужные при прокрутке, а при отдалении переключается на H4/D1.
+
+    Args:
+        bars (pd.DataFrame): Колонки time (epoch-секунды, по возрастанию, без дублей)/open/high/low/close.
+        timeframe (str): Название базового таймфрейма (имя папки уровня).
+        chunk (str): Период файла базового таймфрейма: 'day' или 'week'.
+    """
+    feed_dir = os.path.splitext(output_html_path)[0] + "_data"
+    times = bars['time'].to_numpy()
+    base_seconds = int(np.median(np.diff(times))) if len(times) > 1 else 3600
+    levels = [{'name': timeframe, 'seconds': base_seconds,
+               'chunks': write_feed_chunks(bars, timeframe, base_seconds, FEED_CHUNKS[chunk], feed_dir)}]
+    for name, seconds, rule, period in FEED_LEVELS:
+        if seconds > base_seconds:
+            levels.append({'name': name, 'seconds': seconds,
+                           'chunks': write_feed_chunks(downsample_bars(bars, rule), name, seconds, period, feed_dir)})
+    feed_json = json.dumps({'directory': os.path.basename(feed_dir), 'maxVisibleBars': MAX_VISIBLE_BARS, 'levels': levels},
+                           separators=(',', ':'))
+    level_files = ", ".join(f"{level['name']}: {len(level['chunks'])}" for level in levels)
+    print(f"Файлы данных графика сохранены в: {os.path.abspath(feed_dir)} ({level_files})")
+
+    data_script = f"""
+        // Оглавление файлов данных: уровни от базового таймфрейма к D1, у каждого [начало, конец, файл]
+        const feed = {feed_json};
+        const pendingChunks = {{}};
+        feed.levels.forEach(level => {{ level.loaded = new Map(); }});
+
+        window.h3mFeedChunk = (levelName, fileName, columns) => {{
+            const level = feed.levels.find(l => l.name === levelName);
+            level.loaded.set(fileName, columns.t.map((t, i) => ({{
+                time: t, open: columns.o[i], high: columns.h[i], low: columns.l[i], close: columns.c[i]
+            }})));
+            const key = levelName + '/' + fileName;
+            if (pendingChunks[key]) {{
+                pendingChunks[key]();
+                delete pendingChunks[key];
+            }}
+        }};
 
+        function loadChunk(level, chunk) {{
+            const fileName = chunk[2];
+            if (level.loaded.has(fileName)) return Promise.resolve();
+            const key = level.name + '/' + fileName;
+            return new Promise(resolve => {{
+                if (pendingChunks[key]) {{
+                    const previous = pendingChunks[key];
+                    pendingChunks[key] = () => {{ previous(); resolve(); }};
+                    return;
+                }}
+                pendingChunks[key] = resolve;
+                const script = document.createElement('script');
+                script.src = feed.directory + '/' + level.name + '/' + fileName;
+                script.onerror = () => {{ level.loaded.set(fileName, []); pendingChunks[key](); delete pendingChunks[key]; }};
+                document.head.appendChild(script);
+            }});
+        }}
+
+        // Самый мелкий уровень, при котором на экране не больше maxVisibleBars свечей
+        function pickLevel(span) {{
+            return feed.levels.find(level => span / level.seconds <= feed.maxVisibleBars) || feed.levels[feed.levels.length - 1];
+        }}
+
+        let shownLevel = null;
+        let shownBars = 0;
+        async function showRange(range) {{
+            const span = range.to - range.from;
+            const level = pickLevel(span);
+            // Файлы видимого диапазона плюс по экрану с каждой стороны, чтобы прокрутка не упиралась в край данных
+            const needed = level.chunks.filter(chunk => chunk[1] > range.from - span && chunk[0] < range.to + span);
+            await Promise.all(needed.map(chunk => loadChunk(level, chunk)));
+            const data = [].concat(...level.chunks.filter(chunk => level.loaded.has(chunk[2])).map(chunk => level.loaded.get(chunk[2])));
+            if (level === shownLevel && data.length === shownBars) return;
+            shownLevel = level;
+            shownBars = data.length;
+            candleSeries.setData(data);
+            chart.timeScale().setVisibleRange(range);
+        }}
+
+        let rangeTimer = null;
+        let queuedRange = null;
+        let showing = Promise.resolve();
+        chart.timeScale().subscribeVisibleTimeRangeChange(range => {{
+            if (!range) return;
+            queuedRange = range;
+            clearTimeout(rangeTimer);
+            rangeTimer = setTimeout(() => {{
+                const next = queuedRange;
+                showing = showing.then(() => showRange(next));
+            }}, 150);
+        }});
+
+        // Начальный вид: последний файл базового таймфрейма
+        const baseChunks = feed.levels[0].chunks;
+        const lastChunk = baseChunks[baseChunks.length - 1];
+        showing = showRange({{ from: lastChunk[0], to: lastChunk[1] }});
+"""
+    save_chart_html(chart_page(chart_title, data_script), output_html_path)
+
+def write_chart_html(candlestick_data, chart_title, output_html_path):
     markers_data = []
     price_lines_data = []
 
@@ -62,9 +256,35 @@ def generate_lightweight_chart_html(csv_file_path, output_html_path="lightweight
     markers_json = json.dumps(markers_data)
     price_lines_json = json.dumps(price_lines_data)
     
-    chart_title = f'H3M Custom Chart for {csv_file_path.split("_")[-2]} on {pd.to_datetime(candlestick_data[0]["time"], unit="s").date() if candlestick_data else "N/A"}'
+    data_script = f"""
+        const candlestickData = {candlestick_json};
+        console.log("Candlestick data being passed to chart:", candlestickData.slice(0,5)); // Отладка в консоли браузера
+        candleSeries.setData(candlestickData);
+        
+        // const markersData = {markers_json};
+        // if (markersData.length > 0) {{
+        //     candleSeries.setMarkers(markersData);
+        // }}
 
-    html_content = f"""
+        // const priceLinesData = {price_lines_json};
+        // priceLinesData.forEach(line => {{
+        //     candleSeries.createPriceLine({{
+        //         price: line.price,
+        //         color: line.color || '#000000',
+        //         lineWidth: line.lineWidth || 1,
+        //         lineStyle: line.lineStyle || LightweightCharts.LineStyle.Solid,
+        //         axisLabelVisible: true,
+        //         title: line.title || '',
+        //     }});
+        // }});
+
+        chart.timeScale().fitContent();
+"""
+    save_chart_html(chart_page(chart_title, data_script), output_html_path)
+
+def chart_page(chart_title, data_script):
+    """HTML страница графика: общие настройки Lightweight Charts, данные задает data_script (JS после создания candleSeries)."""
+    return f"""
 <!DOCTYPE html>
 <html>
 <head>
@@ -130,38 +350,17 @@ def generate_lightweight_chart_html(csv_file_path, output_html_path="lightweight
             wickUpColor: 'rgba(34, 139, 34, 1)',
         }});
 
-        const candlestickData = {candlestick_json};
-        console.log("Candlestick data being passed to chart:", candlestickData.slice(0,5)); // Отладка в консоли браузера
-        candleSeries.setData(candlestickData);
-        
-        // const markersData = {markers_json};
-        // if (markersData.length > 0) {{
-        //     candleSeries.setMarkers(markersData);
-        // }}
-
-        // const priceLinesData = {price_lines_json};
-        // priceLinesData.forEach(line => {{
-        //     candleSeries.createPriceLine({{
-        //         price: line.price,
-        //         color: line.color || '#000000',
-        //         lineWidth: line.lineWidth || 1,
-        //         lineStyle: line.lineStyle || LightweightCharts.LineStyle.Solid,
-        //         axisLabelVisible: true,
-        //         title: line.title || '',
-        //     }});
-        // }});
-
         window.addEventListener('resize', () => {{
             chart.applyOptions({{ width: chartContainer.clientWidth, height: chartContainer.clientHeight }});
         }});
 
-        chart.timeScale().fitContent();
-
+{data_script}
     </script>
 </body>
 </html>
     """
 
+def save_chart_html(html_content, output_html_path):
     try:
         with open(output_html_path, 'w', encoding='utf-8') as f:
             f.write(html_content)
@@ -171,8 +370,20 @@ def generate_lightweight_chart_html(csv_file_path, output_html_path="lightweight
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Генерация интерактивного HTML графика H1 свечей с событиями из CSV файла от H3M cBot с использованием Lightweight Charts.')
-    parser.add_argument('csv_file', type=str, help='Путь к CSV файлу с данными.')
+    parser.add_argument('csv_file', type=str, nargs='?', help='Путь к CSV файлу с данными.')
     parser.add_argument('--output', type=str, default='lightweight_chart.html', help='Имя выходного HTML файла (по умолчанию: lightweight_chart.html)')
+    parser.add_argument('--symbol', type=str, help='Символ из хранилища баров (вместо CSV), например EUR/USD')
+    parser.add_argument('--timeframe', type=str, default='1h', help='Таймфрейм из хранилища баров (по умолчанию: 1h)')
+    parser.add_argument('--start', type=str, default=None, help='Начало диапазона (YYYY-MM-DD HH:MM:SS)')
+    parser.add_argument('--end', type=str, default=None, help='Конец диапазона (YYYY-MM-DD HH:MM:SS)')
+    parser.add_argument('--bar-store', type=str, default=None, help='Корневая папка хранилища баров (по умолчанию: backtest/bar_store)')
+    parser.add_argument('--feed', choices=sorted(FEED_CHUNKS), default=None,
+                        help='Писать бары файлами по дню/неделе в папку <output>_data с уровнями H4/D1 и подгружать их при прокрутке (для длинной истории)')
     
     args = parser.parse_args()
-    generate_lightweight_chart_html(args.csv_file, args.output) 
\ No newline at end of file
+    if args.symbol:
+        generate_lightweight_chart_html_from_store(args.symbol, args.timeframe, args.start, args.end, args.output, args.bar_store, args.feed)
+    elif args.csv_file:
+        generate_lightweight_chart_html(args.csv_file, args.output, args.feed)
+    else:
+        parser.error('Укажите CSV файл или --symbol для чтения из хранилища баров.')
\ No newline at end of file
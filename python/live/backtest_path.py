@@ -0,0 +1,11 @@
+"""
+Puts python/backtest on sys.path so the live modules can import the shared backtest modules
+(bar_store, trend_context, symbols). Import it before any of those.
+"""
+
+import os
+import sys
+
+BACKTEST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backtest')
+if BACKTEST_DIR not in sys.path:
+    sys.path.append(BACKTEST_DIR)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Live Bar Builder
+
+Aggregates spot prices into M5/H1 bars for the live bot and appends every closed bar to the
+memory-mapped bar store (backtest/bar_store.py), the same store the backtester and the chart
+plotter read. Strategy code asks history() for the last N closed bars; they are zero-copy views
+of the store, so the live process never keeps its own copy of the history.
+"""
+
+import numpy as np
+
+import backtest_path # noqa: F401 - puts python/backtest on sys.path
+from bar_store import BarStore, DEFAULT_STORE_DIR, INTERVAL_DURATIONS
+
+
+class LiveBarBuilder:
+    def __init__(self, symbol: str, timeframes=("5min", "1h"), store: BarStore = None):
+        """
+        symbol: e.g. "EUR/USD" (also the bar store key)
+        timeframes: Twelve Data style intervals to build, e.g. ("5min", "1h")
+        store: BarStore to append closed bars to (default: the shared store in backtest/bar_store)
+        """
+        self.symbol = symbol
+        self.store = store or BarStore(DEFAULT_STORE_DIR)
+        self.durations_ns = {timeframe: INTERVAL_DURATIONS[timeframe].value for timeframe in timeframes}
+        self.forming = {timeframe: None for timeframe in timeframes} # [bucket_start_ns, open, high, low, close, ticks]
+
+    def on_tick(self, timestamp_ns: int, price: float):
+        """
+        Feeds one price (e.g. the bid, or the bid/ask mid) at UTC epoch nanoseconds.
+        Returns: list of (timeframe, bucket_start_ns) for the bars closed by this tick.
+        """
+        closed = []
+        for timeframe, duration_ns in self.durations_ns.items():
+            bucket_start_ns = timestamp_ns - timestamp_ns % duration_ns
+            bar = self.forming[timeframe]
+            if bar is not None and bucket_start_ns > bar[0]:
+                self._close(timeframe, bar)
+                closed.append((timeframe, bar[0]))
+                bar = None
+            if bar is None:
+                self.forming[timeframe] = [bucket_start_ns, price, price, price, price, 1]
+            elif bucket_start_ns == bar[0]:
+                bar[2] = max(bar[2], price)
+                bar[3] = min(bar[3], price)
+                bar[4] = price
+                bar[5] += 1
+            # Ticks older than the forming bar (out-of-order delivery) are ignored
+        return closed
+
+    def _close(self, timeframe: str, bar):
+        bucket_start_ns, open_, high, low, close, ticks = bar
+        self.store.series(self.symbol, timeframe).append(
+            np.array([bucket_start_ns]), [open_], [high], [low], [close], [float(ticks)]) # Tick count as volume
+
+    def history(self, timeframe: str, count: int):
+        """Zero-copy BarView of the last 'count' closed bars of 'timeframe' from the store."""
+        return self.store.series(self.symbol, timeframe).tail(count)
+
+    def last_closed_time(self, timeframe: str):
+        """Open time of the newest closed bar in the store (None if there is none yet)."""
+        return self.store.series(self.symbol, timeframe).last_time()
@@ -24,6 +24,11 @@ It will:
 
 import asyncio
 import time # Standard time module
+
+import backtest_path # noqa: F401 - puts python/backtest on sys.path
+from live_bar_builder import LiveBarBuilder # closed M5/H1 bars go to the shared bar store
+from symbols import get_pip_size
+from trend_context import TrendCalculator, TREND_BARS
 # from datetime import datetime, timedelta # If needed for bar construction or timing
 
 # Will import CTraderApiClient and strategy logic components
@@ -65,6 +70,16 @@ async def main_live_trader():
     print("Live Trader: Conceptual connection established (using placeholders).")
     print(f"Target symbol: {SYMBOL_TO_TRADE}")
 
+    bar_builder = LiveBarBuilder(SYMBOL_TO_TRADE, timeframes=("5min", "1h"))
+    print(f"Bar builder ready; last stored M5 bar: {bar_builder.last_closed_time('5min')}")
+
+    # H1 trend context, warmed up from the stored H1 bars and then advanced one closed bar at a time
+    trend_calculator = TrendCalculator(get_pip_size(SYMBOL_TO_TRADE))
+    h1_history = bar_builder.history("1h", TREND_BARS)
+    for bar in zip(h1_history.open, h1_history.high, h1_history.low, h1_history.close):
+        trend_calculator.update(*bar)
+    print(f"H1 trend context from {trend_calculator.bars_seen} stored bars: {trend_calculator.trend}")
+
     # Subscribe to necessary data streams (e.g., spot prices for SYMBOL_TO_TRADE)
     # await api_client.subscribe_spots(SYMBOL_TO_TRADE)
 
@@ -79,10 +94,14 @@ async def main_live_trader():
 
             # 2. Aggregate data into bars if needed (e.g., M1, M5, H1)
             #    Or, if strategy can work with ticks, use tick data.
-            #    This is a complex part: constructing bars in real-time.
+            #    closed_bars = bar_builder.on_tick(spot_timestamp_ns, spot_bid)
+            #    Closed bars are appended to the bar store; read them back with
+            #    bar_builder.history("1h", 24 * 30) / bar_builder.history("5min", 288).
 
             # 3. On new bar (or relevant tick pattern), apply strategy logic
-            #    - determine_h1_trend_context_live(...)
+            #    - for each ("1h", _) in closed_bars: last_h1 = bar_builder.history("1h", 1)
+            #      trend_calculator.update(last_h1.open[0], last_h1.high[0], last_h1.low[0], last_h1.close[0])
+            #      current_h1_trend = trend_calculator.trend
             #    - find_asia_fractals_live(...)
             #    - check_sweep_live(...)
             #    - check_bos_live(...)